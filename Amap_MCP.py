@@ -1,8 +1,17 @@
 # -*- coding: utf-8 -*-
 from mcp.server.fastmcp import FastMCP
-import requests
+import http_client
+from batcher import MicroBatcher
+from cache import MISSING, TTLCache, make_key
+from projection import compact_json, format_polyline, is_empty, parse_polyline, pick, simplify
+from poi_index import POIIndex, normalize
+from resilience import CircuitBreaker, Upstream
+from singleflight import SingleFlight
 from typing import List, Dict, Any, Optional
+import asyncio
+import atexit
 import logging
+import math
 import sys
 from dotenv import load_dotenv
 import os
@@ -21,12 +30,245 @@ load_dotenv()
 
 # 获取高德地图API密钥
 MAP_API_KEY = os.getenv("AMAP_API_KEY", "...your_api_key_here...")  # 替换为你的实际API密钥
+AMAP_API_BASE = os.getenv("AMAP_API_BASE", "https://restapi.amap.com")  # 高德Web服务API地址
+AMAP_TIMEOUT = 10  # 每次请求的超时时间上限（秒），实际超时按各接口最近的p99延迟自适应
 
-@mcp.tool()
-def geocode(address: str, city: str = "") -> dict:
-    """Convert address to geographic coordinates using Amap API."""
+# 熔断：高德连续失败时直接走本地降级结果，不再让每次调用都等到超时；各接口延迟不同，分别计算超时
+amap_breaker = CircuitBreaker("amap")
+HEDGE_QUANTILE = float(os.getenv("AMAP_HEDGE_QUANTILE", 0.95))  # 超过此分位延迟仍未返回时再发一个相同请求，0为关闭
+HEDGED_TOOLS = ("geocode", "get_weather")  # 只对幂等、结果小的查询做对冲
+amap_upstreams = {tool: Upstream(f"amap.{tool}", breaker=amap_breaker, max_timeout=AMAP_TIMEOUT,
+                                 hedge_quantile=HEDGE_QUANTILE)
+                  for tool in ("geocode", "geocode_batch", "get_weather", "input_tips", "plan_driving_route")}
+
+# 响应缓存：按工具设置过期时间（秒），LRU限制条数，设置AMAP_CACHE_PATH后持久化到SQLite文件
+CACHE_TTL = {
+    "geocode": int(os.getenv("AMAP_CACHE_TTL_GEOCODE", 7 * 24 * 3600)),
+    "get_weather": int(os.getenv("AMAP_CACHE_TTL_WEATHER", 10 * 60)),
+    "input_tips": int(os.getenv("AMAP_CACHE_TTL_INPUT_TIPS", 24 * 3600)),
+}
+CACHE_STATS_EVERY = 100  # 每多少次缓存查询输出一次命中统计
+response_cache = TTLCache("amap", maxsize=int(os.getenv("AMAP_CACHE_SIZE", 2048)),
+                          path=os.getenv("AMAP_CACHE_PATH") or None)
+upstream_calls = SingleFlight("amap")  # 相同参数的并发请求只向高德发一次
+
+# 地址解析合并：未命中缓存的geocode请求按城市合并成高德的批量请求（batch=true），多个地址只需一次往返
+GEOCODE_BATCH_SIZE = 10  # 高德一次批量解析最多10个地址
+GEOCODE_BATCH_WINDOW_MS = float(os.getenv("AMAP_GEOCODE_BATCH_WINDOW_MS", 0))  # 等待更多请求的时间，0为只合并同时到达的（如geocode_batch）
+MAX_BATCH_ADDRESSES = 50  # geocode_batch 一次最多的地址数
+
+# 返回给设备的字段：高德原始结果里大部分字段设备用不到，按工具只保留需要的部分，以紧凑JSON文本返回
+RESULT_FIELDS = {
+    "geocode": ("geocodes", ("formatted_address", "province", "city", "district", "adcode", "location", "level")),
+    "input_tips": ("tips", ("id", "name", "district", "adcode", "address", "location")),
+}
+STATUS_FIELDS = ("status", "info", "count")
+ROUTE_FIELDS = ("origin", "destination", "taxi_cost")
+ROUTE_PATH_FIELDS = ("distance", "duration", "strategy", "tolls", "toll_distance", "traffic_lights", "restriction")
+ROUTE_STEP_FIELDS = ("instruction", "road", "action", "distance", "duration")
+ROUTE_DETAILS = ("summary", "steps", "full")
+POLYLINE_TOLERANCE = float(os.getenv("AMAP_POLYLINE_TOLERANCE", 10))  # 路线折线简化的容差（米）
+
+# 路线缓存：起终点和途经点按网格量化后作为键，相近位置的同一行程共用结果；过期时间短，跟上路况变化
+ROUTE_GRID = float(os.getenv("AMAP_ROUTE_GRID", 200))  # 量化网格边长（米），0为按原始坐标
+ROUTE_TTL = int(os.getenv("AMAP_ROUTE_TTL", 180))  # 高德路况约每2-3分钟更新
+route_cache = TTLCache("amap-route", maxsize=int(os.getenv("AMAP_ROUTE_CACHE_SIZE", 128)))  # 路线结果较大，只放内存
+route_stats = {"hits": 0, "misses": 0, "nearby_hits": 0}  # nearby_hits: 坐标不同、量化后相同而命中的次数
+
+# 本地地点索引：从高德的geocode/input_tips结果学习（也可用poi_index.py导入常用地点），
+# 置信度高时直接本地回答，高德不可用时作为降级结果；设置AMAP_POI_INDEX后持久化到文件
+poi_index = POIIndex(os.getenv("AMAP_POI_INDEX") or None,
+                     journal_limit=int(os.getenv("AMAP_POI_JOURNAL_LIMIT", 1000)),
+                     geocode_ttl=CACHE_TTL["geocode"],  # 学到的地址解析结果与缓存同样过期，之后重新问高德
+                     max_learned=int(os.getenv("AMAP_POI_MAX_LEARNED", 10000)))  # 不持久化时内存中最多保留的地点数
+atexit.register(poi_index.flush)  # journal由后台线程追加，退出前写完
+POI_TIPS_MIN = int(os.getenv("AMAP_POI_TIPS_MIN", 5))  # 本地（有location时指附近）至少匹配这么多地点才不问高德，0为不本地回答
+POI_TIPS_MIN_CHARS = int(os.getenv("AMAP_POI_TIPS_MIN_CHARS", 2))  # 关键词至少这么多字才本地回答，单字前缀匹配太宽
+GEOCODE_RECORD_FIELDS = ("formatted_address", "province", "city", "district", "adcode", "location", "level")
+
+
+async def cached_get(tool, url, params):
+    """GET an Amap API through the response cache, only successful answers are cached"""
+    key = make_key(tool, {k: v for k, v in params.items() if k not in ("key", "output")})
+    data = response_cache.get(key)
+    stats = response_cache.stats()
+    if (stats["hits"] + stats["misses"]) % CACHE_STATS_EVERY == 0:
+        logger.info(f"Response cache: {stats}, coalescing: {upstream_calls.stats()}, "
+                    f"upstream: {amap_upstreams[tool].stats()}")
+    if data is not MISSING:
+        logger.debug(f"Cache hit for {tool}")
+        return data
+    return await upstream_calls.do(key, fetch_and_cache, tool, key, url, params)
+
+
+async def fetch_and_cache(tool, key, url, params):
+    if tool == "geocode" and "|" not in params["address"]:
+        data = await geocode_batcher.submit((params["address"], params.get("city", "")))
+    else:
+        data = await amap_upstreams[tool].call(http_client.get_json, url, params=params, timeout=AMAP_TIMEOUT,
+                                               hedge=tool in HEDGED_TOOLS)
+    if data.get("status") == "1":
+        response_cache.set(key, data, CACHE_TTL[tool])
+        learn(tool, params, data)
+    return data
+
+
+async def fetch_geocodes(items):
+    """Geocode a batch of (address, city) cache misses, one Amap request per city; answers in the same order"""
+    by_city = {}
+    for i, (_, city) in enumerate(items):
+        by_city.setdefault(city, []).append(i)
+    outcomes = await asyncio.gather(*[fetch_city_geocodes([items[i][0] for i in indexes], city)
+                                      for city, indexes in by_city.items()], return_exceptions=True)
+    results = [None] * len(items)
+    for indexes, outcome in zip(by_city.values(), outcomes):
+        for n, i in enumerate(indexes):
+            results[i] = outcome if isinstance(outcome, Exception) else outcome[n]
+    return results
+
+
+async def fetch_city_geocodes(addresses, city):
+    """Amap geocode answers for `addresses` in `city`, split out of one batch=true request"""
+    url = f"{AMAP_API_BASE}/v3/geocode/geo"
+    params = {"address": addresses[0], "city": city, "output": "json", "key": MAP_API_KEY}
+    if len(addresses) == 1:
+        # Single mode can return several candidates for an ambiguous address, batch mode only the first
+        return [await amap_upstreams["geocode"].call(http_client.get_json, url, params=params, timeout=AMAP_TIMEOUT,
+                                                     hedge=True)]
+    params.update(address="|".join(addresses), batch="true")
+    data = await amap_upstreams["geocode_batch"].call(http_client.get_json, url, params=params, timeout=AMAP_TIMEOUT,
+                                                      hedge=True)
+    geocodes = data.get("geocodes") or []
+    if data.get("status") != "1":
+        return [data] * len(addresses)  # The error applies to every address
+    if len(geocodes) != len(addresses):
+        logger.warning(f"Batch geocode returned {len(geocodes)} results for {len(addresses)} addresses, "
+                       f"geocoding them one by one")
+        return [answer for address in addresses for answer in await fetch_city_geocodes([address], city)]
+    status = pick(data, ("status", "info", "infocode"))
+    # Addresses Amap could not resolve come back as entries with empty fields
+    return [{**status, "count": "1", "geocodes": [item]} if not is_empty(item.get("location"))
+            else {**status, "count": "0", "geocodes": []} for item in geocodes]
+
+
+geocode_batcher = MicroBatcher("amap-geocode", fetch_geocodes, window=GEOCODE_BATCH_WINDOW_MS / 1000,
+                               max_size=GEOCODE_BATCH_SIZE)
+
+
+def learn(tool, params, data):
+    """Add the places of a fresh Amap answer to the local index"""
+    try:
+        if tool == "geocode":
+            for item in (data.get("geocodes") or [])[:1]:
+                record = pick(item, GEOCODE_RECORD_FIELDS)
+                record["name"] = record.get("formatted_address") or params["address"]
+                poi_index.add(record, address=params["address"], city=params.get("city", ""))
+        elif tool == "input_tips":
+            for item in data.get("tips") or []:
+                poi_index.add(pick(item, RESULT_FIELDS["input_tips"][1]))
+    except Exception as e:
+        logger.warning(f"Failed to add {tool} result to the POI index: {e}")
+
+
+def local_answer(tool, places, info="OK"):
+    """Amap-shaped answer built from local index places"""
+    key, fields = RESULT_FIELDS[tool]
+    if tool == "geocode":
+        places = [{"formatted_address": place.get("address"), **place} for place in places]
+    return {"status": "1", "info": info, "count": str(len(places)), key: [pick(place, fields) for place in places],
+            "source": "local"}
+
+
+def quantize(points, grid=ROUTE_GRID):
+    """Snap "lng,lat;lng,lat" points to a grid of `grid` meters"""
+    if grid <= 0:
+        return points
+    snapped = []
+    for point in points.split(";"):
+        try:
+            lng, lat = (float(v) for v in point.split(","))
+        except ValueError:
+            snapped.append(point)  # Let Amap report the bad coordinate
+            continue
+        step = grid / 111320.0  # Degrees of latitude per grid cell
+        lat = round(lat / step) * step
+        lng_step = step / max(math.cos(math.radians(lat)), 0.01)
+        snapped.append(f"{round(lng / lng_step) * lng_step:.6f},{lat:.6f}")
+    return ";".join(snapped)
+
+
+def route_key(params):
+    return make_key("plan_driving_route", {
+        **{k: v for k, v in params.items() if k not in ("key", "output")},
+        **{k: quantize(params[k]) for k in ("origin", "destination", "waypoints") if k in params},
+    })
+
+
+def cached_route(params, detail):
+    """Cached route for `params`, or MISSING; a "base" request without detail="full" can use an "all" answer"""
+    keys = [route_key(params)]
+    if params["extensions"] == "base" and detail != "full":
+        keys.append(route_key({**params, "extensions": "all"}))
+    data = MISSING
+    for key in keys:
+        data = route_cache.get(key)
+        if data is not MISSING:
+            break
+    if data is MISSING:
+        route_stats["misses"] += 1
+    else:
+        route_stats["hits"] += 1
+        route = data.get("route") or {}
+        if (route.get("origin"), route.get("destination")) != (params["origin"], params["destination"]):
+            route_stats["nearby_hits"] += 1
+    total = route_stats["hits"] + route_stats["misses"]
+    if total % CACHE_STATS_EVERY == 0:
+        logger.info(f"Route cache: {route_cache_stats()}")
+    return data
+
+
+def route_cache_stats():
+    total = route_stats["hits"] + route_stats["misses"]
+    return {**route_stats, "hit_rate": round(route_stats["hits"] / total, 3) if total else 0.0,
+            "grid_m": ROUTE_GRID, "size": route_cache.stats()["size"]}
+
+
+async def fetch_route(key, url, params):
+    data = await amap_upstreams["plan_driving_route"].call(http_client.get_json, url, params=params, timeout=AMAP_TIMEOUT)
+    if data.get("status") == "1":
+        route_cache.set(key, data, ROUTE_TTL)
+    return data
+
+
+def project(tool, data):
+    """Keep only the fields of `tool`'s result list the device uses"""
+    if data.get("status") != "1" or tool not in RESULT_FIELDS:
+        return data
+    key, fields = RESULT_FIELDS[tool]
+    return {**pick(data, STATUS_FIELDS), key: [pick(item, fields) for item in data.get(key) or []]}
+
+
+def summarize_route(data, detail):
+    """Route summary: per path the totals and roads, with "steps" also the steps and a simplified polyline"""
+    if data.get("status") != "1" or detail == "full":
+        return data
+    route = data.get("route") or {}
+    paths = []
+    for path in route.get("paths") or []:
+        steps = path.get("steps") or []
+        summary = pick(path, ROUTE_PATH_FIELDS)
+        summary["roads"] = list(dict.fromkeys(step["road"] for step in steps if not is_empty(step.get("road"))))
+        if detail == "steps":
+            summary["steps"] = [pick(step, ROUTE_STEP_FIELDS) for step in steps]
+            points = [point for step in steps for point in parse_polyline(step.get("polyline") or "")]
+            summary["polyline"] = format_polyline(simplify(points, POLYLINE_TOLERANCE))
+        paths.append(summary)
+    return {**pick(data, STATUS_FIELDS), "route": {**pick(route, ROUTE_FIELDS), "paths": paths}}
+
+async def lookup_geocode(address, city):
+    """Geocode answer for one address: local POI index, response cache, then Amap (batched with concurrent lookups)"""
     api_key = MAP_API_KEY
-    url = "https://restapi.amap.com/v3/geocode/geo"
+    url = f"{AMAP_API_BASE}/v3/geocode/geo"
     params = {
         "address": address,
         "city": city,
@@ -35,18 +277,55 @@ def geocode(address: str, city: str = "") -> dict:
     }
     
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        place = poi_index.geocode(address, city)
+        if place is not None:
+            logger.info("Geocode answered from the local POI index")
+            return local_answer("geocode", [place])
+        data = await cached_get("geocode", url, params)
         logger.info(f"Geocode API status: {data.get('status')}") 
-        return data
+        return project("geocode", data)
     except Exception as e:
         logger.error(f"Error calling geocode API: {e}")
+        places, _ = poi_index.tips(address, city=city, limit=1)
+        if places:
+            return local_answer("geocode", places, info=f"OFFLINE: {e}")
         return {"status": "0", "info": str(e)}
-@mcp.tool()
-def get_weather(city: str) -> dict:
+
+@mcp.tool(structured_output=False)
+async def geocode(address: str, city: str = "") -> str:
+    """Convert address to geographic coordinates using Amap API."""
+    return compact_json(await lookup_geocode(address, city))
+
+@mcp.tool(structured_output=False)
+async def geocode_batch(addresses: List[str], city: str = "") -> str:
+    """Convert several addresses to geographic coordinates in one call, e.g. the origin, destination and
+    waypoints of a route, faster than calling geocode for each
+    
+    Parameters:
+        addresses: Addresses to convert, at most 50
+        city: Optional city the addresses are in
+        
+    Returns:
+        One geocode result per address, in the same order, each with the address it belongs to
+    """
+    wanted = [address.strip() for address in addresses if address.strip()]
+    if not wanted:
+        return compact_json({"status": "0", "info": "addresses must not be empty"})
+    if len(wanted) > MAX_BATCH_ADDRESSES:
+        return compact_json({"status": "0", "info": f"At most {MAX_BATCH_ADDRESSES} addresses per call"})
+    # Looked up together, so the cache misses go to Amap as multi-address requests
+    results = await asyncio.gather(*[lookup_geocode(address, city) for address in wanted])
+    return compact_json({
+        "status": "1" if any(result.get("status") == "1" for result in results) else "0",
+        "count": str(len(results)),
+        "results": [{"address": address, **result} for address, result in zip(wanted, results)],
+    })
+
+@mcp.tool(structured_output=False)
+async def get_weather(city: str) -> str:
     """Get weather information for a city using Amap API."""
     api_key = MAP_API_KEY
-    url = "https://restapi.amap.com/v3/weather/weatherInfo"
+    url = f"{AMAP_API_BASE}/v3/weather/weatherInfo"
     params = {
         "city": city,
         "key": api_key,
@@ -54,17 +333,16 @@ def get_weather(city: str) -> dict:
     }
     
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = await cached_get("get_weather", url, params)
         logger.info(f"Weather API status: {data.get('status')}")
-        return data
+        return compact_json(data)
     except Exception as e:
         logger.error(f"Error calling weather API: {e}")
-        return {"status": "0", "info": str(e)}
+        return compact_json({"status": "0", "info": str(e)})
 
-@mcp.tool()
-def plan_driving_route(origin: str, destination: str, waypoints: str = "", strategy: str = "0", 
-                      extensions: str = "base", avoid_road: str = "") -> dict:
+@mcp.tool(structured_output=False)
+async def plan_driving_route(origin: str, destination: str, waypoints: str = "", strategy: str = "0", 
+                      extensions: str = "base", avoid_road: str = "", detail: str = "summary") -> str:
     """Plan a driving route between two points
     
     Parameters:
@@ -74,12 +352,16 @@ def plan_driving_route(origin: str, destination: str, waypoints: str = "", strat
         strategy: Route planning strategy, default is "0" (speed priority)
         extensions: Return basic information ("base") or all information ("all")
         avoid_road: Specify roads to avoid
+        detail: "summary" (default) for distance, time and roads of each path, "steps" to add the
+            turn-by-turn steps and a simplified polyline, "full" for the raw Amap response
         
     Returns:
         Route planning information, including distance, time, and detailed route segments
     """
+    if detail not in ROUTE_DETAILS:
+        return compact_json({"status": "0", "info": f"Unknown detail: {detail}, use one of {list(ROUTE_DETAILS)}"})
     api_key = MAP_API_KEY
-    url = "https://restapi.amap.com/v3/direction/driving"
+    url = f"{AMAP_API_BASE}/v3/direction/driving"
     params = {
         "origin": origin,
         "destination": destination,
@@ -96,17 +378,21 @@ def plan_driving_route(origin: str, destination: str, waypoints: str = "", strat
         params["avoidroad"] = avoid_road
     
     try:
-        response = requests.get(url, params=params)
-        response.encoding = 'utf-8'
-        data = response.json()
+        data = cached_route(params, detail)
+        if data is MISSING:
+            key = route_key(params)
+            if extensions == "base" and detail != "full" and route_key({**params, "extensions": "all"}) in upstream_calls.calls:
+                params["extensions"] = "all"  # Join the same trip already being fetched with all extensions
+                key = route_key(params)
+            data = await upstream_calls.do(key, fetch_route, key, url, params)
         logger.info(f"Driving route planning API status: {data.get('status')}")
-        return data
+        return compact_json(summarize_route(data, detail))
     except Exception as e:
         logger.error(f"Error calling driving route planning API: {e}")
-        return {"status": "0", "info": str(e)}
+        return compact_json({"status": "0", "info": str(e)})
 
-@mcp.tool()
-def input_tips(keywords: str, location: str = "", city: str = "", types: str = "", datatype: str = "all") -> dict:
+@mcp.tool(structured_output=False)
+async def input_tips(keywords: str, location: str = "", city: str = "", types: str = "", datatype: str = "all") -> str:
     """Provide input suggestion service, returning matching POI information based on keywords
     
     Parameters:
@@ -120,7 +406,7 @@ def input_tips(keywords: str, location: str = "", city: str = "", types: str = "
         List of matching location information
     """
     api_key = MAP_API_KEY
-    url = "https://restapi.amap.com/v3/assistant/inputtips"
+    url = f"{AMAP_API_BASE}/v3/assistant/inputtips"
     params = {
         "keywords": keywords,
         "key": api_key,
@@ -137,14 +423,25 @@ def input_tips(keywords: str, location: str = "", city: str = "", types: str = "
     if types:
         params["types"] = types
     
+    # The local index only holds POIs, so type filters always go to Amap; it only answers
+    # for a place (location or city) and a keyword specific enough to match few names
+    if (not types and datatype in ("all", "poi") and (location or city)
+            and len(normalize(keywords)) >= POI_TIPS_MIN_CHARS):
+        places, nearby = poi_index.tips(keywords, location, city)
+        if POI_TIPS_MIN and nearby >= POI_TIPS_MIN:
+            logger.info(f"Input tips answered from the local POI index ({nearby} places)")
+            return compact_json(local_answer("input_tips", places))
+
     try:
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = await cached_get("input_tips", url, params)
         logger.info(f"Input tips API status: {data.get('status')}")
-        return data
+        return compact_json(project("input_tips", data))
     except Exception as e:
         logger.error(f"Error calling input tips API: {e}")
-        return {"status": "0", "info": str(e)}
+        places, _ = poi_index.tips(keywords, location, city)
+        if places:
+            return compact_json(local_answer("input_tips", places, info=f"OFFLINE: {e}"))
+        return compact_json({"status": "0", "info": str(e)})
 
 if __name__ == "__main__":
     mcp.run(transport="stdio")
\ No newline at end of file
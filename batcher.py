@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Micro-batching of concurrent upstream calls
+
+Callers `submit()` one item each and wait for its result. Items arriving
+within `window` seconds of the first pending one are sent together in one
+call of `flush(items)`, which returns the results in the same order (an
+Exception instance in place of a result fails just that item). A batch
+goes out early when it reaches `max_size`.
+
+With a `limit` (scheduler.AdaptiveLimit) at most that many batches are in
+flight: while the upstream is busy, items keep collecting (up to
+`max_size`) and go out as soon as a batch returns, so batches grow with
+the load instead of adding requests. The limit adapts to batch latency.
+
+A caller that is canceled while its item is pending drops the item from
+the batch; once the batch is sent it can only stop waiting for it.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger('batcher')
+
+
+class MicroBatcher:
+    def __init__(self, name, flush, window=0.005, max_size=16, limit=None):
+        self.name = name
+        self.flush_fn = flush  # async fn(items) -> list of results in the same order
+        self.window = window  # Seconds to wait for more items after the first one
+        self.max_size = max_size
+        self.limit = limit  # Batches in flight at once, None for no limit
+        self.due = False  # The window has passed but the limit held the batch back
+        self.pending = []  # (item, future) of the batch being collected
+        self.timer = None
+        self.sending = set()  # Batch tasks in flight, kept referenced until they finish
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        """Add `item` to the next batch and return its result"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((item, future))
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        """Send the pending items now, or as soon as the limit allows"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.pending = [(item, future) for item, future in self.pending if not future.done()]
+        while self.pending:
+            if self.limit is not None and len(self.sending) >= int(self.limit):
+                self.due = True
+                return
+            batch, self.pending = self.pending[:self.max_size], self.pending[self.max_size:]
+            task = asyncio.ensure_future(self.send(batch))
+            self.sending.add(task)
+            task.add_done_callback(self.sent)
+        self.due = False
+
+    def sent(self, task):
+        self.sending.discard(task)
+        if self.pending and (self.due or len(self.pending) >= self.max_size):
+            self.flush()
+
+    async def send(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        in_flight = len(self.sending)
+        start = time.monotonic()
+        try:
+            results = await self.flush_fn([item for item, _ in batch])
+        except Exception as e:
+            logger.warning(f"[{self.name}] Batch of {len(batch)} failed: {e}")
+            results = [e] * len(batch)
+        if self.limit is not None:
+            failed = any(isinstance(result, Exception) for result in results)
+            self.limit.update(time.monotonic() - start, ok=not failed, in_flight=in_flight)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # The caller stopped waiting
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,169 @@
+"""
+Overload behaviour of mcp_pipe.py: calls answered in time vs. piling up.
+
+A stdlib child serves a `slow` tool backed by an "upstream" that handles
+`--capacity` calls at once, `--service` seconds each, and a `fast` tool
+answered at once. A local WebSocket endpoint sends `slow` calls at
+`--rate` per second (above capacity) and a `fast` call every 100 ms for
+`--duration` seconds, as devices would, then waits for every answer.
+
+A call is useful only if answered within `--deadline` seconds (the
+device's timeout). Reports per tool how many calls got a result in time,
+how many were shed with an overloaded error and how quickly, and the
+p50/p99 latency of results. Compare e.g.:
+
+python benchmarks/bench_admission.py --pipe /path/to/old/mcp_pipe.py
+MCP_PIPE_TOOL_LIMITS=slow=4 MCP_PIPE_QUEUE_SIZE=4 python benchmarks/bench_admission.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child with a slow tool behind a capacity-limited upstream and a fast tool
+CHILD = r'''
+import json, sys, threading, time
+CAPACITY, SERVICE = int(sys.argv[1]), float(sys.argv[2])
+upstream = threading.Semaphore(CAPACITY)
+lock = threading.Lock()
+
+def reply(msg_id, result):
+    with lock:
+        sys.stdout.write(json.dumps({"jsonrpc": "2.0", "id": msg_id, "result": result}) + "\n")
+        sys.stdout.flush()
+
+def slow(msg_id):
+    with upstream:
+        time.sleep(SERVICE)
+    reply(msg_id, {"content": [{"type": "text", "text": "slow"}], "isError": False})
+
+for line in sys.stdin:
+    if not line.strip():
+        continue
+    msg = json.loads(line)
+    if msg.get("method") == "initialize":
+        reply(msg["id"], {"protocolVersion": "2024-11-05", "capabilities": {"tools": {}},
+                          "serverInfo": {"name": "bench", "version": "1"}})
+    elif msg.get("method") == "tools/call":
+        if msg["params"]["name"] == "slow":
+            threading.Thread(target=slow, args=(msg["id"],), daemon=True).start()
+        else:
+            reply(msg["id"], {"content": [{"type": "text", "text": "fast"}], "isError": False})
+    elif "id" in msg:
+        reply(msg["id"], {})  # ping
+'''
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[max(0, int(round(q * len(values))) - 1)] if values else None
+
+
+def ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+async def run_benchmark(pipe_script, args):
+    outcomes = {"slow": [], "fast": []}  # (kind, latency) with kind "result" or "shed"
+    done = asyncio.Event()
+
+    async def handler(websocket):
+        sent = {}
+
+        async def sender():
+            start = time.perf_counter()
+            calls = {"slow": 0, "fast": 0}
+            while (elapsed := time.perf_counter() - start) < args.duration:
+                for tool, rate in (("slow", args.rate), ("fast", 10)):
+                    while calls[tool] < int(elapsed * rate) + 1:
+                        calls[tool] += 1
+                        await send(tool, calls[tool])
+                await asyncio.sleep(0.005)
+
+        async def send(tool, i):
+            msg_id = f"{tool}-{i}"
+            sent[msg_id] = (time.perf_counter(), tool)
+            await websocket.send(json.dumps({"jsonrpc": "2.0", "id": msg_id, "method": "tools/call",
+                                             "params": {"name": tool, "arguments": {}}}))
+
+        send_task = asyncio.create_task(sender())
+        try:
+            while not send_task.done() or sent:
+                try:
+                    message = json.loads(await asyncio.wait_for(websocket.recv(), timeout=0.5))
+                except asyncio.TimeoutError:
+                    if send_task.done() and sent and time.perf_counter() - min(t for t, _ in sent.values()) > 120:
+                        break
+                    continue
+                if message.get("id") not in sent:
+                    continue
+                started, tool = sent.pop(message["id"])
+                outcomes[tool].append(("result" if "result" in message else "shed", time.perf_counter() - started))
+        finally:
+            await send_task
+            done.set()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False, encoding='utf-8') as f:
+        f.write(f"import sys\nsys.argv[1:] = ['{args.capacity}', '{args.service}']\n" + CHILD)
+        child_script = f.name
+    try:
+        async with websockets.serve(handler, "127.0.0.1", args.port):
+            env = dict(os.environ, MCP_ENDPOINT=f"ws://127.0.0.1:{args.port}")
+            pipe = await asyncio.create_subprocess_exec(
+                sys.executable, pipe_script, child_script, env=env, cwd=ROOT,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                await asyncio.wait_for(done.wait(), timeout=args.duration + 300)
+            finally:
+                pipe.terminate()
+                await pipe.wait()
+    finally:
+        os.unlink(child_script)
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how mcp_pipe.py behaves when a tool is overloaded")
+    parser.add_argument("--pipe", default=os.path.join(ROOT, "mcp_pipe.py"), help="Path of the pipe script")
+    parser.add_argument("--rate", type=float, default=12, help="slow calls per second")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load")
+    parser.add_argument("--capacity", type=int, default=4, help="Concurrent calls the slow upstream serves")
+    parser.add_argument("--service", type=float, default=0.5, help="Seconds per slow call")
+    parser.add_argument("--deadline", type=float, default=10, help="Device timeout in seconds")
+    parser.add_argument("--port", type=int, default=8880)
+    args = parser.parse_args()
+
+    outcomes = asyncio.run(run_benchmark(os.path.abspath(args.pipe), args))
+    stats = {
+        "pipe": os.path.relpath(os.path.abspath(args.pipe), ROOT),
+        "settings": {k: v for k, v in os.environ.items() if k.startswith("MCP_PIPE_")},
+        "offered_per_s": args.rate,
+        "capacity_per_s": args.capacity / args.service,
+    }
+    for tool, results in outcomes.items():
+        latencies = [latency for kind, latency in results if kind == "result"]
+        shed = [latency for kind, latency in results if kind == "shed"]
+        stats[tool] = {
+            "calls": len(results),
+            "in_time": sum(1 for latency in latencies if latency <= args.deadline),
+            "late": sum(1 for latency in latencies if latency > args.deadline),
+            "shed": len(shed),
+            "shed_p50_ms": ms(statistics.median(shed)) if shed else None,
+            "p50_ms": ms(statistics.median(latencies)) if latencies else None,
+            "p99_ms": ms(percentile(latencies, 0.99)),
+        }
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
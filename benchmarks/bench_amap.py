@@ -0,0 +1,124 @@
+"""
+Throughput benchmark for Amap_MCP tools against a local stub of restapi.amap.com.
+
+Fires `--calls` concurrent `geocode` calls the way FastMCP runs them on its
+event loop (sync tools inline, async tools concurrently) and reports calls
+per second and latency.
+
+With `--addresses N` each call stands for a route-planning flow that
+geocodes N addresses (origin, destination, waypoints): one geocode call
+after another, or with `--batch` a single geocode_batch call.
+`--batch-window` sets AMAP_GEOCODE_BATCH_WINDOW_MS, the window in which
+concurrent geocode calls are merged into multi-address requests.
+
+Usage:
+
+python benchmarks/bench_amap.py [--calls 200] [--concurrency 50] [--latency 0.05]
+python benchmarks/bench_amap.py --addresses 4 [--batch]
+python benchmarks/bench_amap.py --batch-window 5
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import inspect
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import stub_process, stub_requests  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # Tool modules import their shared helpers from the repo root
+
+
+def load_module(path):
+    """Import the tool module at `path` under a private name"""
+    spec = importlib.util.spec_from_file_location("amap_mcp_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def call_tool(tool, *args):
+    if inspect.iscoroutinefunction(tool):
+        result = await tool(*args)
+    else:
+        result = tool(*args)  # FastMCP runs sync tools inline on its event loop
+    if isinstance(result, str):
+        result = json.loads(result)  # The tools return compact JSON text
+    assert result.get("status") == "1", result
+    return result
+
+
+async def run_benchmark(module, calls, concurrency, unique, addresses=1, batch=False):
+    """Run `calls` tool calls with `concurrency` in flight, return (elapsed, latencies)"""
+    window = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        names = [f"北京市朝阳区望京{i if unique else 0}号{n or ''}" for n in range(addresses)]
+        async with window:
+            start = time.perf_counter()
+            if batch:
+                await call_tool(module.geocode_batch, names)
+            else:
+                for name in names:
+                    await call_tool(module.geocode, name)
+            latencies.append(time.perf_counter() - start)
+
+    import http_client
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[one(i) for i in range(calls)])
+    finally:
+        await http_client.close_sessions()
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent Amap geocode calls")
+    parser.add_argument("--module", default=os.path.join(ROOT, "Amap_MCP.py"), help="Path of the Amap module")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub response latency in seconds")
+    parser.add_argument("--repeat", action="store_true", help="Geocode the same address every time")
+    parser.add_argument("--addresses", type=int, default=1, help="Addresses geocoded per call")
+    parser.add_argument("--batch", action="store_true", help="Geocode a call's addresses with geocode_batch")
+    parser.add_argument("--batch-window", type=float, default=None, help="AMAP_GEOCODE_BATCH_WINDOW_MS")
+    args = parser.parse_args()
+    if args.batch_window is not None:
+        os.environ["AMAP_GEOCODE_BATCH_WINDOW_MS"] = str(args.batch_window)
+
+    with stub_process("amap", latency=args.latency) as url:
+        os.environ["AMAP_API_BASE"] = url
+        module = load_module(os.path.abspath(args.module))
+        logging.getLogger("MapNavigator").setLevel(logging.WARNING)
+        elapsed, latencies = asyncio.run(run_benchmark(module, args.calls, args.concurrency, not args.repeat,
+                                                       args.addresses, args.batch))
+        upstream = stub_requests(url)
+
+    stats = {
+        "module": os.path.relpath(os.path.abspath(args.module), ROOT),
+        "calls": args.calls,
+        "concurrency": args.concurrency,
+        "addresses_per_call": args.addresses,
+        "batch": args.batch,
+        "batch_window_ms": os.getenv("AMAP_GEOCODE_BATCH_WINDOW_MS", "default"),
+        "stub_latency_ms": args.latency * 1000,
+        "upstream_requests": upstream,
+        "calls_per_s": round(args.calls / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(sorted(latencies)[max(0, int(round(0.99 * len(latencies))) - 1)] * 1000, 1),
+    }
+    if hasattr(module, "response_cache"):
+        stats["cache"] = module.response_cache.stats()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Throughput vs. latency of ragflow_mcp.py's retrieval micro-batching.
+
+Runs `--clients` closed-loop callers of start_search (each asks a new
+question as soon as the previous one is answered) for `--duration` seconds
+against a local RAGFlow stub, once per batching window in `--windows`.
+Window 0 is batching off (one retrieval request per search); otherwise a
+batch is one request to the stub's batch retrieval endpoint.
+
+The stub processes at most `--capacity` requests at once, each costing
+`--latency` seconds (embedding the question, searching the index) plus
+`--cost` seconds per question. The same run with one client shows the
+latency a window adds when there is nothing to batch with.
+
+Usage:
+
+python benchmarks/bench_batch.py [--clients 64] [--windows 0,2,5,10,20] [--duration 5]
+"""
+
+import argparse
+import asyncio
+import functools
+import importlib.util
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import StubServer, ragflow_batch_retrieval, ragflow_datasets, ragflow_retrieval  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # Tool modules import their shared helpers from the repo root
+
+
+def load_module():
+    """Import ragflow_mcp.py afresh, so it picks up the current environment"""
+    spec = importlib.util.spec_from_file_location("ragflow_mcp_bench", os.path.join(ROOT, "ragflow_mcp.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    logging.getLogger("ragflow_mcp").setLevel(logging.WARNING)
+    return module
+
+
+async def closed_loop(module, clients, duration):
+    """`clients` callers asking new questions back to back for `duration` seconds, return latencies"""
+    start_search = getattr(module.start_search, "fn", module.start_search)
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def client(n):
+        i = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            result = await start_search(f"client {n} question {i}")
+            assert result.get("success"), result
+            latencies.append(time.perf_counter() - start)
+            i += 1
+
+    try:
+        await asyncio.gather(*[client(n) for n in range(clients)])
+    finally:
+        await module.http_client.close_sessions()
+    return latencies
+
+
+def run(stub, window, clients, duration):
+    os.environ["RAGFLOW_BATCH_WINDOW_MS"] = str(window)
+    os.environ["RAGFLOW_BATCH_URL"] = f"{stub.url}/api/v1/retrieval/batch"
+    module = load_module()
+    latencies = sorted(asyncio.run(closed_loop(module, clients, duration)))
+    row = {
+        "window_ms": window,
+        "clients": clients,
+        "searches_per_s": round(len(latencies) / duration, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[max(0, int(round(0.99 * len(latencies))) - 1)] * 1000, 1),
+    }
+    if module.search_batcher is not None:
+        row["mean_batch_size"] = module.search_batcher.stats()["mean_batch_size"]
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ragflow retrieval micro-batching")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--windows", default="0,2,5,10,20", help="Comma-separated batching windows in ms, 0 is off")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    parser.add_argument("--capacity", type=int, default=8, help="Requests the stub processes at once")
+    parser.add_argument("--latency", type=float, default=0.03, help="Stub cost per request in seconds")
+    parser.add_argument("--cost", type=float, default=0.005, help="Stub cost per question in seconds")
+    args = parser.parse_args()
+    windows = [float(window) for window in args.windows.split(",")]
+
+    routes = {
+        "/api/v1/retrieval": functools.partial(ragflow_retrieval, cost=args.cost),
+        "/api/v1/retrieval/batch": functools.partial(ragflow_batch_retrieval, cost=args.cost),
+        "/api/v1/datasets": ragflow_datasets,
+    }
+    rows = []
+    with StubServer(routes, latency=args.latency, capacity=args.capacity) as stub:
+        os.environ["RAGFLOW_API_URL"] = f"{stub.url}/api/v1/retrieval"
+        for window in windows:
+            for clients in (1, args.clients):
+                rows.append(run(stub, window, clients, args.duration))
+                print(json.dumps(rows[-1]), file=sys.stderr)
+
+    print(json.dumps({
+        "stub_capacity": args.capacity,
+        "stub_latency_s": args.latency,
+        "stub_cost_per_question_s": args.cost,
+        "runs": rows,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Streaming benchmark for music.py against a local stub of the music API.
+
+Generates a test song with ffmpeg, serves it from a stub throttled to
+`--bandwidth` bytes per second, then calls `play_music` and plays the
+returned `ws://` source. Reports the time to the first Opus frame (the
+old tool only answered after the whole download) against the time the
+full download takes, and the time to the first frame of a cached replay.
+
+Usage:
+
+python benchmarks/bench_music.py [--seconds 30] [--bandwidth 65536]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import StubServer  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # Tool modules import their shared helpers from the repo root
+
+
+def make_song(seconds, ffmpeg):
+    """A `seconds` long 128 kbit/s MP3 tone"""
+    return subprocess.run(
+        [ffmpeg, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}',
+         '-c:a', 'libmp3lame', '-b:a', '128k', '-f', 'mp3', 'pipe:1'],
+        check=True, capture_output=True
+    ).stdout
+
+
+def load_module(path):
+    """Import the tool module at `path` under a private name"""
+    spec = importlib.util.spec_from_file_location("music_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def play(source):
+    """Play `source` to the end, return (seconds to first frame, seconds to last frame, frames)"""
+    start = time.perf_counter()
+    first = None
+    frames = 0
+    async with websockets.connect(source) as websocket:
+        async for _ in websocket:
+            if first is None:
+                first = time.perf_counter() - start
+            frames += 1
+    return first, time.perf_counter() - start, frames
+
+
+async def run_benchmark(module, song_name):
+    import http_client
+    try:
+        result = await module.play_music(song_name)
+        assert isinstance(result, dict), result
+        first_frame, last_frame, frames = await play(result["source"])
+        cached_first_frame, _, cached_frames = await play(result["source"])
+    finally:
+        await http_client.close_sessions()
+    return {
+        "first_frame_s": round(first_frame, 3),
+        "last_frame_s": round(last_frame, 3),
+        "frames": frames,
+        "cached_first_frame_s": round(cached_first_frame, 3),
+        "cached_frames": cached_frames,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark music.py time to first frame")
+    parser.add_argument("--seconds", type=int, default=30, help="Length of the test song")
+    parser.add_argument("--bandwidth", type=int, default=64 * 1024, help="Stub download speed in bytes per second")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    ffmpeg = os.getenv("FFMPEG_PATH", "ffmpeg")
+    song = make_song(args.seconds, ffmpeg)
+
+    with StubServer({}, bandwidth=args.bandwidth) as stub, tempfile.TemporaryDirectory() as cache_dir:
+        stub.routes.update({
+            "/api/music/wy": {"code": 200, "data": {"musicurl": f"{stub.url}/song.mp3"}},
+            "/song.mp3": song,
+        })
+        start = time.perf_counter()
+        urllib.request.urlopen(f"{stub.url}/song.mp3").read()
+        download = time.perf_counter() - start
+
+        os.environ.update(MUSIC_API_URL=f"{stub.url}/api/music/wy", MUSIC_CACHE_DIR=cache_dir,
+                          MUSIC_STREAM_PORT=str(args.port))
+        module = load_module(os.path.join(ROOT, "music.py"))
+        logging.getLogger("music_bench").setLevel(logging.WARNING)
+        stats = asyncio.run(run_benchmark(module, "bench song"))
+
+    print(json.dumps({
+        "song_seconds": args.seconds,
+        "song_bytes": len(song),
+        "bandwidth_bytes_per_s": args.bandwidth,
+        "full_download_s": round(download, 3),
+        **stats,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
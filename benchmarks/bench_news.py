@@ -0,0 +1,108 @@
+"""
+Time-to-first-item benchmark for web_news.get_web_news.
+
+Runs web_news.py behind mcp_pipe.py against a local WebSocket endpoint and
+a local stub of Coze's streaming workflow API that emits one news item
+every `--delay` seconds. Calls the tool with a progress token and reports
+when the first item arrived as a `notifications/progress` message versus
+when the final tool result arrived (which is when a caller without
+streaming hears anything).
+
+Usage:
+
+python benchmarks/bench_news.py [--items 5] [--delay 0.3] [--runs 5]
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import statistics
+import sys
+import time
+
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import StubServer, coze_workflow_stream  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def run_benchmark(runs, port):
+    """Call get_web_news `runs` times through mcp_pipe, return [(first item s, result s, items)]"""
+    samples = []
+    done = asyncio.Event()
+
+    async def handler(websocket):
+        await websocket.send(json.dumps({
+            "jsonrpc": "2.0", "id": "init", "method": "initialize",
+            "params": {"protocolVersion": "2024-11-05", "capabilities": {}, "clientInfo": {"name": "bench", "version": "1"}}
+        }))
+        while json.loads(await websocket.recv()).get("id") != "init":
+            pass
+        await websocket.send(json.dumps({"jsonrpc": "2.0", "method": "notifications/initialized"}))
+
+        for run in range(runs):
+            start = time.perf_counter()
+            await websocket.send(json.dumps({
+                "jsonrpc": "2.0", "id": run, "method": "tools/call",
+                "params": {"name": "get_web_news", "arguments": {"input_query": f"news {run}"},
+                           "_meta": {"progressToken": f"news-{run}"}}
+            }))
+            first = None
+            items = 0
+            while True:
+                message = json.loads(await websocket.recv())
+                if message.get("method") == "notifications/progress":
+                    items += 1
+                    if first is None:
+                        first = time.perf_counter() - start
+                elif message.get("id") == run:
+                    result = json.loads(message["result"]["content"][0]["text"])
+                    assert result.get("success"), result
+                    samples.append((first, time.perf_counter() - start, items))
+                    break
+        done.set()
+
+    async with websockets.serve(handler, "127.0.0.1", port):
+        env = dict(os.environ, MCP_ENDPOINT=f"ws://127.0.0.1:{port}")
+        pipe = await asyncio.create_subprocess_exec(
+            sys.executable, "mcp_pipe.py", "web_news.py",
+            env=env, cwd=ROOT,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            await asyncio.wait_for(done.wait(), timeout=300)
+        finally:
+            pipe.terminate()
+            await pipe.wait()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark get_web_news time to first item")
+    parser.add_argument("--items", type=int, default=5, help="News items per workflow run")
+    parser.add_argument("--delay", type=float, default=0.3, help="Seconds between items in the Coze stub")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8866)
+    args = parser.parse_args()
+
+    route = functools.partial(coze_workflow_stream, items=args.items, delay=args.delay)
+    with StubServer({"/v1/workflow/stream_run": route}) as stub:
+        os.environ.update(COZE_API_BASE=stub.url, COZE_API_TOKEN="stub", COZE_WORKFLOW_ID="stub")
+        samples = asyncio.run(run_benchmark(args.runs, args.port))
+
+    print(json.dumps({
+        "items": args.items,
+        "item_delay_s": args.delay,
+        "runs": args.runs,
+        "progress_items_per_run": samples[-1][2],
+        "first_item_p50_s": round(statistics.median(s[0] for s in samples), 3),
+        "result_p50_s": round(statistics.median(s[1] for s in samples), 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Relay benchmark for mcp_pipe.py.
+
+Starts a local WebSocket server that impersonates the MCP endpoint, runs
+`mcp_pipe.py` against it with a stdlib echo MCP child, fires a burst of
+JSON-RPC requests and reports messages per second and relay latency.
+
+Usage:
+
+python benchmarks/bench_pipe.py [--pipe mcp_pipe.py] [--messages 5000] [--concurrency 64]
+
+Pass `--pipe` pointing at an older copy of mcp_pipe.py to compare before/after.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Minimal MCP-shaped child: answers every request with its params
+ECHO_CHILD = r'''
+import json, sys
+for line in sys.stdin:
+    if not line.strip():
+        continue
+    msg = json.loads(line)
+    if "id" in msg:
+        sys.stdout.write(json.dumps({"jsonrpc": "2.0", "id": msg["id"], "result": msg.get("params")}) + "\n")
+        sys.stdout.flush()
+'''
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_benchmark(pipe_script, messages, concurrency, payload_size, port):
+    """Drive `pipe_script` with `messages` requests and return the measured stats"""
+    payload = "x" * payload_size
+    latencies = []
+    done = asyncio.Event()
+    result = {}
+
+    async def handler(websocket):
+        window = asyncio.Semaphore(concurrency)
+        sent_at = {}
+
+        async def sender():
+            for i in range(messages):
+                await window.acquire()
+                sent_at[i] = time.perf_counter()
+                await websocket.send(json.dumps({
+                    "jsonrpc": "2.0", "id": i, "method": "tools/call",
+                    "params": {"name": "echo", "arguments": {"data": payload}}
+                }))
+
+        start = time.perf_counter()
+        send_task = asyncio.create_task(sender())
+        received = 0
+        while received < messages:
+            reply = json.loads(await websocket.recv())
+            latencies.append(time.perf_counter() - sent_at.pop(reply["id"]))
+            received += 1
+            window.release()
+        elapsed = time.perf_counter() - start
+        await send_task
+        result["elapsed"] = elapsed
+        done.set()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False) as f:
+        f.write(ECHO_CHILD)
+        child_script = f.name
+
+    try:
+        async with websockets.serve(handler, "127.0.0.1", port, max_size=None):
+            env = dict(os.environ, MCP_ENDPOINT=f"ws://127.0.0.1:{port}")
+            pipe = await asyncio.create_subprocess_exec(
+                sys.executable, pipe_script, child_script,
+                env=env, cwd=ROOT,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                await asyncio.wait_for(done.wait(), timeout=300)
+            finally:
+                pipe.terminate()
+                await pipe.wait()
+    finally:
+        os.unlink(child_script)
+
+    elapsed = result["elapsed"]
+    return {
+        "pipe": os.path.relpath(pipe_script, ROOT),
+        "messages": messages,
+        "concurrency": concurrency,
+        "payload_bytes": payload_size,
+        "elapsed_s": round(elapsed, 3),
+        "msgs_per_s": round(messages / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mcp_pipe.py relay throughput and latency")
+    parser.add_argument("--pipe", default=os.path.join(ROOT, "mcp_pipe.py"), help="Path of the pipe script to benchmark")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64, help="Max in-flight requests")
+    parser.add_argument("--payload", type=int, default=256, help="Payload size in bytes")
+    parser.add_argument("--port", type=int, default=8865)
+    args = parser.parse_args()
+
+    stats = asyncio.run(run_benchmark(os.path.abspath(args.pipe), args.messages, args.concurrency, args.payload, args.port))
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
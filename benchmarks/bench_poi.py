@@ -0,0 +1,163 @@
+"""
+Local POI index: startup cost, lookup latency and Amap round trips saved.
+
+Builds an index of `--places` synthetic places (chain stores spread over
+Beijing, plus "家" and "公司") and reports:
+
+- open time of the memory-mapped snapshot vs. loading the same places from
+  JSON lines into the in-memory index;
+- p50 of a location-biased input_tips lookup and an exact geocode lookup;
+- against a local Amap stub: upstream requests and p50 of `--calls`
+  input_tips calls (a chain name near a random spot, so the response cache
+  rarely hits) and geocode calls of the imported places, through the
+  current or `--module` Amap_MCP.py with the snapshot as AMAP_POI_INDEX.
+
+Usage:
+
+python benchmarks/bench_poi.py [--module Amap_MCP.py] [--places 200000] [--calls 300]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import stub_process, stub_requests  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # Tool modules import their shared helpers from the repo root
+
+import poi_index  # noqa: E402
+
+CHAINS = ["麦当劳", "肯德基", "星巴克", "瑞幸咖啡", "全家", "7-ELEVEn", "中国银行", "工商银行", "中石化加油站", "如家酒店",
+          "海底捞", "必胜客", "屈臣氏", "华联超市", "物美超市", "同仁堂", "国美电器", "苏宁易购", "喜茶", "奈雪的茶"]
+BOX = ((116.2, 116.6), (39.75, 40.05))  # Beijing, lng and lat
+FIXED = [
+    {"name": "家", "address": "北京市东城区东直门北大街1号", "location": "116.434446,39.948160", "aliases": ["home"]},
+    {"name": "公司", "address": "北京市朝阳区阜通东大街6号", "location": "116.481028,39.989643", "aliases": ["office"]},
+]
+
+
+def spot(rng):
+    return f"{rng.uniform(*BOX[0]):.6f},{rng.uniform(*BOX[1]):.6f}"
+
+
+def synthetic_places(count, seed=1):
+    rng = random.Random(seed)
+    for record in FIXED:
+        yield dict(record, district="北京市", adcode="110100", source="import")
+    for i in range(count):
+        yield {"id": f"B0SYN{i:08d}", "name": f"{CHAINS[i % len(CHAINS)]}({i}店)", "address": f"测试路{i}号",
+               "location": spot(rng), "district": "北京市朝阳区", "adcode": "110105"}
+
+
+def build(directory, count):
+    """Write the places as a snapshot and as JSON lines, return their paths"""
+    snapshot, lines = os.path.join(directory, "pois.idx"), os.path.join(directory, "pois.jsonl")
+    records = {}
+    with open(lines, "w", encoding="utf-8") as f:
+        for record in synthetic_places(count):
+            keys = [poi_index.address_key(text) for text in [record["name"], record["address"]] + record.get("aliases", [])]
+            records[poi_index.record_id(record)] = (record, keys)
+            f.write(json.dumps({"record": record, "addresses": keys}, ensure_ascii=False) + "\n")
+    poi_index.write_snapshot(snapshot, records)
+    return snapshot, lines
+
+
+def measure_index(snapshot, lines, lookups):
+    start = time.perf_counter()
+    index = poi_index.POIIndex(snapshot)
+    mmap_open = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = poi_index.POIIndex()
+    with open(lines, encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            loaded.insert(entry["record"], entry["addresses"])
+    load_open = time.perf_counter() - start
+
+    rng = random.Random(2)
+    results = {}
+    for name, lookup in (("tips", lambda: index.tips(rng.choice(CHAINS), spot(rng))),
+                         ("geocode", lambda: index.geocode(rng.choice(["家", "office", "测试路42号"])))):
+        latencies = []
+        for _ in range(lookups):
+            start = time.perf_counter()
+            lookup()
+            latencies.append(time.perf_counter() - start)
+        results[f"{name}_p50_us"] = round(statistics.median(latencies) * 1e6, 1)
+    return {"snapshot_bytes": os.path.getsize(snapshot), "mmap_open_ms": round(mmap_open * 1000, 2),
+            "jsonl_load_ms": round(load_open * 1000, 1), **results}
+
+
+def load_module(path):
+    spec = importlib.util.spec_from_file_location("amap_mcp_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def run_calls(module, calls):
+    """Sequential device-like calls, return {tool: [latency]} and how many were answered locally"""
+    import http_client
+    rng = random.Random(3)
+    latencies = {"input_tips": [], "geocode": []}
+    local = 0
+    try:
+        for i in range(calls):
+            if i % 5 == 4:
+                tool, args = "geocode", (rng.choice(["家", "公司", "home"]),)
+            else:
+                tool, args = "input_tips", (rng.choice(CHAINS), spot(rng))
+            start = time.perf_counter()
+            result = json.loads(await getattr(module, tool)(*args))
+            latencies[tool].append(time.perf_counter() - start)
+            assert result.get("status") == "1", result
+            local += result.get("source") == "local"
+    finally:
+        await http_client.close_sessions()
+    return latencies, local
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the local POI index")
+    parser.add_argument("--module", default=os.path.join(ROOT, "Amap_MCP.py"), help="Path of the Amap module")
+    parser.add_argument("--places", type=int, default=200000)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub response latency in seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot, lines = build(directory, args.places)
+        index_stats = measure_index(snapshot, lines, args.lookups)
+        with stub_process("amap", latency=args.latency) as url:
+            os.environ.update(AMAP_API_BASE=url, AMAP_API_KEY="stub", AMAP_POI_INDEX=snapshot)
+            module = load_module(os.path.abspath(args.module))
+            logging.getLogger("MapNavigator").setLevel(logging.WARNING)
+            latencies, local = asyncio.run(run_calls(module, args.calls))
+            upstream = stub_requests(url)
+
+    print(json.dumps({
+        "module": os.path.relpath(os.path.abspath(args.module), ROOT),
+        "places": args.places,
+        "index": index_stats,
+        "calls": args.calls,
+        "stub_latency_ms": args.latency * 1000,
+        "upstream_requests": upstream,
+        "answered_locally": local,
+        **{f"{tool}_p50_ms": round(statistics.median(values) * 1000, 2) for tool, values in latencies.items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Latency benchmark for ragflow_mcp.start_search against a local stub of
+RAGFlow's `/api/v1/retrieval`.
+
+Reports end-to-end latency of `start_search` and the overhead on top of the
+stub's own latency (queueing, hand-off to the worker, completion wake-up).
+
+Usage:
+
+python benchmarks/bench_ragflow.py [--searches 50] [--concurrency 1] [--latency 0.05]
+
+With `--pool N` the searches cycle through N distinct questions, and with
+`--paraphrase` every repeat is reworded slightly, to measure the result
+cache (set RAGFLOW_NEAR_DUPLICATE=0.8 to enable near-duplicate lookup).
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import inspect
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import RAGFLOW_ROUTES, StubServer  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # Tool modules import their shared helpers from the repo root
+
+
+def load_module(path):
+    """Import the tool module at `path` under a private name"""
+    spec = importlib.util.spec_from_file_location("ragflow_mcp_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+PARAPHRASES = ["{}", "{}?", "请问{}", "{}呢", " {} "]
+
+
+def make_question(i, pool, paraphrase):
+    """The i-th question: topic `i % pool`, reworded per round with `paraphrase`"""
+    question = f"公司的差旅报销标准是什么 第{i % pool if pool else i}条"
+    return PARAPHRASES[(i // pool) % len(PARAPHRASES)].format(question) if pool and paraphrase else question
+
+
+async def run_benchmark(module, searches, concurrency, pool=0, paraphrase=False):
+    """Call start_search `searches` times with `concurrency` in flight, return latencies"""
+    tool = module.start_search
+    start_search = getattr(tool, "fn", tool)  # fastmcp wraps the function in a Tool
+    window = asyncio.Semaphore(concurrency)
+    latencies = []
+    wrong = []
+
+    async def one(i):
+        async with window:
+            start = time.perf_counter()
+            if inspect.iscoroutinefunction(start_search):
+                result = await start_search(make_question(i, pool, paraphrase))
+            else:
+                result = await asyncio.to_thread(start_search, make_question(i, pool, paraphrase))
+            latencies.append(time.perf_counter() - start)
+            assert result.get("success"), result
+            # The stub echoes the question it answered: a cache hit for another topic is a wrong answer
+            answered = re.search(r"第(\d+)条", result["results"][0]["content_ltks"]).group(1)
+            if answered != re.search(r"第(\d+)条", make_question(i, pool, paraphrase)).group(1):
+                wrong.append(i)
+
+    try:
+        await asyncio.gather(*[one(i) for i in range(searches)])
+    finally:
+        await module.http_client.close_sessions()
+    return latencies, len(wrong)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ragflow_mcp.start_search latency")
+    parser.add_argument("--module", default=os.path.join(ROOT, "ragflow_mcp.py"), help="Path of the ragflow module")
+    parser.add_argument("--searches", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub response latency in seconds")
+    parser.add_argument("--pool", type=int, default=0, help="Number of distinct questions, 0 for all distinct")
+    parser.add_argument("--paraphrase", action="store_true", help="Reword repeated questions")
+    args = parser.parse_args()
+
+    with StubServer(RAGFLOW_ROUTES, latency=args.latency) as stub:
+        os.environ["RAGFLOW_API_URL"] = f"{stub.url}/api/v1/retrieval"
+        module = load_module(os.path.abspath(args.module))
+        logging.getLogger("ragflow_mcp").setLevel(logging.WARNING)
+        try:
+            latencies, wrong = asyncio.run(run_benchmark(module, args.searches, args.concurrency, args.pool, args.paraphrase))
+        finally:
+            # Older versions run searches on worker threads: stop them, or the interpreter never exits
+            if getattr(module, "executor", None) is not None:
+                for _ in range(module.executor._max_workers):
+                    module.task_queue.put(None)
+                module.executor.shutdown(wait=True)
+
+    p50 = statistics.median(latencies)
+    p99 = sorted(latencies)[max(0, int(round(0.99 * len(latencies))) - 1)]
+    stats = {
+        "module": os.path.relpath(os.path.abspath(args.module), ROOT),
+        "searches": args.searches,
+        "concurrency": args.concurrency,
+        "stub_latency_ms": args.latency * 1000,
+        "p50_ms": round(p50 * 1000, 1),
+        "p99_ms": round(p99 * 1000, 1),
+        "p50_overhead_ms": round((p50 - args.latency) * 1000, 1),
+        "wrong_topic_answers": wrong,
+    }
+    if hasattr(module, "get_cache_stats"):
+        stats["cache"] = module.get_cache_stats()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Amap get_weather calls through a long-tailed upstream, an outage and the recovery.
+
+Runs against an in-process stub of restapi.amap.com in three phases, with
+`--concurrency` calls in flight (unique cities, so nothing is cached):
+
+1. healthy: `--calls` calls with `--latency` plus exponential `--jitter`,
+   and a `--stall-rate` share of requests stalling for `--stall` seconds
+   (a lost packet, a GC pause); reports p50/p99/p99.9 and the requests the
+   stub saw (hedges add some)
+2. outage: the stub hangs for `--outage` seconds; reports how many calls
+   were answered and how long each caller waited for its error
+3. recovery: the stub answers again; reports how long until the first call
+   succeeds again
+
+Compare the fixed-timeout version with e.g.:
+
+python benchmarks/bench_resilience.py --module /path/to/old/Amap_MCP.py
+python benchmarks/bench_resilience.py
+AMAP_HEDGE_QUANTILE=0 python benchmarks/bench_resilience.py
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import AMAP_ROUTES, StubServer, amap_weather  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # Tool modules import their shared helpers from the repo root
+
+HUNG = 3600  # Stub latency while the upstream is down
+
+
+def load_module(path):
+    """Import the tool module at `path` under a private name"""
+    spec = importlib.util.spec_from_file_location("amap_mcp_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def stalling(handler, rate, seconds):
+    """`handler` that first sleeps `seconds` for a `rate` share of requests"""
+    def handle(request):
+        if random.random() < rate:
+            time.sleep(seconds)
+        return handler(request)
+    return handle
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[max(0, int(round(q * len(values))) - 1)] if values else None
+
+
+def ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+async def run_benchmark(module, stub, args):
+    import http_client
+    counter = iter(range(10 ** 9))
+
+    async def call():
+        start = time.perf_counter()
+        result = json.loads(await module.get_weather(f"city{next(counter)}"))
+        return result.get("status") == "1", time.perf_counter() - start
+
+    async def run_until(stop):
+        """Keep `args.concurrency` calls in flight until stop() is true, return [(ok, latency)]"""
+        results = []
+
+        async def worker():
+            while not stop(results):
+                results.append(await call())
+
+        await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+        return results
+
+    stats = {}
+    try:
+        healthy = await run_until(lambda results: len(results) >= args.calls)
+        latencies = [latency for ok, latency in healthy if ok]
+        stats["healthy"] = {
+            "calls": len(healthy),
+            "failed": sum(1 for ok, _ in healthy if not ok),
+            "upstream_requests": stub.requests,
+            "p50_ms": ms(statistics.median(latencies)) if latencies else None,
+            "p99_ms": ms(percentile(latencies, 0.99)),
+            "p999_ms": ms(percentile(latencies, 0.999)),
+        }
+
+        stub.latency, stub.jitter = HUNG, 0.0
+        deadline = time.perf_counter() + args.outage
+        outage = await run_until(lambda results: time.perf_counter() >= deadline)
+        waits = [latency for ok, latency in outage if not ok]
+        stats["outage"] = {
+            "calls_answered": len(outage),
+            "wait_p50_ms": ms(statistics.median(waits)) if waits else None,
+            "wait_max_ms": ms(max(waits)) if waits else None,
+        }
+
+        stub.latency, stub.jitter = args.latency, args.jitter
+        start = time.perf_counter()
+        recovery = await run_until(lambda results: any(ok for ok, _ in results)
+                                   or time.perf_counter() - start > 120)
+        stats["recovery"] = {"seconds_to_first_success": round(time.perf_counter() - start, 2),
+                             "calls": len(recovery)}
+    finally:
+        await http_client.close_sessions()
+    upstream = getattr(module, "amap_upstreams", {}).get("get_weather")
+    if upstream is not None:
+        stats["upstream"] = upstream.stats()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Amap tool latency through a long tail, an outage and recovery")
+    parser.add_argument("--module", default=os.path.join(ROOT, "Amap_MCP.py"), help="Path of the Amap module")
+    parser.add_argument("--calls", type=int, default=2000, help="Calls in the healthy phase")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.03, help="Stub latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.03, help="Mean exponential extra latency in seconds")
+    parser.add_argument("--stall-rate", type=float, default=0.02, help="Share of requests that stall")
+    parser.add_argument("--stall", type=float, default=1.0, help="Seconds a stalled request takes")
+    parser.add_argument("--outage", type=float, default=30, help="Seconds the stub hangs")
+    args = parser.parse_args()
+
+    routes = {**AMAP_ROUTES, "/v3/weather/weatherInfo": stalling(amap_weather, args.stall_rate, args.stall)}
+    with StubServer(routes, latency=args.latency, jitter=args.jitter) as stub:
+        os.environ["AMAP_API_BASE"] = stub.url
+        module = load_module(os.path.abspath(args.module))
+        logging.getLogger("MapNavigator").setLevel(logging.CRITICAL)
+        stats = asyncio.run(run_benchmark(module, stub, args))
+    print(json.dumps({"module": os.path.relpath(os.path.abspath(args.module), ROOT),
+                      "hedge_quantile": os.getenv("AMAP_HEDGE_QUANTILE", "default"), **stats}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Bytes on the wire and end-to-end latency of Amap_MCP.plan_driving_route.
+
+Runs Amap_MCP.py behind mcp_pipe.py against a local WebSocket endpoint and
+a local Amap stub whose routes carry dense step polylines (extensions=all
+adds traffic segments), then calls plan_driving_route `--runs` times per
+`detail` level and reports the size of the tool result message as the
+device receives it and the median call latency.
+
+Usage:
+
+python benchmarks/bench_route.py [--module Amap_MCP.py] [--runs 20] [--extensions all]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import AMAP_ROUTES, StubServer  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DETAILS = ("full", "steps", "summary")
+
+
+async def run_benchmark(module, runs, extensions, port):
+    """Call plan_driving_route through mcp_pipe, return {detail: (message bytes, [latency s])}"""
+    results = {}
+    done = asyncio.Event()
+
+    async def handler(websocket):
+        await websocket.send(json.dumps({
+            "jsonrpc": "2.0", "id": "init", "method": "initialize",
+            "params": {"protocolVersion": "2024-11-05", "capabilities": {}, "clientInfo": {"name": "bench", "version": "1"}}
+        }))
+        while json.loads(await websocket.recv()).get("id") != "init":
+            pass
+        await websocket.send(json.dumps({"jsonrpc": "2.0", "method": "notifications/initialized"}))
+        await websocket.send(json.dumps({"jsonrpc": "2.0", "id": "tools", "method": "tools/list"}))
+        while True:
+            message = json.loads(await websocket.recv())
+            if message.get("id") == "tools":
+                break
+        route_tool = next(tool for tool in message["result"]["tools"] if tool["name"] == "plan_driving_route")
+        details = DETAILS if "detail" in route_tool["inputSchema"]["properties"] else ("full",)
+
+        call_id = 0
+        for detail in details:
+            latencies = []
+            for run in range(runs):
+                arguments = {"origin": f"116.48{run:04d},39.989643", "destination": "116.434446,39.90816",
+                             "extensions": extensions}
+                if len(details) > 1:
+                    arguments["detail"] = detail
+                call_id += 1
+                start = time.perf_counter()
+                await websocket.send(json.dumps({
+                    "jsonrpc": "2.0", "id": call_id, "method": "tools/call",
+                    "params": {"name": "plan_driving_route", "arguments": arguments}
+                }))
+                while True:
+                    raw = await websocket.recv()
+                    message = json.loads(raw)
+                    if message.get("id") == call_id:
+                        break
+                latencies.append(time.perf_counter() - start)
+                text = message["result"]["content"][0]["text"]
+                assert json.loads(text)["status"] == "1", text[:200]
+            results[detail] = (len(raw.encode() if isinstance(raw, str) else raw), latencies)
+        done.set()
+
+    async with websockets.serve(handler, "127.0.0.1", port, max_size=None):
+        env = dict(os.environ, MCP_ENDPOINT=f"ws://127.0.0.1:{port}")
+        pipe = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(ROOT, "mcp_pipe.py"), module,
+            env=env, cwd=os.path.dirname(module),
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            await asyncio.wait_for(done.wait(), timeout=300)
+        finally:
+            pipe.terminate()
+            await pipe.wait()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark plan_driving_route payload size and latency")
+    parser.add_argument("--module", default=os.path.join(ROOT, "Amap_MCP.py"), help="Path of the Amap module")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--extensions", default="all", choices=("base", "all"))
+    parser.add_argument("--port", type=int, default=8867)
+    args = parser.parse_args()
+
+    with StubServer(AMAP_ROUTES) as stub:
+        os.environ.update(AMAP_API_BASE=stub.url, AMAP_API_KEY="stub")
+        upstream = len(json.dumps(AMAP_ROUTES["/v3/direction/driving"]({"extensions": args.extensions}),
+                                  ensure_ascii=False).encode())
+        results = asyncio.run(run_benchmark(os.path.abspath(args.module), args.runs, args.extensions, args.port))
+
+    print(json.dumps({
+        "module": os.path.abspath(args.module),
+        "extensions": args.extensions,
+        "upstream_bytes": upstream,
+        **{detail: {"message_bytes": size, "p50_ms": round(statistics.median(latencies) * 1000, 1)}
+           for detail, (size, latencies) in results.items()},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
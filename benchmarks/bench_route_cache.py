@@ -0,0 +1,110 @@
+"""
+Upstream requests and latency of repeated commute routes through plan_driving_route.
+
+Simulates devices asking for the same `--trips` origin/destination pairs
+over and over, each time from a GPS fix jittered by up to `--jitter`
+meters, with a random strategy from `--strategies` and a random `detail`
+level, `--concurrency` calls at a time against a local Amap stub. Reports
+the upstream requests, p50/p99 latency and, for the current module, the
+route cache stats.
+
+Usage:
+
+python benchmarks/bench_route_cache.py [--module Amap_MCP.py] [--calls 500] [--trips 5] [--jitter 30]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import stub_process, stub_requests  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)  # Tool modules import their shared helpers from the repo root
+
+
+def load_module(path):
+    spec = importlib.util.spec_from_file_location("amap_mcp_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def jittered(lng, lat, meters, rng):
+    dlat = rng.uniform(-meters, meters) / 111320.0
+    dlng = rng.uniform(-meters, meters) / (111320.0 * math.cos(math.radians(lat)))
+    return f"{lng + dlng:.6f},{lat + dlat:.6f}"
+
+
+async def run_benchmark(module, args):
+    import http_client
+    rng = random.Random(1)
+    trips = [((rng.uniform(116.2, 116.6), rng.uniform(39.8, 40.0)), (rng.uniform(116.2, 116.6), rng.uniform(39.8, 40.0)))
+             for _ in range(args.trips)]
+    strategies = args.strategies.split(",")
+    has_detail = "detail" in module.plan_driving_route.__code__.co_varnames
+    window = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one():
+        origin, destination = rng.choice(trips)
+        arguments = {"origin": jittered(*origin, args.jitter, rng), "destination": jittered(*destination, args.jitter, rng),
+                     "strategy": rng.choice(strategies)}
+        if has_detail:
+            arguments["detail"] = rng.choice(["summary", "summary", "steps"])
+        async with window:
+            start = time.perf_counter()
+            result = json.loads(await module.plan_driving_route(**arguments))
+            latencies.append(time.perf_counter() - start)
+            assert result.get("status") == "1", result
+
+    try:
+        await asyncio.gather(*[one() for _ in range(args.calls)])
+    finally:
+        await http_client.close_sessions()
+    return sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the plan_driving_route cache on repeated commutes")
+    parser.add_argument("--module", default=os.path.join(ROOT, "Amap_MCP.py"), help="Path of the Amap module")
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--trips", type=int, default=5, help="Distinct origin/destination pairs")
+    parser.add_argument("--jitter", type=float, default=30, help="GPS jitter in meters")
+    parser.add_argument("--strategies", default="0,2,4")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub response latency in seconds")
+    args = parser.parse_args()
+
+    with stub_process("amap", latency=args.latency) as url:
+        os.environ.update(AMAP_API_BASE=url, AMAP_API_KEY="stub")
+        module = load_module(os.path.abspath(args.module))
+        logging.getLogger("MapNavigator").setLevel(logging.WARNING)
+        latencies = asyncio.run(run_benchmark(module, args))
+        upstream = stub_requests(url)
+
+    stats = {
+        "module": os.path.relpath(os.path.abspath(args.module), ROOT),
+        "calls": args.calls,
+        "trips": args.trips,
+        "jitter_m": args.jitter,
+        "upstream_requests": upstream,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[max(0, int(round(0.99 * len(latencies))) - 1)] * 1000, 1),
+    }
+    if hasattr(module, "route_cache_stats"):
+        stats["route_cache"] = module.route_cache_stats()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Scheduling benchmark for ragflow_mcp.py against a local RAGFlow stub that
+processes at most `--capacity` retrievals at once (the rest wait inside the
+stub, like an overloaded RAGFlow).
+
+Three scenarios:
+
+- bulk: `--bulk` searches submitted at once; reports throughput and the
+  concurrency the module settled on.
+- priority: the same bulk load, plus `--interactive` searches arriving
+  while it runs; reports their latency.
+- cancel: `--cancel` slow searches (`--cancel-latency`) started and
+  canceled right away; reports how many retrievals reached the stub, how
+  many of them were aborted, and how long a search issued right after the
+  cancel takes. The stub drops a retrieval when the client disconnects.
+
+Usage:
+
+python benchmarks/bench_scheduler.py [--module ragflow_mcp.py] [--capacity 8] [--latency 0.1]
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import inspect
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import RAGFLOW_ROUTES, StubServer  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(path):
+    """Import the tool module at `path` under a private name, with its own directory's helpers"""
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location("ragflow_mcp_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def tool(module, name):
+    return getattr(getattr(module, name), "fn", getattr(module, name))  # fastmcp wraps the function in a Tool
+
+
+async def search(module, question, priority):
+    start_search = tool(module, "start_search")
+    if "priority" in inspect.signature(start_search).parameters:
+        return await start_search(question, priority=priority)
+    return await start_search(question)
+
+
+def active_task_ids(module):
+    return [task["task_id"] for task in tool(module, "get_active_tasks")()["active_tasks"]]
+
+
+async def bulk(module, count, tag):
+    start = time.perf_counter()
+    results = await asyncio.gather(*[search(module, f"{tag} bulk question {i}", "bulk") for i in range(count)])
+    assert all(result.get("success") for result in results)
+    return time.perf_counter() - start
+
+
+async def run_benchmark(module, args, stub):
+    report = {}
+
+    elapsed = await bulk(module, args.bulk, "throughput")
+    report["bulk_searches_per_s"] = round(args.bulk / elapsed, 1)
+    if hasattr(module, "search_scheduler"):
+        report["concurrency_limit"] = module.search_scheduler.stats()["limit"]
+
+    async def interactive(i):
+        await asyncio.sleep(elapsed * (i + 1) / (2 * args.interactive))  # Arrive while the bulk queue is long
+        start = time.perf_counter()
+        result = await search(module, f"interactive question {i}", "interactive")
+        assert result.get("success"), result
+        return time.perf_counter() - start
+
+    _, *latencies = await asyncio.gather(bulk(module, args.bulk, "priority"),
+                                         *[interactive(i) for i in range(args.interactive)])
+    report["interactive_p50_s"] = round(statistics.median(latencies), 3)
+
+    before, aborted = stub.requests, stub.aborted
+    stub.latency = args.cancel_latency
+    searches = [asyncio.ensure_future(search(module, f"canceled question {i}", "bulk")) for i in range(args.cancel)]
+    await asyncio.sleep(0.2)  # Let the first ones reach the stub
+    start = time.perf_counter()
+    for task_id in active_task_ids(module):
+        canceled = tool(module, "cancel_search")(task_id)
+        if inspect.isawaitable(canceled):  # A coroutine since it runs on the scheduler's loop
+            await canceled
+    await asyncio.gather(*searches)
+    stub.latency = args.latency
+    result = await search(module, "after cancel", "interactive")  # Waits behind whatever is still running
+    assert result.get("success"), result
+    report["cancel_then_search_s"] = round(time.perf_counter() - start, 3)
+    report["canceled_retrievals_sent"] = stub.requests - before - 1
+    report["canceled_retrievals_aborted"] = stub.aborted - aborted
+    await module.http_client.close_sessions()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ragflow search scheduling")
+    parser.add_argument("--module", default=os.path.join(ROOT, "ragflow_mcp.py"), help="Path of the ragflow module")
+    parser.add_argument("--capacity", type=int, default=8, help="Retrievals the stub processes at once")
+    parser.add_argument("--latency", type=float, default=0.1, help="Stub processing time per retrieval in seconds")
+    parser.add_argument("--bulk", type=int, default=200)
+    parser.add_argument("--interactive", type=int, default=5)
+    parser.add_argument("--cancel", type=int, default=50)
+    parser.add_argument("--cancel-latency", type=float, default=3.0, help="Stub latency while canceling")
+    args = parser.parse_args()
+
+    with StubServer(RAGFLOW_ROUTES, latency=args.latency, capacity=args.capacity) as stub:
+        os.environ["RAGFLOW_API_URL"] = f"{stub.url}/api/v1/retrieval"
+        module = load_module(os.path.abspath(args.module))
+        logging.getLogger("ragflow_mcp").setLevel(logging.WARNING)
+        try:
+            report = asyncio.run(run_benchmark(module, args, stub))
+        finally:
+            # Older versions run searches on worker threads: stop them, or the interpreter never exits
+            if getattr(module, "executor", None) is not None:
+                for _ in range(module.executor._max_workers):
+                    module.task_queue.put(None)
+                module.executor.shutdown(wait=True)
+
+    print(json.dumps({
+        "module": os.path.abspath(args.module),
+        "stub_capacity": args.capacity,
+        "stub_latency_s": args.latency,
+        **report,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
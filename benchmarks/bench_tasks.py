@@ -0,0 +1,139 @@
+"""
+Task bookkeeping benchmark for ragflow_mcp.py.
+
+Fills the task table with `--finished` completed searches plus `--active`
+running ones, then times get_active_tasks and get_search_status while
+`--workers` threads keep finishing tasks. Runs once against TaskStore and
+once against the old layout (a plain dict scanned under one global lock)
+and reports the latencies and the memory held per task.
+
+Usage:
+
+python benchmarks/bench_tasks.py [--finished 200000] [--active 50] [--workers 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from task_store import Task, TaskStore  # noqa: E402
+
+
+class DictTasks:
+    """The task table as it was before TaskStore: dicts in a dict behind one lock"""
+
+    def __init__(self):
+        self.tasks = {}
+        self.lock = threading.Lock()
+
+    def add(self, task_id, question):
+        with self.lock:
+            self.tasks[task_id] = {"status": "queued", "question": question, "start_time": time.time(),
+                                   "result": None, "error": None}
+
+    def finish(self, task_id, result):
+        with self.lock:
+            self.tasks[task_id]["status"] = "completed"
+            self.tasks[task_id]["result"] = result
+
+    def status(self, task_id):
+        with self.lock:
+            return dict(self.tasks[task_id])
+
+    def active_tasks(self):
+        with self.lock:
+            return [{"task_id": task_id, **task} for task_id, task in self.tasks.items()
+                    if task["status"] in ["queued", "processing"]]
+
+
+class StoreTasks:
+    def __init__(self, capacity):
+        self.store = TaskStore(capacity=capacity)
+
+    def add(self, task_id, question):
+        self.store.add(Task(task_id, question))
+
+    def finish(self, task_id, result):
+        self.store.finish(self.store.get(task_id), "completed", result=result)
+
+    def status(self, task_id):
+        return self.store.snapshot(task_id)
+
+    def active_tasks(self):
+        return self.store.active_tasks()
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(tasks, finished, active, workers, repeat):
+    result = [{"content_ltks": "x" * 200, "document_keyword": "doc", "similarity": 0.9}]
+    tracemalloc.start()
+    for i in range(finished):
+        task_id = str(uuid.uuid4())
+        tasks.add(task_id, f"question {i}")
+        tasks.finish(task_id, result)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    running = [str(uuid.uuid4()) for _ in range(active)]
+    for task_id in running:
+        tasks.add(task_id, "running question")
+
+    # Workers keep adding and finishing searches while we read
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            task_id = str(uuid.uuid4())
+            tasks.add(task_id, "worker question")
+            tasks.finish(task_id, result)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        active_samples = timed(tasks.active_tasks, repeat)
+        status_samples = timed(lambda: tasks.status(running[0]), repeat * 10)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return {
+        "bytes_per_task": round(memory / finished),
+        "get_active_tasks_p50_ms": round(statistics.median(active_samples) * 1000, 3),
+        "get_search_status_p50_ms": round(statistics.median(status_samples) * 1000, 3),
+        "get_search_status_max_ms": round(max(status_samples) * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ragflow task table")
+    parser.add_argument("--finished", type=int, default=200000, help="Completed tasks kept in the table")
+    parser.add_argument("--active", type=int, default=50, help="Queued/processing tasks")
+    parser.add_argument("--workers", type=int, default=5, help="Threads finishing tasks during the reads")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    capacity = args.finished * 2  # Large enough that nothing expires during the run
+    report = {"finished_tasks": args.finished, "active_tasks": args.active, "workers": args.workers}
+    report["dict"] = run(DictTasks(), args.finished, args.active, args.workers, args.repeat)
+    report["task_store"] = run(StoreTasks(capacity), args.finished, args.active, args.workers, args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
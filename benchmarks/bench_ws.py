@@ -0,0 +1,172 @@
+"""
+WebSocket bytes and frames per tool call through mcp_pipe.py.
+
+Runs `mcp_pipe.py` against a local WebSocket endpoint (which accepts
+permessage-deflate, like the public endpoint) through a TCP proxy that
+counts the bytes the pipe writes. The stdlib child answers every
+`tools/call` with `--progress` small progress notifications and a result
+of about `--result-size` bytes of RAG-style JSON chunks. `--calls`
+calls are kept `--concurrency` in flight; the endpoint counts frames
+(WebSocket messages) and unpacks JSON-RPC batches.
+
+The pipe's settings come from the environment, e.g. compare:
+
+python benchmarks/bench_ws.py --pipe /path/to/old/mcp_pipe.py
+MCP_PIPE_COMPRESSION=off python benchmarks/bench_ws.py
+python benchmarks/bench_ws.py
+MCP_PIPE_BATCH_MAX=32 MCP_PIPE_BATCH_DELAY_MS=2 python benchmarks/bench_ws.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child answering tools/call with progress notifications and a large result
+CHILD = r'''
+import json, random, sys
+PROGRESS, SIZE = int(sys.argv[1]), int(sys.argv[2])
+WORDS = ("检索 文档 模型 知识库 向量 相似度 段落 问题 答案 数据 系统 用户 配置 服务 接口 性能 缓存 网络 设备 小智 "
+         "the of retrieval chunk dataset similarity score document keyword answer").split()
+for line in sys.stdin:
+    if not line.strip():
+        continue
+    msg = json.loads(line)
+    if msg.get("method") == "initialize":
+        sys.stdout.write(json.dumps({"jsonrpc": "2.0", "id": msg["id"], "result": {
+            "protocolVersion": "2024-11-05", "capabilities": {"tools": {}},
+            "serverInfo": {"name": "bench", "version": "1"}}}) + "\n")
+        sys.stdout.flush()
+    if msg.get("method") == "ping":
+        sys.stdout.write(json.dumps({"jsonrpc": "2.0", "id": msg["id"], "result": {}}) + "\n")
+        sys.stdout.flush()
+    if msg.get("method") != "tools/call":
+        continue
+    rng = random.Random(msg["id"])
+    token = msg["id"]
+    for i in range(PROGRESS):
+        sys.stdout.write(json.dumps({"jsonrpc": "2.0", "method": "notifications/progress",
+                                     "params": {"progressToken": token, "progress": i + 1, "total": PROGRESS,
+                                                "message": f"chunk {i + 1}/{PROGRESS}"}}) + "\n")
+    chunks, size = [], 0
+    while size < SIZE:
+        text = " ".join(rng.choice(WORDS) for _ in range(80))
+        chunk = {"id": f"{rng.getrandbits(64):016x}", "content": text, "document_keyword": f"doc{rng.randint(1, 50)}.pdf",
+                 "similarity": round(rng.random(), 4), "vector_similarity": round(rng.random(), 4)}
+        chunks.append(chunk)
+        size += len(json.dumps(chunk, ensure_ascii=False).encode())
+    result = {"content": [{"type": "text", "text": json.dumps({"success": True, "chunks": chunks}, ensure_ascii=False)}],
+              "isError": False}
+    sys.stdout.write(json.dumps({"jsonrpc": "2.0", "id": msg["id"], "result": result}, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+'''
+
+
+async def run_benchmark(pipe_script, calls, concurrency, progress, result_size, port):
+    frames = 0
+    wire = {"up": 0}
+    latencies = []
+    clock = {}
+    done = asyncio.Event()
+
+    async def handler(websocket):
+        nonlocal frames
+        window = asyncio.Semaphore(concurrency)
+        sent_at = {}
+
+        async def sender():
+            for i in range(calls):
+                await window.acquire()
+                sent_at[i] = time.perf_counter()
+                await websocket.send(json.dumps({"jsonrpc": "2.0", "id": i, "method": "tools/call",
+                                                 "params": {"name": "search", "arguments": {"q": i}}}))
+
+        clock["start"] = time.perf_counter()
+        send_task = asyncio.create_task(sender())
+        answered = 0
+        while answered < calls:
+            message = json.loads(await websocket.recv())
+            frames += 1
+            for item in message if isinstance(message, list) else [message]:
+                if "id" in item:
+                    latencies.append(time.perf_counter() - sent_at.pop(item["id"]))
+                    answered += 1
+                    window.release()
+        await send_task
+        clock["elapsed"] = time.perf_counter() - clock["start"]
+        done.set()
+
+    async def proxy(reader, writer):
+        """Relay one TCP connection to the endpoint, counting the bytes the pipe sends"""
+        upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", port + 1)
+
+        async def relay(src, dst, count):
+            try:
+                while data := await src.read(65536):
+                    if count:
+                        wire["up"] += len(data)
+                    dst.write(data)
+                    await dst.drain()
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+            finally:
+                dst.close()
+
+        await asyncio.gather(relay(reader, upstream_writer, True), relay(upstream_reader, writer, False))
+
+    with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False, encoding='utf-8') as f:
+        f.write(f"import sys\nsys.argv[1:] = ['{progress}', '{result_size}']\n" + CHILD)
+        child_script = f.name
+    try:
+        async with websockets.serve(handler, "127.0.0.1", port + 1, max_size=None), \
+                await asyncio.start_server(proxy, "127.0.0.1", port):
+            env = dict(os.environ, MCP_ENDPOINT=f"ws://127.0.0.1:{port}")
+            pipe = await asyncio.create_subprocess_exec(
+                sys.executable, pipe_script, child_script, env=env, cwd=ROOT,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                await asyncio.wait_for(done.wait(), timeout=300)
+            finally:
+                pipe.terminate()
+                await pipe.wait()
+    finally:
+        os.unlink(child_script)
+
+    return {
+        "pipe": os.path.relpath(pipe_script, ROOT),
+        "settings": {k: v for k, v in os.environ.items() if k.startswith("MCP_PIPE_")},
+        "calls": calls,
+        "messages_per_call": progress + 1,
+        "frames_per_call": round(frames / calls, 2),
+        "wire_bytes_per_call": round(wire["up"] / calls),
+        "calls_per_s": round(calls / clock["elapsed"], 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure WebSocket bytes and frames per tool call through mcp_pipe.py")
+    parser.add_argument("--pipe", default=os.path.join(ROOT, "mcp_pipe.py"), help="Path of the pipe script")
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--progress", type=int, default=8, help="Progress notifications per call")
+    parser.add_argument("--result-size", type=int, default=20000, help="Approximate result size in bytes")
+    parser.add_argument("--port", type=int, default=8870, help="Proxy port, the endpoint listens on the next one")
+    args = parser.parse_args()
+
+    stats = asyncio.run(run_benchmark(os.path.abspath(args.pipe), args.calls, args.concurrency, args.progress,
+                                      args.result_size, args.port))
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+"""
+End-to-end load test of mcp_pipe.py and every tool against local stand-ins.
+
+`run` starts a stub process per upstream API (Amap, Alpha Vantage, Coze,
+RAGFlow and the music API, see stubs.py), runs `mcp_pipe.py` with the tool
+scripts as a gateway, and impersonates the XiaoZhi endpoint: it does the
+MCP handshake and then keeps `--concurrency` device-like `tools/call`
+requests in flight for `--duration` seconds, drawn from a weighted mix of
+the tools. Calls during the first `--warmup` seconds are not counted.
+
+It reports, per tool, throughput, p50/p90/p99 latency and errors, and per
+process (the pipe and each tool script) peak RSS and CPU use (from /proc,
+null on other platforms). Results are JSON, with the commit they were
+measured at, for `compare`:
+
+python benchmarks/loadtest.py run --output before.json
+python benchmarks/loadtest.py run --output after.json
+python benchmarks/loadtest.py compare before.json after.json
+
+Stub behaviour: `--latency`, `--jitter` (mean of an exponential extra
+latency) and `--error-rate` (share of HTTP 503 answers) for all stubs,
+`--profile amap:latency=0.3,error_rate=0.05` for one of them. `--tools`
+and `--mix get_weather=5,start_search=1` pick the workload. The pipe's
+MCP_PIPE_* settings come from the environment.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stubs import stub_process  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CITIES = ["110000", "310000", "440100", "440300", "330100", "510100", "420100", "320100"]
+PLACES = ["望京SOHO", "国贸", "中关村", "西单大悦城", "三里屯", "北京南站", "首都机场T3", "颐和园"]
+KEYWORDS = ["咖啡", "加油站", "超市", "医院", "停车场", "肯德基", "银行", "药店"]
+SYMBOLS = ["AAPL", "MSFT", "TSLA", "NVDA", "BABA", "GOOGL", "AMZN", "META"]
+QUESTIONS = ["小智怎么连接WiFi", "如何重置设备", "支持哪些唤醒词", "怎么切换音色", "电池能用多久", "如何升级固件"]
+SONGS = ["好运来", "晴天", "稻香", "小幸运", "成都", "平凡之路"]
+
+
+def point(rng):
+    return f"{rng.uniform(116.2, 116.6):.6f},{rng.uniform(39.8, 40.0):.6f}"
+
+
+# tool -> (script, default weight, arguments for a random call)
+WORKLOAD = {
+    "get_weather": ("Amap_MCP.py", 15, lambda rng: {"city": rng.choice(CITIES)}),
+    "geocode": ("Amap_MCP.py", 10, lambda rng: {"address": f"北京市{rng.choice(PLACES)}{rng.randint(1, 50)}号"}),
+    "geocode_batch": ("Amap_MCP.py", 3, lambda rng: {"addresses": [f"北京市{place}{rng.randint(1, 50)}号"
+                                                                   for place in rng.sample(PLACES, 3)]}),
+    "input_tips": ("Amap_MCP.py", 10, lambda rng: {"keywords": rng.choice(KEYWORDS), "location": point(rng)}),
+    "plan_driving_route": ("Amap_MCP.py", 5, lambda rng: {"origin": point(rng), "destination": point(rng)}),
+    "get_stock_price": ("stock_query.py", 15, lambda rng: {"input_query": rng.choice(SYMBOLS)}),
+    "get_web_news": ("web_news.py", 5, lambda rng: {"input_query": f"{rng.choice(PLACES)}新闻"}),
+    "start_search": ("ragflow_mcp.py", 15, lambda rng: {"question": f"{rng.choice(QUESTIONS)}{rng.randint(1, 20)}"}),
+    "play_music": ("music.py", 10, lambda rng: {"song_name": rng.choice(SONGS)}),
+}
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+# script -> (stub name, environment for the script given the stub URL and a scratch directory)
+UPSTREAMS = {
+    "Amap_MCP.py": ("amap", lambda url, scratch: {"AMAP_API_BASE": url, "AMAP_API_KEY": "stub"}),
+    "stock_query.py": ("alphavantage", lambda url, scratch: {
+        "ALPHAVANTAGE_API_URL": f"{url}/query", "ALPHAVANTAGE_API_KEY": "stub",
+        "ALPHAVANTAGE_RATE_PER_MIN": "600000", "ALPHAVANTAGE_BURST": "1000"}),  # The free tier quota would be all we measure
+    "web_news.py": ("coze", lambda url, scratch: {
+        "COZE_API_BASE": url, "COZE_API_TOKEN": "stub", "COZE_WORKFLOW_ID": "stub"}),
+    "ragflow_mcp.py": ("ragflow", lambda url, scratch: {"RAGFLOW_API_URL": f"{url}/api/v1/retrieval"}),
+    "music.py": ("music", lambda url, scratch: {
+        "MUSIC_API_URL": f"{url}/api/music/wy", "MUSIC_CACHE_DIR": os.path.join(scratch, "music_cache"),
+        "MUSIC_STREAM_PORT": str(free_port())}),
+}
+
+
+def parse_pairs(text, cast=float):
+    """Parse "a=1,b=2" into {"a": 1.0, "b": 2.0}"""
+    pairs = {}
+    for item in text.split(","):
+        if item.strip():
+            key, _, value = item.partition("=")
+            pairs[key.strip()] = cast(value)
+    return pairs
+
+
+def stub_profiles(args):
+    """Stub name -> keyword arguments of stub_process()"""
+    profiles = {name: {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate}
+                for name, _ in UPSTREAMS.values()}
+    for profile in args.profile:
+        name, _, settings = profile.partition(":")
+        if name not in profiles:
+            sys.exit(f"Unknown stub in --profile: {name}, choose from {', '.join(sorted(profiles))}")
+        profiles[name].update(parse_pairs(settings))
+    return profiles
+
+
+def git_commit():
+    """Short commit hash of the tree, with "-dirty" if it has uncommitted changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class ProcessSampler:
+    """Peak RSS and CPU time of the pipe and its children, by script, from /proc (Linux only)"""
+
+    def __init__(self, pid, scripts):
+        self.pid = pid
+        self.scripts = scripts
+        self.available = os.path.exists(f"/proc/{pid}/stat")
+        self.ticks = os.sysconf("SC_CLK_TCK") if self.available else 1
+        self.page = os.sysconf("SC_PAGE_SIZE") if self.available else 1
+        self.rss = {}  # name -> peak bytes, summed over its processes
+        self.cpu_start = {}  # pid -> (name, cpu seconds) at start()
+        self.started = None
+
+    def processes(self):
+        """{pid: name} of the pipe and its direct children"""
+        found = {self.pid: "mcp_pipe.py"}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+                if ppid != self.pid:
+                    continue
+                with open(f"/proc/{entry}/cmdline", "rb") as f:
+                    args = f.read().decode(errors="replace").split("\0")
+            except (OSError, ValueError, IndexError):
+                continue
+            name = next((os.path.basename(arg) for arg in args if os.path.basename(arg) in self.scripts), None)
+            if name:
+                found[int(entry)] = name
+        return found
+
+    @staticmethod
+    def read_stat(pid):
+        """(cpu time in clock ticks, rss in pages) of `pid`"""
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return int(fields[11]) + int(fields[12]), int(fields[21])
+
+    def sample(self):
+        if not self.available:
+            return
+        rss = {}
+        for pid, name in self.processes().items():
+            try:
+                _, pages = self.read_stat(pid)
+            except (OSError, ValueError, IndexError):
+                continue
+            rss[name] = rss.get(name, 0) + pages * self.page
+        for name, value in rss.items():
+            self.rss[name] = max(self.rss.get(name, 0), value)
+
+    def cpu(self):
+        times = {}
+        for pid, name in self.processes().items():
+            with contextlib.suppress(OSError, ValueError, IndexError):
+                times[pid] = (name, self.read_stat(pid)[0] / self.ticks)
+        return times
+
+    def start(self):
+        if self.available:
+            self.rss = {}
+            self.cpu_start = self.cpu()
+        self.started = time.monotonic()
+
+    def report(self):
+        if not self.available:
+            return {name: {"rss_max_mb": None, "cpu_percent": None} for name in ["mcp_pipe.py", *self.scripts]}
+        elapsed = time.monotonic() - self.started
+        used = {}
+        for pid, (name, seconds) in self.cpu().items():
+            before = self.cpu_start.get(pid, (name, 0.0))[1]  # A process (re)started meanwhile used all of it
+            used[name] = used.get(name, 0.0) + seconds - before
+        return {name: {"rss_max_mb": round(self.rss.get(name, 0) / 2 ** 20, 1),
+                       "cpu_percent": round(used.get(name, 0.0) / elapsed * 100, 1)}
+                for name in sorted(set(self.rss) | set(used))}
+
+
+class Endpoint:
+    """The XiaoZhi side of the connection: handshake, then tool calls matched to responses by id"""
+
+    def __init__(self):
+        self.websocket = None
+        self.connected = asyncio.Event()
+        self.closed = asyncio.Event()
+        self.waiters = {}
+        self.next_id = 0
+
+    async def handler(self, websocket):
+        self.websocket = websocket
+        self.connected.set()
+        try:
+            async for raw in websocket:
+                message = json.loads(raw)
+                for item in message if isinstance(message, list) else [message]:
+                    waiter = self.waiters.pop(item.get("id"), None)
+                    if waiter is not None and not waiter.done():
+                        waiter.set_result(item)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.closed.set()
+
+    async def request(self, method, params, timeout):
+        self.next_id += 1
+        msg_id = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.waiters[msg_id] = future
+        await self.websocket.send(json.dumps({"jsonrpc": "2.0", "id": msg_id, "method": method, "params": params},
+                                             ensure_ascii=False))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.waiters.pop(msg_id, None)
+
+    async def handshake(self):
+        await self.request("initialize", {"protocolVersion": "2024-11-05", "capabilities": {},
+                                          "clientInfo": {"name": "loadtest", "version": "1"}}, 60)
+        await self.websocket.send(json.dumps({"jsonrpc": "2.0", "method": "notifications/initialized"}))
+        response = await self.request("tools/list", {}, 60)
+        return {tool["name"] for tool in response.get("result", {}).get("tools", [])}
+
+
+def failed(result):
+    """Whether a tools/call result is a failure: isError, or the tool's own failure answer"""
+    if result.get("isError"):
+        return True
+    payload = (result.get("structuredContent") or {}).get("result", result.get("structuredContent"))
+    if payload is None:
+        payload = next((item.get("text", "") for item in result.get("content", []) if item.get("type") == "text"), "")
+    if isinstance(payload, str):
+        if payload.startswith(("播放失败", "错误")):  # music.py answers failures in plain text
+            return True
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return False
+    # Amap tools answer {"status": "0", ...}, the others {"success": false, ...}
+    return isinstance(payload, dict) and (payload.get("status") in ("0", "error") or payload.get("success") is False
+                                          or "error" in payload)
+
+
+async def drive(endpoint, mix, args, sampler):
+    """Keep `args.concurrency` calls in flight, return {tool: [(outcome, seconds)]} after the warmup"""
+    rng = random.Random(args.seed)
+    tools, weights = list(mix), list(mix.values())
+    results = {tool: [] for tool in tools}
+    start = time.monotonic()
+    measuring = asyncio.Event()
+    stop_at = start + args.warmup + args.duration
+
+    async def sample_resources():
+        await asyncio.sleep(args.warmup)
+        sampler.start()
+        measuring.set()
+        while True:
+            sampler.sample()
+            await asyncio.sleep(0.5)
+
+    async def device():
+        while time.monotonic() < stop_at:
+            tool = rng.choices(tools, weights)[0]
+            arguments = WORKLOAD[tool][2](rng)
+            counted = measuring.is_set()
+            began = time.monotonic()
+            try:
+                response = await endpoint.request("tools/call", {"name": tool, "arguments": arguments}, args.timeout)
+                outcome = "error" if "error" in response or failed(response["result"]) else "ok"
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+            if counted:
+                results[tool].append((outcome, time.monotonic() - began))
+
+    sampler_task = asyncio.create_task(sample_resources())
+    try:
+        await asyncio.gather(*[device() for _ in range(args.concurrency)])
+    finally:
+        sampler_task.cancel()
+    return results, time.monotonic() - start - args.warmup
+
+
+def percentile(values, q):
+    return values[max(0, int(round(q * len(values))) - 1)] if values else None
+
+
+def ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def tool_stats(calls, elapsed):
+    latencies = sorted(seconds for outcome, seconds in calls if outcome == "ok")
+    return {
+        "calls": len(calls),
+        "ok": len(latencies),
+        "errors": sum(1 for outcome, _ in calls if outcome == "error"),
+        "timeouts": sum(1 for outcome, _ in calls if outcome == "timeout"),
+        "throughput_per_s": round(len(latencies) / elapsed, 2),
+        "p50_ms": ms(statistics.median(latencies)) if latencies else None,
+        "p90_ms": ms(percentile(latencies, 0.9)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1]) if latencies else None,
+    }
+
+
+async def run_load(pipe_script, mix, env, args):
+    endpoint = Endpoint()
+    port = args.port or free_port()
+    scripts = sorted({WORKLOAD[tool][0] for tool in mix})
+    async with websockets.serve(endpoint.handler, "127.0.0.1", port, max_size=None):
+        pipe = await asyncio.create_subprocess_exec(
+            sys.executable, pipe_script, *scripts, cwd=ROOT, env={**env, "MCP_ENDPOINT": f"ws://127.0.0.1:{port}"},
+            stdout=asyncio.subprocess.DEVNULL, stderr=None if args.verbose else asyncio.subprocess.DEVNULL
+        )
+        try:
+            await asyncio.wait_for(endpoint.connected.wait(), 120)
+            available = await endpoint.handshake()
+            missing = set(mix) - available
+            if missing:
+                raise RuntimeError(f"Tools not offered by the pipe: {', '.join(sorted(missing))}")
+            sampler = ProcessSampler(pipe.pid, scripts)
+            results, elapsed = await drive(endpoint, mix, args, sampler)
+            return results, elapsed, sampler.report()
+        finally:
+            pipe.terminate()
+            await pipe.wait()
+
+
+def run(args):
+    mix = {tool: WORKLOAD[tool][1] for tool in (args.tools.split(",") if args.tools else WORKLOAD)}
+    mix.update(parse_pairs(args.mix))
+    mix = {tool: weight for tool, weight in mix.items() if weight > 0}
+    unknown = set(mix) - set(WORKLOAD)
+    if unknown:
+        sys.exit(f"Unknown tools: {', '.join(sorted(unknown))}, choose from {', '.join(WORKLOAD)}")
+    scripts = sorted({WORKLOAD[tool][0] for tool in mix})
+    profiles = stub_profiles(args)
+
+    with contextlib.ExitStack() as stack:
+        scratch = stack.enter_context(tempfile.TemporaryDirectory())
+        env = dict(os.environ)
+        for script in scripts:
+            name, script_env = UPSTREAMS[script]
+            url = stack.enter_context(stub_process(name, **profiles[name]))
+            for key, value in script_env(url, scratch).items():
+                env.setdefault(key, value)  # Explicit settings win, e.g. a real upstream
+        results, elapsed, processes = asyncio.run(run_load(os.path.abspath(args.pipe), mix, env, args))
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "pipe": os.path.relpath(os.path.abspath(args.pipe), ROOT),
+        "settings": {
+            "duration_s": args.duration, "warmup_s": args.warmup, "concurrency": args.concurrency,
+            "mix": mix, "stubs": {name: profiles[name] for name in sorted({UPSTREAMS[s][0] for s in scripts})},
+            "env": {k: v for k, v in os.environ.items() if k.startswith("MCP_PIPE_")},
+        },
+        "elapsed_s": round(elapsed, 2),
+        "total": tool_stats([call for calls in results.values() for call in calls], elapsed),
+        "tools": {tool: tool_stats(calls, elapsed) for tool, calls in results.items()},
+        "processes": processes,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+def compare(args):
+    """Print per-tool changes from `before` to `after`, exit 1 if any metric got worse by more than the threshold"""
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    print(f"{'tool':<20}{'metric':<18}{'before':>12}{'after':>12}{'change':>10}")
+    regressions = 0
+    # metric -> True if higher is better
+    metrics = {"throughput_per_s": True, "p50_ms": False, "p99_ms": False, "error_share": False}
+    rows = [("total", before["total"], after["total"])]
+    rows += [(tool, before["tools"][tool], after["tools"][tool]) for tool in after["tools"] if tool in before["tools"]]
+    rows += [(name, before["processes"][name], after["processes"][name])
+             for name in after.get("processes", {}) if name in before.get("processes", {})]
+    for name, old, new in rows:
+        for stats in (old, new):
+            if "calls" in stats:
+                stats["error_share"] = (stats["errors"] + stats["timeouts"]) / stats["calls"] if stats["calls"] else 0
+        for metric, higher_is_better in ({"rss_max_mb": False, "cpu_percent": False} if "calls" not in old else metrics).items():
+            a, b = old.get(metric), new.get(metric)
+            if a is None or b is None:
+                continue
+            change = (b - a) / a if a else (0.0 if b == a else float("inf"))
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > args.threshold and (metric != "error_share" or b - a > 0.01):
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{name:<20}{metric:<18}{a:>12.4g}{b:>12.4g}{change:>+10.1%}{flag}")
+    if regressions:
+        print(f"{regressions} metric(s) worse by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of mcp_pipe.py and the tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the load test and report (or save) the results")
+    run_parser.add_argument("--pipe", default=os.path.join(ROOT, "mcp_pipe.py"), help="Path of the pipe script")
+    run_parser.add_argument("--duration", type=float, default=30, help="Seconds of measured load")
+    run_parser.add_argument("--warmup", type=float, default=3, help="Seconds of load before measuring")
+    run_parser.add_argument("--concurrency", type=int, default=16, help="Calls kept in flight")
+    run_parser.add_argument("--timeout", type=float, default=30, help="Seconds a device waits for an answer")
+    run_parser.add_argument("--tools", default="", help="Comma separated tools to call, default all")
+    run_parser.add_argument("--mix", default="", help="Weights overriding the defaults, e.g. get_weather=5,play_music=0")
+    run_parser.add_argument("--latency", type=float, default=0.05, help="Stub latency in seconds")
+    run_parser.add_argument("--jitter", type=float, default=0.02, help="Mean extra stub latency in seconds")
+    run_parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub requests failing with 503")
+    run_parser.add_argument("--profile", action="append", default=[],
+                            help="Per-stub settings, e.g. amap:latency=0.3,error_rate=0.05 (repeatable)")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--port", type=int, default=0, help="Endpoint port, default a free one")
+    run_parser.add_argument("--output", help="Also write the JSON results to this file")
+    run_parser.add_argument("--verbose", action="store_true", help="Show the pipe's and tools' logs")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two saved results")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+Local stand-ins for the upstream HTTP APIs used by the tools.
+
+Each stub runs a ThreadingHTTPServer and answers with canned data after a
+configurable latency (plus optional random jitter and a share of failed
+requests), so the tools can be benchmarked without network access or API
+keys. Use `StubServer` in-process for light loads, or
+`stub_process()` (or `python benchmarks/stubs.py <name>`) to keep the stub's
+threads off the benchmark's GIL under heavy concurrency.
+"""
+
+import argparse
+import contextlib
+import inspect
+import json
+import math
+import random
+import select
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # The default backlog of 5 drops connections under concurrent load
+
+
+class StubServer:
+    """HTTP server on 127.0.0.1 answering `routes` ({path: handler(request) -> dict}).
+
+    The handler gets the JSON body of a POST or the query parameters of a GET.
+    """
+
+    def __init__(self, routes, latency=0.0, port=0, bandwidth=0, capacity=0, jitter=0.0, error_rate=0.0):
+        self.routes = routes
+        self.latency = latency  # Seconds to wait before answering
+        self.jitter = jitter  # Mean of an exponentially distributed extra latency, for a long tail
+        self.error_rate = error_rate  # Share of requests answered with HTTP 503, like a flaky upstream
+        # Requests processed at once, 0 for unlimited; the rest wait like in an overloaded upstream
+        self.slots = threading.Semaphore(capacity) if capacity else contextlib.nullcontext()
+        self.bandwidth = bandwidth  # Bytes per second for binary bodies, 0 for unlimited
+        self.requests = 0
+        self.aborted = 0  # Requests dropped because the client disconnected during the latency
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+            disable_nagle_algorithm = True  # Headers and body are written separately, avoid delayed-ACK stalls
+
+            def do_GET(self):
+                self.answer(dict(parse_qsl(urlsplit(self.path).query)))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                request = dict(parse_qsl(urlsplit(self.path).query))
+                request.update(json.loads(body) if body else {})
+                self.answer(request)
+
+            def answer(self, request):
+                path = self.path.split("?", 1)[0]
+                if path == "/__stats":
+                    self.reply({"requests": stub.requests})
+                    return
+                handler = stub.routes.get(path)
+                stub.requests += 1
+                with stub.slots:
+                    latency = stub.latency + (random.expovariate(1 / stub.jitter) if stub.jitter else 0)
+                    if latency and not self.wait(latency):
+                        stub.aborted += 1
+                        self.close_connection = True
+                        return
+                    if stub.error_rate and random.random() < stub.error_rate:
+                        self.reply({"error": "stub failure"}, 503)
+                        return
+                    # Handlers may add their own processing time, which also counts against the capacity
+                    handler_result = handler(request) if callable(handler) else handler
+                if handler is None:
+                    self.reply({"error": "not found"}, 404)
+                else:
+                    self.reply(handler_result)
+
+            def wait(self, seconds):
+                """Sleep `seconds`, False if the client hung up meanwhile (like an async server canceling work)"""
+                deadline = time.monotonic() + seconds
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return True
+                    readable, _, _ = select.select([self.connection], [], [], min(remaining, 0.01))
+                    if readable:
+                        try:
+                            if not self.connection.recv(1, socket.MSG_PEEK):
+                                return False
+                        except OSError:
+                            return False
+                        time.sleep(min(remaining, 0.01))  # Pipelined data, not a hang-up
+
+            def reply(self, body, status=200):
+                if inspect.isgenerator(body):
+                    self.stream(body)
+                    return
+                binary = isinstance(body, bytes)
+                payload = body if binary else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream" if binary else "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                if not (binary and stub.bandwidth):
+                    self.wfile.write(payload)
+                    return
+                chunk = max(1, stub.bandwidth // 20)  # Trickle binary bodies out in 50 ms slices
+                try:
+                    for offset in range(0, len(payload), chunk):
+                        self.wfile.write(payload[offset:offset + chunk])
+                        time.sleep(0.05)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client stopped downloading
+
+            def stream(self, events):
+                """Server-sent events: write each string the handler yields as soon as it is produced"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                try:
+                    for event in events:
+                        self.wfile.write(event.encode())
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = _Server(("127.0.0.1", port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+
+def ragflow_retrieval(request, cost=0.0):
+    """Answer like RAGFlow's POST /api/v1/retrieval, spending `cost` seconds on the question"""
+    if cost:
+        time.sleep(cost)
+    return {
+        "code": 0,
+        "data": {
+            "chunks": [
+                {
+                    "content_ltks": f"stub chunk {i} for {request.get('question', '')}",
+                    "document_keyword": f"doc{i}.pdf",
+                    "similarity": round(random.uniform(0.3, 0.9), 4),
+                }
+                for i in range(request.get("page_size", 2))
+            ],
+            "total": request.get("page_size", 2),
+        },
+    }
+
+
+def ragflow_batch_retrieval(request, cost=0.0):
+    """Answer a batch retrieval: {"questions": [...]} -> {"data": [{"chunks": [...]}, ...]}
+
+    Spends `cost` seconds per question on top of the stub's per-request latency.
+    """
+    questions = request.get("questions", [])
+    if cost:
+        time.sleep(cost * len(questions))
+    return {"code": 0, "data": [ragflow_retrieval({**request, "question": question})["data"] for question in questions]}
+
+
+def ragflow_datasets(request):
+    """Answer like RAGFlow's GET /api/v1/datasets?id=..."""
+    return {
+        "code": 0,
+        "data": [{"id": request.get("id", ""), "name": "stub", "document_count": 10, "chunk_count": 500,
+                  "update_time": 1735689600000}],
+    }
+
+
+RAGFLOW_ROUTES = {
+    "/api/v1/retrieval": ragflow_retrieval,
+    "/api/v1/retrieval/batch": ragflow_batch_retrieval,
+    "/api/v1/datasets": ragflow_datasets,
+}
+
+
+def amap_geocode(request):
+    """Answer like Amap's GET /v3/geocode/geo, with batch=true one geocode per `|`-separated address"""
+    addresses = request.get("address", "").split("|") if request.get("batch") == "true" else [request.get("address", "")]
+    return {
+        "status": "1", "info": "OK", "infocode": "10000", "count": str(len(addresses)),
+        "geocodes": [{
+            "formatted_address": address,
+            "country": "中国", "province": "北京市", "city": "北京市", "adcode": "110101",
+            "location": f"116.{random.randint(300000, 499999)},39.{random.randint(900000, 999999)}",
+            "level": "兴趣点",
+        } for address in addresses],
+    }
+
+
+def amap_weather(request):
+    """Answer like Amap's GET /v3/weather/weatherInfo (base extensions)"""
+    return {
+        "status": "1", "info": "OK", "infocode": "10000", "count": "1",
+        "lives": [{
+            "province": "北京", "city": "东城区", "adcode": request.get("city", ""),
+            "weather": "晴", "temperature": "25", "winddirection": "南", "windpower": "≤3",
+            "humidity": "40", "reporttime": "2025-01-01 12:00:00",
+        }],
+    }
+
+
+def amap_inputtips(request):
+    """Answer like Amap's GET /v3/assistant/inputtips"""
+    keywords = request.get("keywords", "")
+    return {
+        "status": "1", "info": "OK", "infocode": "10000", "count": "3",
+        "tips": [
+            {"id": f"B0FF{zlib.crc32(keywords.encode()):08X}{i}", "name": f"{keywords}{i}", "district": "北京市朝阳区", "adcode": "110105",
+             "location": f"116.{480000 + i},39.{990000 + i}", "address": f"stub road {i}", "typecode": "050000"}
+            for i in range(3)
+        ],
+    }
+
+
+def amap_driving(request, steps=30, points_per_step=120):
+    """Answer like Amap's GET /v3/direction/driving
+
+    A deterministic route of `steps` steps between origin and destination,
+    each with a dense, slightly winding polyline (about 10 m between
+    points); `extensions=all` adds traffic segments and cities per step.
+    """
+    origin = [float(v) for v in request.get("origin", "116.481028,39.989643").split(",")]
+    destination = [float(v) for v in request.get("destination", "116.434446,39.90816").split(",")]
+    rng = random.Random(f"{origin}{destination}{request.get('strategy', '0')}")
+    total = steps * points_per_step
+    points = []
+    for i in range(total + 1):
+        t = i / total
+        bend = 0.002 * math.sin(t * math.pi * 6) + rng.uniform(-0.00002, 0.00002)
+        points.append((origin[0] + (destination[0] - origin[0]) * t + bend,
+                       origin[1] + (destination[1] - origin[1]) * t - bend))
+
+    def polyline(segment):
+        return ";".join(f"{lng:.6f},{lat:.6f}" for lng, lat in segment)
+
+    roads = ["阜通东大街", "望京街", "京密路", "东直门北大街", "东二环", "建国门内大街", "长安街"]
+    route_steps = []
+    for n in range(steps):
+        segment = points[n * points_per_step:(n + 1) * points_per_step + 1]
+        step = {
+            "instruction": f"沿{roads[n % len(roads)]}行驶{points_per_step * 10}米右转", "orientation": "东南",
+            "road": roads[n % len(roads)], "distance": str(points_per_step * 10), "tolls": "0", "toll_distance": "0",
+            "toll_road": [], "duration": str(points_per_step), "polyline": polyline(segment),
+            "action": "右转", "assistant_action": [],
+        }
+        if request.get("extensions") == "all":
+            half = len(segment) // 2
+            step["tmcs"] = [{"lcode": [], "distance": str(half * 10), "status": rng.choice(["畅通", "缓行"]),
+                             "polyline": polyline(part)} for part in (segment[:half + 1], segment[half:])]
+            step["cities"] = [{"name": "北京城区", "citycode": "010", "adcode": "110100",
+                               "districts": [{"name": "朝阳区", "adcode": "110105"}]}]
+        route_steps.append(step)
+    return {
+        "status": "1", "info": "OK", "infocode": "10000", "count": "1",
+        "route": {
+            "origin": request.get("origin", ""), "destination": request.get("destination", ""), "taxi_cost": "56",
+            "paths": [{
+                "distance": str(total * 10), "duration": str(total), "strategy": "速度最快", "tolls": "0",
+                "toll_distance": "0", "restriction": "0", "traffic_lights": "18", "steps": route_steps,
+            }],
+        },
+    }
+
+
+AMAP_ROUTES = {
+    "/v3/geocode/geo": amap_geocode,
+    "/v3/weather/weatherInfo": amap_weather,
+    "/v3/assistant/inputtips": amap_inputtips,
+    "/v3/direction/driving": amap_driving,
+}
+
+
+def alphavantage_query(request):
+    """Answer like Alpha Vantage's GET /query?function=GLOBAL_QUOTE"""
+    price = random.uniform(50, 500)
+    return {
+        "Global Quote": {
+            "01. symbol": request.get("symbol", ""), "02. open": f"{price:.4f}",
+            "03. high": f"{price * 1.01:.4f}", "04. low": f"{price * 0.99:.4f}", "05. price": f"{price:.4f}",
+            "06. volume": str(random.randint(10**5, 10**8)), "07. latest trading day": "2025-01-02",
+            "08. previous close": f"{price:.4f}", "09. change": "0.0000", "10. change percent": "0.0000%",
+        }
+    }
+
+
+ALPHAVANTAGE_ROUTES = {"/query": alphavantage_query}
+
+
+def coze_workflow_stream(request, items=5, delay=0.3):
+    """Answer like Coze's POST /v1/workflow/stream_run
+
+    The end node streams its `{"output": [...]}` JSON one item per Message
+    event, `delay` seconds apart, like a workflow that searches item by item.
+    """
+    query = request.get("parameters", {}).get("input", "")
+    chunks = []
+    for i in range(items):
+        item = json.dumps({"title": f"{query} headline {i}", "summary": f"stub summary {i} " * 8}, ensure_ascii=False)
+        chunks.append(('{"output": [' if i == 0 else ", ") + item)
+    chunks.append("]}")
+
+    def sse(event_id, event, data):
+        return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    for i, chunk in enumerate(chunks):
+        time.sleep(delay if i < items else 0)
+        yield sse(i, "Message", {"content": chunk, "node_title": "End", "node_seq_id": str(i),
+                                 "node_is_finish": i == len(chunks) - 1})
+    yield sse(len(chunks), "Done", {})
+
+
+COZE_ROUTES = {"/v1/workflow/stream_run": coze_workflow_stream}
+
+
+def silent_mp3(seconds):
+    """`seconds` of silence as MPEG-1 Layer III frames (128 kbit/s, 44.1 kHz), no encoder needed"""
+    frame = b"\xff\xfb\x90\x00" + bytes(413)  # Header + zeroed side info and data decode to silence
+    return frame * int(seconds * 44100 / 1152)
+
+
+def music_routes(base_url, seconds=30):
+    """Routes answering like the music API's POST /api/music/wy, with a song to download"""
+    return {
+        "/api/music/wy": {"code": 200, "data": {"musicurl": f"{base_url}/song.mp3"}},
+        "/song.mp3": silent_mp3(seconds),
+    }
+
+
+ROUTES = {
+    "ragflow": RAGFLOW_ROUTES,
+    "coze": COZE_ROUTES,
+    "amap": AMAP_ROUTES,
+    "alphavantage": ALPHAVANTAGE_ROUTES,
+    "music": music_routes,  # Needs the stub's own URL, see make_stub()
+}
+
+
+def make_stub(name, **options):
+    """StubServer with the routes of the `name` stub"""
+    routes = ROUTES[name]
+    stub = StubServer({} if callable(routes) else routes, **options)
+    if callable(routes):
+        stub.routes.update(routes(stub.url))
+    return stub
+
+
+@contextlib.contextmanager
+def stub_process(name, latency=0.0, jitter=0.0, error_rate=0.0):
+    """Run the `name` stub in a child process and yield its base URL"""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    process = subprocess.Popen([sys.executable, __file__, name, "--port", str(port), "--latency", str(latency),
+                                "--jitter", str(jitter), "--error-rate", str(error_rate)],
+                               stdout=sys.stderr)  # Keep the benchmark's stdout for its results
+    try:
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def stub_requests(url):
+    """Number of requests the stub at `url` has answered"""
+    import urllib.request
+    with urllib.request.urlopen(f"{url}/__stats") as response:
+        return json.loads(response.read())["requests"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub upstream API")
+    parser.add_argument("name", choices=sorted(ROUTES))
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Mean extra latency in seconds, exponentially distributed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with HTTP 503")
+    args = parser.parse_args()
+
+    stub = make_stub(args.name, latency=args.latency, port=args.port, jitter=args.jitter, error_rate=args.error_rate)
+    print(f"{args.name} stub listening on {stub.url}", flush=True)
+    stub.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
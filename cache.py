@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""TTL + LRU response cache shared by the MCP tool modules
+
+Entries live in memory in an OrderedDict bounded to `maxsize` (least
+recently used are evicted first) and expire after a per-entry TTL. When a
+`path` is given the cache is also written to a local SQLite file, and the
+freshest entries are loaded back on start, so it survives restarts. Writes
+to the file are queued and committed in batches by a background thread,
+so the disk is never waited on by a tool call.
+"""
+
+import atexit
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('cache')
+
+MISSING = object()  # get() result for a miss, so cached falsy values still count as hits
+
+
+def make_key(name, params):
+    """Cache key for a call of `name` with `params`, normalized so equivalent questions share an entry"""
+    normalized = {}
+    for key, value in params.items():
+        if isinstance(value, str):
+            value = re.sub(r'\s+', ' ', value).strip().casefold()
+        if value in ('', None):
+            continue  # An empty optional parameter is the same as leaving it out
+        normalized[key] = value
+    return f"{name}:{json.dumps(normalized, sort_keys=True, ensure_ascii=False)}"
+
+
+class TTLCache:
+    def __init__(self, name, maxsize=1024, path=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # key -> (expires_at, value), oldest use first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.db = None
+        self.db_lock = threading.Lock()  # Held while writing to the cache file, taken before `lock`
+        self.pending = []  # (sql, params) not written to the cache file yet
+        self.writing = False  # A thread is writing `pending`
+        if path:
+            try:
+                self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self.db.execute('PRAGMA journal_mode=WAL')
+                self.db.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires REAL, value TEXT)')
+                self.load()
+                atexit.register(self.flush)
+            except sqlite3.Error as e:
+                logger.warning(f"[{name}] Cache file {path} unusable, caching in memory only: {e}")
+                self.db = None
+
+    def load(self):
+        """Drop expired rows from the cache file and load the freshest ones into memory"""
+        now = time.time()
+        self.db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        rows = self.db.execute('SELECT key, expires, value FROM cache ORDER BY expires DESC LIMIT ?',
+                               (self.maxsize,)).fetchall()
+        self.db.execute('DELETE FROM cache WHERE key NOT IN (SELECT key FROM cache ORDER BY expires DESC LIMIT ?)',
+                        (self.maxsize,))
+        for key, expires, value in reversed(rows):
+            self.entries[key] = (expires, json.loads(value))
+        logger.info(f"[{self.name}] Loaded {len(rows)} cached entries")
+
+    def get(self, key):
+        """Return the cached value of `key`, or MISSING"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self.entries[key]
+            self.misses += 1
+            return MISSING
+
+    def peek(self, key):
+        """Like get(), but not counted in the hit/miss stats, e.g. for a second lookup of the same call"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self.entries.move_to_end(key)
+                    return entry[1]
+                del self.entries[key]
+            return MISSING
+
+    def set(self, key, value, ttl):
+        """Cache `value` (JSON-serializable) under `key` for `ttl` seconds"""
+        expires = time.time() + ttl
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                evicted, _ = self.entries.popitem(last=False)
+                self.evictions += 1
+                self.persist('DELETE FROM cache WHERE key = ?', (evicted,))
+            self.persist('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                         (key, expires, json.dumps(value, ensure_ascii=False)))
+
+    def clear(self):
+        """Drop every entry, e.g. when the data behind the cached answers changed"""
+        with self.lock:
+            self.entries.clear()
+            self.persist('DELETE FROM cache', ())
+
+    def persist(self, sql, params):
+        """Queue a write to the cache file, the lock must be held"""
+        if self.db is None:
+            return
+        self.pending.append((sql, params))
+        if not self.writing:
+            self.writing = True
+            threading.Thread(target=self.write_pending, name=f"cache-{self.name}", daemon=True).start()
+
+    def write_pending(self):
+        """Commit the queued writes until there are none left; writes queued meanwhile form the next batch"""
+        while True:
+            with self.db_lock:
+                with self.lock:
+                    writes, self.pending = self.pending, []
+                    if not writes:
+                        self.writing = False
+                        return
+                self.write(writes)
+
+    def flush(self):
+        """Commit the queued writes now, e.g. before the process exits"""
+        with self.db_lock:
+            with self.lock:
+                writes, self.pending = self.pending, []
+            if writes:
+                self.write(writes)
+
+    def write(self, writes):
+        """Commit `writes` in one transaction, the db lock must be held; a failure only loses the file copy"""
+        try:
+            self.db.execute('BEGIN')
+            for sql, params in writes:
+                self.db.execute(sql, params)
+            self.db.execute('COMMIT')
+        except sqlite3.Error as e:
+            logger.warning(f"[{self.name}] Failed to persist {len(writes)} cache change(s): {e}")
+            try:
+                self.db.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+
+    def stats(self):
+        """Hit/miss counters and size"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0,
+                'evictions': self.evictions,
+                'size': len(self.entries),
+            }
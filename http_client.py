@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Shared HTTP client for the MCP tool modules
+
+All tools go through the pooled sessions here instead of module-level
+`requests` calls, so connections to each upstream host are kept alive and
+reused, DNS lookups are cached, and every request has an explicit timeout.
+Under mcp_pipe.py with metrics enabled, every request's time to response
+headers is reported as `upstream_seconds` by host and status.
+
+Tools use `get_session()` / `get_json()` / `post_json()`. The JSON helpers
+raise `aiohttp.ClientResponseError` for 5xx answers, which are error pages
+rather than API results, so resilience.py counts them as failures.
+"""
+
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+import metrics
+
+logger = logging.getLogger('http_client')
+
+# Default timeouts in seconds, tools can pass their own per call
+DEFAULT_TIMEOUT = 10
+CONNECT_TIMEOUT = 5
+
+# Connection pool limits, per session and per upstream host
+POOL_SIZE = 100
+POOL_SIZE_PER_HOST = 50
+KEEPALIVE_TIMEOUT = 30  # Seconds an idle connection is kept open
+DNS_CACHE_TTL = 300
+
+_sessions = {}  # event loop -> aiohttp.ClientSession (a session is bound to its loop)
+
+
+def make_timeout(timeout=None):
+    """aiohttp timeout for a total of `timeout` seconds"""
+    return aiohttp.ClientTimeout(total=timeout or DEFAULT_TIMEOUT, sock_connect=CONNECT_TIMEOUT)
+
+
+def trace_config():
+    """aiohttp tracing that emits the latency of each request to the pipe's metrics"""
+    async def on_start(session, context, params):
+        context.start = time.monotonic()
+
+    async def on_end(session, context, params):
+        metrics.emit("upstream_seconds", time.monotonic() - context.start,
+                     host=params.url.host, status=str(params.response.status))
+
+    async def on_exception(session, context, params):
+        metrics.emit("upstream_seconds", time.monotonic() - context.start,
+                     host=params.url.host, status=type(params.exception).__name__)
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_start)
+    config.on_request_end.append(on_end)
+    config.on_request_exception.append(on_exception)
+    return config
+
+
+def get_session():
+    """Return the pooled ClientSession of the running event loop"""
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_SIZE,
+            limit_per_host=POOL_SIZE_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=make_timeout(),
+                                        trace_configs=[trace_config()] if metrics.ENABLED else None)
+        _sessions[loop] = session
+    return session
+
+
+async def get_json(url, params=None, timeout=None, **kwargs):
+    """GET `url` and return the decoded JSON body"""
+    async with get_session().get(url, params=params, timeout=make_timeout(timeout), **kwargs) as response:
+        if response.status >= 500:
+            response.raise_for_status()
+        return await response.json(content_type=None)
+
+
+async def post_json(url, params=None, json=None, timeout=None, **kwargs):
+    """POST to `url` and return the decoded JSON body"""
+    async with get_session().post(url, params=params, json=json, timeout=make_timeout(timeout), **kwargs) as response:
+        if response.status >= 500:
+            response.raise_for_status()
+        return await response.json(content_type=None)
+
+
+async def close_sessions():
+    """Close the sessions of the running event loop, call before the loop stops"""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
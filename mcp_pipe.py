@@ -5,20 +5,33 @@ Version: 0.1.0
 Usage:
 
 export MCP_ENDPOINT=<mcp_endpoint>
-python mcp_pipe.py <mcp_script>
+python mcp_pipe.py <mcp_script> [<mcp_script> ...]
+
+With several scripts the pipe runs as a gateway: one WebSocket connection fronts
+all of them, `tools/list` results are merged and each `tools/call` is routed to
+the script that owns the tool.
+
+The scripts are pinged periodically and restarted when they crash or stop
+answering. On SIGTERM the pipe stops taking tool calls and lets the ones in
+flight finish before it exits.
 
 """
 
 import asyncio
 import websockets
-import subprocess
+from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
+import collections
+import json
 import logging
 import os
 import signal
 import sys
 import random
+import time
 from dotenv import load_dotenv
 
+import metrics
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -35,7 +48,121 @@ MAX_BACKOFF = 600  # Maximum wait time in seconds
 reconnect_attempt = 0
 backoff = INITIAL_BACKOFF
 
-async def connect_with_retry(uri):
+# Pipe settings
+STREAM_LIMIT = 16 * 1024 * 1024  # Max size of one JSON-RPC line from the child (route/RAG results can be large)
+TERMINATE_TIMEOUT = 5  # Seconds to wait for the child to exit before killing it
+OUTBOX_SIZE = 1000  # Child messages buffered for the WebSocket (kept across reconnects)
+
+# WebSocket settings
+COMPRESSION = os.environ.get('MCP_PIPE_COMPRESSION', 'deflate')  # 'deflate' offers permessage-deflate, 'off' disables it
+DEFLATE_LEVEL = int(os.environ.get('MCP_PIPE_DEFLATE_LEVEL', '6'))  # zlib level 1-9
+DEFLATE_MEM_LEVEL = int(os.environ.get('MCP_PIPE_DEFLATE_MEM_LEVEL', '5'))  # zlib memLevel 1-9, higher compresses slightly better
+DEFLATE_WINDOW_BITS = int(os.environ.get('MCP_PIPE_DEFLATE_WINDOW_BITS', '15'))  # Compression window 9-15, lower saves memory
+WS_MAX_SIZE = int(os.environ.get('MCP_PIPE_MAX_SIZE', str(2 ** 20)))  # Largest message accepted from the endpoint, bytes
+WS_WRITE_LIMIT = int(os.environ.get('MCP_PIPE_WRITE_LIMIT', str(2 ** 15)))  # Send buffer high-water mark, bytes
+
+# Batching settings: coalesce small queued lines into one JSON-RPC batch message (only if the endpoint accepts batches)
+BATCH_MAX = int(os.environ.get('MCP_PIPE_BATCH_MAX', '1'))  # Lines per WebSocket message, 1 disables batching
+BATCH_LINE_MAX = int(os.environ.get('MCP_PIPE_BATCH_LINE_MAX', '4096'))  # Longer lines always go alone, characters
+BATCH_DELAY = float(os.environ.get('MCP_PIPE_BATCH_DELAY_MS', '0')) / 1000  # Latency cap to wait for more lines, 0 only takes what is queued
+
+# Child restart settings (children survive reconnects and are only restarted when they crash)
+CHILD_RESTART_BACKOFF = 1  # Initial wait before restarting a crashed child, in seconds
+CHILD_MAX_BACKOFF = 30  # Maximum wait before restarting a crashed child, in seconds
+CHILD_STABLE_TIME = 60  # A child that ran this long resets the restart backoff
+
+# Health settings
+HEALTH_INTERVAL = float(os.environ.get('MCP_PIPE_HEALTH_INTERVAL', '30'))  # Seconds between `ping`s to each child, 0 disables
+HEALTH_TIMEOUT = float(os.environ.get('MCP_PIPE_HEALTH_TIMEOUT', '10'))  # Seconds a child has to answer a ping
+HEALTH_FAILURES = int(os.environ.get('MCP_PIPE_HEALTH_FAILURES', '3'))  # Missed pings in a row before the child is restarted
+STATUS_INTERVAL = float(os.environ.get('MCP_PIPE_STATUS_INTERVAL', '300'))  # Seconds between child status logs, 0 disables
+DRAIN_TIMEOUT = float(os.environ.get('MCP_PIPE_DRAIN_TIMEOUT', '30'))  # Seconds SIGTERM waits for tool calls in flight
+PING_REQUEST = {'jsonrpc': '2.0', 'method': 'ping'}
+
+# Startup settings
+STARTUP_BUDGET = float(os.environ.get('MCP_PIPE_STARTUP_BUDGET', '2'))  # Seconds from spawn to answering initialize before we warn
+IMPORT_TIME = os.environ.get('MCP_PIPE_IMPORTTIME', '') == '1'  # Run children with `-X importtime` and report slow imports
+WARM_STANDBY = os.environ.get('MCP_PIPE_WARM_STANDBY', '') == '1'  # Keep a spare started process per child to swap in on crash
+IMPORT_TIME_PREFIX = 'import time:'
+IMPORT_REPORT_TOP = 5  # Slowest top-level imports listed in the startup report
+IMPORT_REPORT_MIN_US = 20000  # Deferred imports slower than this are logged when they happen
+PROBE_INITIALIZE_PARAMS = {
+    'protocolVersion': '2024-11-05',
+    'capabilities': {},
+    'clientInfo': {'name': 'mcp_pipe', 'version': '0.1.0'}
+}
+
+# Metrics settings: per-request latency histograms, plus the upstream timings the children report on stderr
+METRICS_PORT = int(os.environ.get('MCP_PIPE_METRICS_PORT', '0'))  # Serve Prometheus text on 127.0.0.1:<port>, 0 disables
+METRICS_DUMP = float(os.environ.get('MCP_PIPE_METRICS_DUMP', '0'))  # Log the histograms every this many seconds, 0 disables
+METRICS = bool(METRICS_PORT or METRICS_DUMP)
+TRACE_MAX_IN_FLIGHT = 10000  # Requests tracked at once, the oldest are forgotten beyond this
+METRIC_PREFIX = metrics.PREFIX.encode()
+registry = metrics.Registry()
+
+# Admission settings: caps on concurrent `tools/call`, beyond which calls wait in a bounded queue or are shed
+MAX_IN_FLIGHT = int(os.environ.get('MCP_PIPE_MAX_IN_FLIGHT', '64'))  # Tool calls in flight across all tools, 0 for no cap
+TOOL_CONCURRENCY = int(os.environ.get('MCP_PIPE_TOOL_CONCURRENCY', '16'))  # Tool calls in flight per tool, 0 for no cap
+TOOL_LIMITS = os.environ.get('MCP_PIPE_TOOL_LIMITS', '')  # Per-tool caps, e.g. "search_knowledge=4,plan_driving_route=8"
+QUEUE_SIZE = int(os.environ.get('MCP_PIPE_QUEUE_SIZE', '32'))  # Calls waiting per tool, more are shed at once
+QUEUE_TIMEOUT = float(os.environ.get('MCP_PIPE_QUEUE_TIMEOUT', '10'))  # Seconds a call may wait for a slot before it is shed
+ADMISSION_LEASE = 600  # Seconds after which an unanswered call gives its slot back (the child lost it)
+OVERLOADED_CODE = -32001  # JSON-RPC error code of shed calls
+SHED_LOG_EVERY = 100  # Log the first shed call of a tool and then every this many
+
+# Gateway settings (several mcp_scripts behind one connection)
+FANOUT_TIMEOUT = 30  # Seconds to wait for each server when merging fanned-out requests
+LIST_KEYS = {
+    'tools/list': 'tools',
+    'resources/list': 'resources',
+    'resources/templates/list': 'resourceTemplates',
+    'prompts/list': 'prompts',
+}
+FANOUT_METHODS = {'initialize', *LIST_KEYS}
+TOOLS_LIST_REQUEST = {'jsonrpc': '2.0', 'method': 'tools/list'}
+
+async def run_pipe(uri):
+    """Start the MCP children once and keep them alive while the WebSocket reconnects"""
+    children = [McpChild(script) for script in mcp_scripts]
+    gateway = Gateway(children)
+    if not gateway.passthrough:
+        logger.info(f"Gateway mode: {len(children)} MCP servers behind one connection")
+    supervisors = [asyncio.create_task(supervise_child(child, gateway)) for child in children]
+    if HEALTH_INTERVAL:
+        supervisors += [asyncio.create_task(check_health(child, gateway)) for child in children]
+    if STATUS_INTERVAL:
+        supervisors.append(asyncio.create_task(log_status(children)))
+    if METRICS:
+        registry.collectors.append(lambda registry: collect_child_gauges(registry, children))
+    if METRICS_PORT:
+        supervisors.append(asyncio.create_task(metrics.serve(registry, METRICS_PORT)))
+    if METRICS_DUMP:
+        supervisors.append(asyncio.create_task(metrics.dump_every(registry, METRICS_DUMP)))
+    stopping = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    except (NotImplementedError, AttributeError):
+        pass  # Windows: no SIGTERM, the pipe is simply terminated
+    try:
+        # Only connect once every child is up, so the first messages have somewhere to go
+        await asyncio.gather(*[child.started.wait() for child in children])
+        connection = asyncio.create_task(connect_with_retry(uri, gateway))
+        stop = asyncio.create_task(stopping.wait())
+        done, _ = await asyncio.wait([connection, stop], return_when=asyncio.FIRST_COMPLETED)
+        if connection in done:
+            stop.cancel()
+            connection.result()  # connect_with_retry only ever ends by raising
+        logger.info("Received SIGTERM, shutting down")
+        await gateway.drain(DRAIN_TIMEOUT)
+        connection.cancel()
+        await asyncio.gather(connection, return_exceptions=True)
+    finally:
+        for task in supervisors:
+            task.cancel()
+        for child in children:
+            await child.terminate()
+
+async def connect_with_retry(uri, gateway):
     """Connect to WebSocket server with retry mechanism"""
     global reconnect_attempt, backoff
     while True:  # Infinite reconnection
@@ -46,7 +173,7 @@ async def connect_with_retry(uri):
                 await asyncio.sleep(wait_time)
                 
             # Attempt to connect
-            await connect_to_server(uri)
+            await connect_to_server(uri, gateway)
         
         except Exception as e:
             reconnect_attempt += 1
@@ -54,53 +181,920 @@ async def connect_with_retry(uri):
             # Calculate wait time for next reconnection (exponential backoff)
             backoff = min(backoff * 2, MAX_BACKOFF)
 
-async def connect_to_server(uri):
-    """Connect to WebSocket server and establish bidirectional communication with `mcp_script`"""
+async def connect_to_server(uri, gateway):
+    """Connect to WebSocket server and establish bidirectional communication with the running `mcp_scripts`"""
     global reconnect_attempt, backoff
     try:
         logger.info(f"Connecting to WebSocket server...")
-        async with websockets.connect(uri) as websocket:
-            logger.info(f"Successfully connected to WebSocket server")
+        async with websockets.connect(uri, **connect_options()) as websocket:
+            extensions = getattr(getattr(websocket, 'protocol', websocket), 'extensions', [])
+            logger.info(f"Successfully connected to WebSocket server"
+                        f" (extensions: {', '.join(e.name for e in extensions) or 'none'})")
             
             # Reset reconnection counter if connection closes normally
             reconnect_attempt = 0
             backoff = INITIAL_BACKOFF
             
-            # Start mcp_script process
-            process = subprocess.Popen(
-                ['python', mcp_script],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                encoding='utf-8',
-                text=True  # Use text mode
-            )
-            logger.info(f"Started {mcp_script} process")
-            
-            # Create two tasks: read from WebSocket and write to process, read from process and write to WebSocket
-            await asyncio.gather(
-                pipe_websocket_to_process(websocket, process),
-                pipe_process_to_websocket(process, websocket),
-                pipe_process_stderr_to_terminal(process)
-            )
+            # Pipe in both directions until either side fails; the children keep running
+            gateway.attach()
+            tasks = [
+                asyncio.create_task(pipe_websocket_to_process(websocket, gateway)),
+                asyncio.create_task(pipe_outbox_to_websocket(gateway.outbox, websocket, gateway.tracer))
+            ]
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                gateway.detach()
+            for task in done:
+                task.result()  # Re-raise the exception that ended the connection
     except websockets.exceptions.ConnectionClosed as e:
         logger.error(f"WebSocket connection closed: {e}")
         raise  # Re-throw exception to trigger reconnection
     except Exception as e:
         logger.error(f"Connection error: {e}")
         raise  # Re-throw exception
+
+def connect_options():
+    """Keyword arguments of websockets.connect() from the WebSocket settings"""
+    options = {'max_size': WS_MAX_SIZE, 'write_limit': WS_WRITE_LIMIT}
+    if COMPRESSION == 'off':
+        options['compression'] = None
+    else:
+        options['extensions'] = [ClientPerMessageDeflateFactory(
+            client_max_window_bits=DEFLATE_WINDOW_BITS,
+            compress_settings={'level': DEFLATE_LEVEL, 'memLevel': DEFLATE_MEM_LEVEL},
+        )]
+    return options
+
+async def supervise_child(child, gateway):
+    """Run `child` for the life of the pipe, restarting it only when it crashes
+    (or `check_health` killed it for not answering pings).
+
+    With MCP_PIPE_WARM_STANDBY a second, already started process is kept in
+    reserve and swapped in as soon as the active one dies.
+    """
+    delay = CHILD_RESTART_BACKOFF
+    standby = None
+    warming = None
+    try:
+        while True:
+            started_at = time.monotonic()
+            if standby is not None and standby[0].returncode is None:
+                process, readers = standby
+                logger.info(f"Swapped in warm standby for {child.script}")
+            else:
+                try:
+                    process, readers = await start_child_process(child, gateway)
+                except OSError as e:
+                    logger.error(f"Cannot start {child.script}: {e}, retrying in {delay:.0f}s")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, CHILD_MAX_BACKOFF)
+                    continue
+            standby = child.standby = None
+            child.process = process
+            child.process_started_at = time.monotonic()
+            child.missed_pings = 0
+            # A restarted child must repeat the handshake the endpoint did with its predecessor
+            await gateway.initialize_child(child)
+            child.ready = True
+            child.started.set()
+            if WARM_STANDBY:
+                warming = asyncio.create_task(start_child_process(child, gateway))
+
+            returncode = await process.wait()
+            child.ready = False
+            await readers
+            gateway.child_exited(process)
+            child.restarts += 1
+
+            if warming is not None:
+                try:
+                    standby = await warming
+                    child.standby = standby[0]
+                except OSError as e:
+                    logger.error(f"Cannot start standby for {child.script}: {e}")
+                warming = None
+            if time.monotonic() - started_at > CHILD_STABLE_TIME:
+                delay = CHILD_RESTART_BACKOFF
+            if standby is not None:
+                logger.warning(f"{child.script} exited with code {returncode}")
+                continue
+            logger.warning(f"{child.script} exited with code {returncode}, restarting in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CHILD_MAX_BACKOFF)
     finally:
-        # Ensure the child process is properly terminated
-        if 'process' in locals():
-            logger.info(f"Terminating {mcp_script} process")
+        if warming is not None:
+            warming.cancel()
+
+async def start_child_process(child, gateway):
+    """Spawn a process for `child`, wait until it answers `initialize` and report its startup time"""
+    process = await child.spawn()
+    startup = {'done': False, 'import_times': []}
+    readers = asyncio.gather(
+        pipe_process_to_websocket(child, process, gateway),
+        pipe_process_stderr_to_terminal(child, process, startup),
+        return_exceptions=True
+    )
+    # An initialize is the earliest request an MCP server answers; servers accept a repeated one
+    probe = {
+        'jsonrpc': '2.0', 'method': 'initialize',
+        'params': gateway.initialize_params or PROBE_INITIALIZE_PARAMS
+    }
+    response, = await gateway.collect([await gateway.send_request(child, probe, process)])
+    startup_time = time.monotonic() - child.spawned_at
+    if response is None:
+        logger.warning(f"{child.script} did not answer initialize within {FANOUT_TIMEOUT}s")
+    else:
+        report_startup(child, startup_time, startup['import_times'])
+    startup['done'] = True
+    return process, readers
+
+def report_startup(child, startup_time, import_times):
+    """Log how long `child` took to become ready, with its slowest imports if measured"""
+    level = logging.WARNING if startup_time > STARTUP_BUDGET else logging.INFO
+    logger.log(level, f"{child.script} ready in {startup_time:.2f}s (budget {STARTUP_BUDGET:.1f}s)")
+    if import_times:
+        slowest = sorted(import_times, reverse=True)[:IMPORT_REPORT_TOP]
+        logger.log(level, f"{child.script} slowest imports: " + ', '.join(
+            f"{name} {cumulative / 1000:.0f}ms" for cumulative, name in slowest
+        ))
+
+async def check_health(child, gateway):
+    """Ping `child` every HEALTH_INTERVAL seconds and kill a process that misses HEALTH_FAILURES pings in a row,
+    so that supervise_child restarts it"""
+    while True:
+        await asyncio.sleep(HEALTH_INTERVAL)
+        process = child.process
+        if not child.ready or process.returncode is not None:
+            continue
+        gateway_id, future = await gateway.send_request(child, PING_REQUEST, process)
+        try:
+            # Any answer will do, even an error: the process is reading and writing
+            response = await asyncio.wait_for(future, timeout=HEALTH_TIMEOUT)
+        except asyncio.TimeoutError:
+            gateway.pending.pop(gateway_id, None)
+            response = None
+        if process is not child.process or process.returncode is not None:
+            continue  # Exited meanwhile, supervise_child takes care of it
+        if response is not None:
+            child.missed_pings = 0
+            continue
+        child.missed_pings += 1
+        logger.warning(f"{child.script} did not answer ping within {HEALTH_TIMEOUT:g}s"
+                       f" ({child.missed_pings}/{HEALTH_FAILURES})")
+        if child.missed_pings >= HEALTH_FAILURES:
+            logger.error(f"{child.script} is unresponsive, killing it to restart")
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+
+def process_usage(pid):
+    """(RSS bytes, CPU seconds) of process `pid`, or None where /proc is not available"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        return int(fields[21]) * os.sysconf('SC_PAGE_SIZE'), (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def child_status(child):
+    """Uptime, restarts and resource use of `child`'s active process"""
+    process = child.process
+    running = child.ready and process is not None and process.returncode is None
+    status = {
+        'pid': process.pid if running else None,
+        'uptime': time.monotonic() - child.process_started_at if running else 0.0,
+        'restarts': child.restarts,
+        'missed_pings': child.missed_pings,
+        'rss': None,
+        'cpu': None,
+    }
+    usage = process_usage(process.pid) if running else None
+    if usage:
+        status['rss'], status['cpu'] = usage
+    return status
+
+async def log_status(children):
+    """Log every child's pid, uptime, RSS, CPU use and restarts every STATUS_INTERVAL seconds"""
+    cpu_before = {}
+    while True:
+        await asyncio.sleep(STATUS_INTERVAL)
+        for child in children:
+            status = child_status(child)
+            usage = ''
+            if status['rss'] is not None:
+                pid, cpu = cpu_before.get(child.script, (None, 0.0))
+                # CPU share since the last report, or since start for a new process
+                spent = status['cpu'] - cpu if pid == status['pid'] else status['cpu']
+                window = min(STATUS_INTERVAL, status['uptime']) or STATUS_INTERVAL
+                usage = f", rss {status['rss'] / 2 ** 20:.1f}MB, cpu {spent / window * 100:.1f}%"
+                cpu_before[child.script] = (status['pid'], status['cpu'])
+            logger.info(f"Status {child.script}: pid {status['pid']}, up {status['uptime']:.0f}s{usage},"
+                        f" restarts {status['restarts']}, missed pings {status['missed_pings']}")
+
+def collect_child_gauges(registry, children):
+    """Set the per-child gauges of the metrics endpoint"""
+    for child in children:
+        status = child_status(child)
+        name = os.path.basename(child.script)
+        registry.set_gauge('mcp_child_up', 1 if status['pid'] else 0, child=name)
+        registry.set_gauge('mcp_child_uptime_seconds', round(status['uptime'], 1), child=name)
+        registry.set_gauge('mcp_child_restarts', status['restarts'], child=name)
+        if status['rss'] is not None:
+            registry.set_gauge('mcp_child_rss_bytes', status['rss'], child=name)
+            registry.set_gauge('mcp_child_cpu_seconds', round(status['cpu'], 2), child=name)
+
+def parse_import_time(line):
+    """Parse a `-X importtime` stderr line into (cumulative us, module) for a top-level import"""
+    fields = line.decode('utf-8', 'replace')[len(IMPORT_TIME_PREFIX):].split('|')
+    if len(fields) != 3 or not fields[1].strip().isdigit():
+        return None  # The header line
+    name = fields[2].rstrip()
+    if name.startswith('  '):
+        return None  # A nested import, already counted in its parent
+    return int(fields[1]), name.strip()
+
+class McpChild:
+    """One MCP server subprocess speaking newline-delimited JSON-RPC over stdio"""
+
+    def __init__(self, script):
+        self.script = script
+        self.process = None  # The active process
+        self.standby = None  # A warm spare process (MCP_PIPE_WARM_STANDBY)
+        self.spawned_at = None
+        self.ready = False  # Running and initialized, may take endpoint traffic
+        self.started = asyncio.Event()  # Set once the first process is up
+        self.process_started_at = None
+        self.restarts = 0  # Processes that exited (crashed or killed as unresponsive) and were replaced
+        self.missed_pings = 0  # Health checks the active process failed in a row
+
+    async def spawn(self):
+        """Start the script with non-blocking pipes (binary mode, we do the line framing)"""
+        options = ['-X', 'importtime'] if IMPORT_TIME else []
+        self.spawned_at = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            'python', *options, self.script,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=STREAM_LIMIT,
+            env={**os.environ, 'MCP_METRICS': '1'} if METRICS else None
+        )
+        logger.info(f"Started {self.script} process")
+        return process
+
+    async def write(self, data, process=None):
+        """Write one line to the process stdin, waiting for the pipe to drain (backpressure).
+
+        Writes to the active process unless another one is given. Returns False
+        if the process is gone; the supervisor takes care of restarting it.
+        """
+        process = process or self.process
+        try:
+            process.stdin.write(data.rstrip(b'\r\n') + b'\n')
+            await process.stdin.drain()
+            return True
+        except (BrokenPipeError, ConnectionResetError) as e:
+            logger.warning(f"Cannot write to {self.script} process: {e}")
+            return False
+
+    async def terminate(self):
+        """Terminate the active and standby processes, killing them if they do not exit in time"""
+        self.ready = False
+        for process in (self.process, self.standby):
+            if process is None or process.returncode is not None:
+                continue
+            logger.info(f"Terminating {self.script} process")
             try:
+                if not process.stdin.is_closing():
+                    process.stdin.close()
                 process.terminate()
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
+                await asyncio.wait_for(process.wait(), timeout=TERMINATE_TIMEOUT)
+            except asyncio.TimeoutError:
                 process.kill()
-            logger.info(f"{mcp_script} process terminated")
+                await process.wait()
+            except ProcessLookupError:
+                pass
+            logger.info(f"{self.script} process terminated")
+
+class Outbox:
+    """Bounded FIFO of lines on their way to the WebSocket, each with its trace key (or None).
+
+    It outlives connections: while disconnected, child output is buffered (oldest
+    dropped first when full) and replayed after reconnecting. While connected, a
+    full outbox blocks the child readers instead, which is the usual backpressure.
+    """
+
+    def __init__(self, maxsize):
+        self.items = collections.deque()
+        self.maxsize = maxsize
+        self.connected = False
+        self.readable = asyncio.Event()
+        self.writable = asyncio.Event()
+
+    async def put(self, text, trace=None):
+        while len(self.items) >= self.maxsize:
+            if not self.connected:
+                self.items.popleft()
+                logger.warning(f"Outbox full while disconnected, dropped the oldest message")
+                break
+            self.writable.clear()
+            await self.writable.wait()
+        self.items.append((text, trace))
+        self.readable.set()
+
+    async def get(self):
+        while not self.items:
+            self.readable.clear()
+            await self.readable.wait()
+        item = self.items.popleft()
+        self.writable.set()
+        return item
+
+    async def get_batch(self, max_items, max_line, delay):
+        """Next item, plus up to `max_items` - 1 more with small lines queued within `delay` seconds"""
+        batch = [await self.get()]
+        if max_items <= 1 or len(batch[0][0]) > max_line:
+            return batch
+        deadline = asyncio.get_running_loop().time() + delay
+        while len(batch) < max_items:
+            if not self.items:
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                self.readable.clear()
+                try:
+                    await asyncio.wait_for(self.readable.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                continue
+            if len(self.items[0][0]) > max_line:
+                break
+            batch.append(self.items.popleft())
+            self.writable.set()
+        return batch
+
+    def unget(self, item):
+        """Put back an item that could not be sent, it goes out first next time"""
+        self.items.appendleft(item)
+        self.readable.set()
+
+    def set_connected(self, connected):
+        self.connected = connected
+        self.writable.set()  # Wake blocked writers so they re-check
+
+class Tracer:
+    """Per-request timestamps by JSON-RPC id, recorded into latency histograms.
+
+    A request is stamped when it arrives from the WebSocket, once it was
+    written to the child's stdin, when the child's response is read from its
+    stdout and when that response was sent to the WebSocket. Each request
+    adds its total to `mcp_request_seconds` and the three parts to
+    `mcp_pipe_stage_seconds` (stage ws_to_child, child, child_to_ws),
+    labeled with the tool name (or the method for other requests).
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.requests = {}  # trace key -> [label, received, written, answered]
+
+    def received(self, data):
+        """Stamp a line from the WebSocket, return its trace key if it is a request"""
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return None
+        if not isinstance(message, dict) or 'method' not in message or message.get('id') is None:
+            return None
+        label = message['method']
+        if label == 'tools/call':
+            label = (message.get('params') or {}).get('name') or label
+        if len(self.requests) >= TRACE_MAX_IN_FLIGHT:
+            del self.requests[next(iter(self.requests))]  # Never answered, forget the oldest
+        key = json.dumps(message['id'])  # 1 and "1" are different ids
+        self.requests[key] = [str(label), time.monotonic(), None, None]
+        return key
+
+    def written(self, key):
+        entry = self.requests.get(key)
+        if entry is not None:
+            entry[2] = time.monotonic()
+
+    def answered(self, msg_id):
+        """Stamp the response to `msg_id` as it leaves the child, return its trace key if traced"""
+        key = json.dumps(msg_id)
+        entry = self.requests.get(key)
+        if entry is None:
+            return None
+        entry[3] = time.monotonic()
+        return key
+
+    def sent(self, key):
+        entry = self.requests.pop(key, None)
+        if entry is None:
+            return
+        now = time.monotonic()
+        label, received, written, answered = entry
+        self.registry.observe('mcp_request_seconds', now - received, tool=label)
+        if written is not None:
+            self.registry.observe('mcp_pipe_stage_seconds', written - received, tool=label, stage='ws_to_child')
+        if written is not None and answered is not None:
+            self.registry.observe('mcp_pipe_stage_seconds', answered - written, tool=label, stage='child')
+        if answered is not None:
+            self.registry.observe('mcp_pipe_stage_seconds', now - answered, tool=label, stage='child_to_ws')
+
+class Admission:
+    """Concurrency caps for `tools/call`, overall and per tool.
+
+    A call over a cap waits for a slot in a FIFO queue, at most `queue_size`
+    calls per tool for at most `queue_timeout` seconds. Beyond that it is shed,
+    so the device gets an error right away instead of a timeout much later.
+    A call holds its slot until its response leaves the pipe or the process it
+    went to exits. A cancelled call keeps its slot until the child answers it
+    (the MCP SDK answers cancelled requests), as the child may still be busy
+    with it; a cancelled call still waiting in the queue is dropped at once.
+    """
+
+    def __init__(self, max_in_flight, tool_concurrency, tool_limits, queue_size, queue_timeout):
+        self.max_in_flight = max_in_flight
+        self.tool_concurrency = tool_concurrency
+        self.tool_limits = tool_limits  # tool name -> cap, overrides tool_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = {}  # request key -> [tool, process it was written to, admitted at]
+        self.running = collections.Counter()  # tool -> calls in flight
+        self.waiting = collections.deque()  # (key, tool, future) in arrival order
+        self.queued = collections.Counter()  # tool -> calls waiting
+        self.shed = collections.Counter()  # tool -> calls shed so far
+
+    def has_room(self, tool):
+        limit = self.tool_limits.get(tool, self.tool_concurrency)
+        return ((not self.max_in_flight or len(self.in_flight) < self.max_in_flight)
+                and (not limit or self.running[tool] < limit))
 
-async def pipe_websocket_to_process(websocket, process):
+    def admit(self, key, tool):
+        """Take a slot for call `key` if the caps allow it now"""
+        if key in self.in_flight:
+            return True  # A repeated id, it already holds a slot
+        if not self.has_room(tool):
+            self.expire()
+            if not self.has_room(tool):
+                return False
+        self.take(key, tool)
+        return True
+
+    def enqueue(self, key, tool):
+        """Wait for a slot: a future set to True once admitted, False on timeout or None when cancelled;
+        None instead of a future if the queue is full"""
+        if self.queued[tool] >= self.queue_size:
+            return None
+        loop = asyncio.get_running_loop()
+        entry = (key, tool, loop.create_future())
+        self.waiting.append(entry)
+        self.queued[tool] += 1
+        if self.queue_timeout > 0:
+            loop.call_later(self.queue_timeout, self.give_up, entry)
+        return entry[2]
+
+    def give_up(self, entry, result=False):
+        if entry in self.waiting:
+            self.waiting.remove(entry)
+            self.queued[entry[1]] -= 1
+        if not entry[2].done():
+            entry[2].set_result(result)
+
+    def cancel(self, key):
+        """Drop call `key` from the queue if it is still waiting; a call in flight keeps its slot"""
+        for entry in list(self.waiting):
+            if entry[0] == key:
+                self.give_up(entry, None)
+
+    def take(self, key, tool):
+        self.in_flight[key] = [tool, None, time.monotonic()]
+        self.running[tool] += 1
+
+    def bind(self, key, process):
+        """Remember which process call `key` was written to"""
+        entry = self.in_flight.get(key)
+        if entry is not None:
+            entry[1] = process
+
+    def release(self, key):
+        """Give back the slot of call `key` (if it holds one) and admit waiting calls that fit now"""
+        entry = self.in_flight.pop(key, None)
+        if entry is None:
+            return
+        self.running[entry[0]] -= 1
+        for waiter in list(self.waiting):
+            waiter_key, tool, future = waiter
+            if future.done() or self.has_room(tool):
+                self.waiting.remove(waiter)
+                self.queued[tool] -= 1
+                if not future.done():
+                    self.take(waiter_key, tool)
+                    future.set_result(True)
+            elif self.max_in_flight and len(self.in_flight) >= self.max_in_flight:
+                break
+
+    def release_process(self, process):
+        """Give back the slots of calls written to `process`, return their keys"""
+        keys = [key for key, entry in self.in_flight.items() if entry[1] is process]
+        for key in keys:
+            self.release(key)
+        return keys
+
+    def expire(self):
+        """Give back the slots of calls unanswered for longer than ADMISSION_LEASE"""
+        deadline = time.monotonic() - ADMISSION_LEASE
+        for key in [key for key, entry in self.in_flight.items() if entry[2] < deadline]:
+            logger.warning(f"No response to {self.in_flight[key][0]} call {key} within {ADMISSION_LEASE}s, freeing its slot")
+            self.release(key)
+
+def parse_tool_limits(text):
+    """Parse "tool=cap,tool=cap" into a dict"""
+    limits = {}
+    for item in text.split(','):
+        if item.strip():
+            name, _, cap = item.partition('=')
+            limits[name.strip()] = int(cap)
+    return limits
+
+class Gateway:
+    """Route JSON-RPC traffic between the WebSocket and one or more MCP children.
+
+    With a single child every line is relayed verbatim. With several children,
+    requests every server must see (`initialize` and the `*/list` methods) are
+    fanned out and their results merged, `tools/call` is routed by tool name,
+    notifications are broadcast and anything else goes to the first child.
+    `tools/call` goes through admission control (see `Admission`) first.
+
+    The gateway outlives WebSocket connections. The first `initialize` is
+    forwarded to the children and its result cached; later connections are
+    answered from the cache, and a child restarted after a crash is
+    re-initialized with the original parameters.
+    """
+
+    def __init__(self, children):
+        self.children = children
+        self.passthrough = len(children) == 1
+        self.outbox = Outbox(OUTBOX_SIZE)
+        self.tool_owners = {}  # tool name -> McpChild
+        self.pending = {}  # gateway request id -> (process, Future) for a child response we wait for
+        self.server_requests = {}  # gateway request id -> (McpChild, original id) for child-initiated requests
+        self.tasks = set()
+        self.next_id = 0
+        self.initialize_params = None  # params of the endpoint's first `initialize`
+        self.initialize_result = None  # merged result sent back for it
+        self.initialized_sent = False  # children got `notifications/initialized`
+        self.connected_at = None  # set on connect until the first `tools/call` arrives
+        self.first_call = None  # (request id, connected_at) of that first `tools/call`
+        self.tracer = Tracer(registry) if METRICS else None
+        tool_limits = parse_tool_limits(TOOL_LIMITS)
+        self.draining = False  # SIGTERM received: new tool calls are refused
+        self.admission = None
+        if MAX_IN_FLIGHT or TOOL_CONCURRENCY or tool_limits:
+            self.admission = Admission(MAX_IN_FLIGHT, TOOL_CONCURRENCY, tool_limits, QUEUE_SIZE, QUEUE_TIMEOUT)
+
+    def new_id(self):
+        self.next_id += 1
+        return f"gw-{self.next_id}"
+
+    def attach(self):
+        """A WebSocket connection is up: replay what was buffered while it was down"""
+        if self.outbox.items:
+            logger.info(f"Replaying {len(self.outbox.items)} buffered message(s)")
+        self.outbox.set_connected(True)
+        self.connected_at = time.monotonic()
+        self.first_call = None
+
+    def detach(self):
+        self.outbox.set_connected(False)
+
+    async def send(self, message):
+        """Queue a JSON-RPC message (dict) for the WebSocket"""
+        trace = None
+        if 'method' not in message:
+            if self.admission:
+                self.admission.release(json.dumps(message.get('id')))
+            if self.tracer:
+                trace = self.tracer.answered(message.get('id'))
+        await self.outbox.put(json.dumps(message, ensure_ascii=False, separators=(',', ':')), trace)
+
+    async def send_error(self, msg_id, code, text):
+        await self.send({'jsonrpc': '2.0', 'id': msg_id, 'error': {'code': code, 'message': text}})
+
+    def spawn(self, coro):
+        """Run `coro` in the background without blocking the WebSocket reader"""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def forward(self, child, data):
+        """Write an endpoint line to `child`, answering requests with an error if it is down"""
+        if child.ready and await child.write(data):
+            return
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        if isinstance(message, dict) and 'method' in message and message.get('id') is not None:
+            await self.send_error(message['id'], -32000, f"MCP server {child.script} is restarting")
+
+    async def handle_endpoint_message(self, data):
+        """Handle one line received from the WebSocket"""
+        if (self.passthrough and self.connected_at is None and b'initialize' not in data and not self.admission
+                and not self.draining):
+            await self.forward(self.children[0], data)
+            return
+
+        try:
+            message = json.loads(data)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            # Let the first server answer malformed or batched input
+            await self.forward(self.children[0], data)
+            return
+
+        method = message.get('method')
+        msg_id = message.get('id')
+
+        if method is None:
+            # A response to a request one of the children made
+            target = self.server_requests.pop(msg_id, None)
+            if target:
+                child, original_id = target
+                await self.forward(child, dump_line({**message, 'id': original_id}))
+            elif self.passthrough:
+                await self.forward(self.children[0], data)
+            return
+
+        if method == 'tools/call' and self.connected_at is not None:
+            self.first_call = (msg_id, self.connected_at)
+            self.connected_at = None
+
+        if method == 'initialize':
+            await self.handle_initialize(message)
+        elif method == 'notifications/initialized':
+            # The children only need to hear this once
+            if not self.initialized_sent:
+                self.initialized_sent = True
+                for child in self.children:
+                    await self.forward(child, data)
+        elif msg_id is None:
+            if method == 'notifications/cancelled' and self.admission:
+                self.admission.cancel(json.dumps((message.get('params') or {}).get('requestId')))
+            # Notifications (cancelled, progress, ...) are relevant to every server
+            for child in self.children:
+                await self.forward(child, data)
+        elif method == 'tools/call' and self.draining:
+            await self.send_error(msg_id, -32000, "MCP server is shutting down")
+        elif method == 'tools/call' and self.admission:
+            await self.admit_call(message, data)
+        elif self.passthrough:
+            await self.forward(self.children[0], data)
+        elif method == 'ping':
+            await self.send({'jsonrpc': '2.0', 'id': msg_id, 'result': {}})
+        elif method in FANOUT_METHODS:
+            # Write in order (initialize must precede the initialized notification), merge in the background
+            self.spawn(self.fanout(message, await self.send_all(message)))
+        elif method == 'tools/call':
+            await self.route_call(message, data)
+        else:
+            await self.forward(self.children[0], data)
+
+    async def drain(self, timeout):
+        """Refuse new tool calls, then wait up to `timeout` seconds for those in flight to be answered and sent"""
+        self.draining = True
+        if self.admission:
+            logger.info(f"Draining {len(self.admission.in_flight) + len(self.admission.waiting)} tool call(s)"
+                        f" in flight, up to {timeout:g}s")
+        else:
+            logger.info("Admission control is off, calls in flight are not tracked; only flushing queued output")
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            busy = self.admission and (self.admission.in_flight or self.admission.waiting)
+            if not busy and not (self.outbox.connected and self.outbox.items):
+                logger.info("Drained")
+                return
+            await asyncio.sleep(0.05)
+        left = len(self.admission.in_flight) if self.admission else 0
+        logger.warning(f"Drain timed out after {timeout:g}s with {left} tool call(s) unanswered")
+
+    async def admit_call(self, message, data):
+        """Route a `tools/call` if the caps allow it, else queue it or shed it when the queue is full"""
+        tool = str((message.get('params') or {}).get('name'))
+        key = json.dumps(message['id'])
+        if self.admission.admit(key, tool):
+            await self.route_call(message, data)
+            return
+        admitted = self.admission.enqueue(key, tool)
+        if admitted is None:
+            await self.shed_call(message['id'], tool, "queue full")
+        else:
+            self.spawn(self.route_queued(message, data, key, tool, admitted))
+
+    async def route_queued(self, message, data, key, tool, admitted):
+        admitted = await admitted
+        if admitted is None:
+            # Cancelled while queued, the device expects no answer
+            if self.tracer:
+                self.tracer.requests.pop(key, None)
+            return
+        if not admitted:
+            await self.shed_call(message['id'], tool, f"no slot within {QUEUE_TIMEOUT:g}s")
+            return
+        await self.route_call(message, data)
+        if self.tracer:
+            self.tracer.written(key)
+
+    async def shed_call(self, msg_id, tool, reason):
+        """Answer a `tools/call` over the caps with an overloaded error"""
+        self.admission.shed[tool] += 1
+        count = self.admission.shed[tool]
+        if count == 1 or count % SHED_LOG_EVERY == 0:
+            logger.warning(f"Overloaded, shedding {tool} call ({reason}), {count} shed so far")
+        await self.send_error(msg_id, OVERLOADED_CODE, f"Overloaded: too many {tool} calls in progress, try again later")
+
+    async def route_call(self, message, data):
+        """Forward a `tools/call` to the child that owns the tool"""
+        if self.passthrough:
+            await self.forward_call(self.children[0], message, data)
+            return
+        owner = self.tool_owners.get((message.get('params') or {}).get('name'))
+        if owner:
+            await self.forward_call(owner, message, data)
+        else:
+            self.spawn(self.route_unknown_tool(message, data, await self.send_all(TOOLS_LIST_REQUEST)))
+
+    async def forward_call(self, child, message, data):
+        if self.admission:
+            self.admission.bind(json.dumps(message['id']), child.process)
+        await self.forward(child, data)
+
+    async def handle_initialize(self, message):
+        """Initialize the children once, answer later connections from the cache"""
+        if self.initialize_result is not None:
+            await self.send({'jsonrpc': '2.0', 'id': message['id'], 'result': self.initialize_result})
+            return
+        self.initialize_params = message.get('params')
+        self.spawn(self.fanout(message, await self.send_all(message)))
+
+    async def initialize_child(self, child):
+        """Repeat the endpoint's handshake with a (re)started child, if there was one"""
+        if self.initialize_params is None:
+            return
+        request = {'jsonrpc': '2.0', 'method': 'initialize', 'params': self.initialize_params}
+        response, = await self.collect(await self.send_all(request, [child]))
+        if not response or 'result' not in response:
+            logger.warning(f"Re-initializing {child.script} failed: {response}")
+        if self.initialized_sent:
+            await child.write(dump_line({'jsonrpc': '2.0', 'method': 'notifications/initialized'}))
+        logger.info(f"Re-initialized {child.script}")
+
+    def child_exited(self, process):
+        """Stop waiting for responses a crashed process will never send"""
+        for gateway_id, (owner, future) in list(self.pending.items()):
+            if owner is process:
+                del self.pending[gateway_id]
+                if not future.done():
+                    future.set_result(None)
+        if self.admission:
+            # Its calls will never be answered, let the device know instead of waiting for them
+            for key in self.admission.release_process(process):
+                self.spawn(self.send_error(json.loads(key), -32000, "MCP server exited before answering"))
+
+    async def handle_child_message(self, child, data):
+        """Handle one line read from a child's stdout"""
+        if (self.passthrough and not self.pending and self.first_call is None and not self.tracer
+                and not (self.admission and self.admission.in_flight)):
+            await self.outbox.put(data.decode('utf-8'))
+            return
+
+        try:
+            message = json.loads(data)
+        except ValueError:
+            message = None
+        if isinstance(message, dict) and 'id' in message:
+            if 'method' not in message:
+                waiter = self.pending.pop(message['id'], None)
+                if waiter is not None:
+                    if not waiter[1].done():
+                        waiter[1].set_result(message)
+                    return
+                if self.admission:
+                    self.admission.release(json.dumps(message['id']))
+                if self.first_call and message['id'] == self.first_call[0]:
+                    logger.info(f"Reconnect to first tool result: {time.monotonic() - self.first_call[1]:.3f}s")
+                    self.first_call = None
+                if self.tracer:
+                    await self.outbox.put(data.decode('utf-8'), self.tracer.answered(message['id']))
+                    return
+            elif not self.passthrough:
+                # Server-initiated request: make the id unique across children
+                gateway_id = self.new_id()
+                self.server_requests[gateway_id] = (child, message['id'])
+                await self.send({**message, 'id': gateway_id})
+                return
+        await self.outbox.put(data.decode('utf-8'))
+
+    async def send_request(self, child, message, process=None):
+        """Send `message` to `child` (or one of its processes) under a fresh id, return (id, future)"""
+        process = process or child.process
+        gateway_id = self.new_id()
+        future = asyncio.get_running_loop().create_future()
+        self.pending[gateway_id] = (process, future)
+        if not await child.write(dump_line({**message, 'id': gateway_id}), process):
+            self.pending.pop(gateway_id, None)
+            future.set_result(None)
+        return gateway_id, future
+
+    async def send_all(self, message, children=None):
+        """Send `message` to every child under a fresh id, return futures for their responses"""
+        return [await self.send_request(child, message) for child in children or self.children]
+
+    async def collect(self, futures):
+        """Wait for the responses of `send_all` (None for a child that timed out or died)"""
+        responses = []
+        for gateway_id, future in futures:
+            try:
+                responses.append(await asyncio.wait_for(future, timeout=FANOUT_TIMEOUT))
+            except asyncio.TimeoutError:
+                self.pending.pop(gateway_id, None)
+                responses.append(None)
+        return responses
+
+    async def fanout(self, message, futures):
+        """Answer a request sent to every child with the merged result"""
+        method = message['method']
+        responses = await self.collect(futures)
+        results = [(child, r['result']) for child, r in zip(self.children, responses) if r and 'result' in r]
+        if not results:
+            error = next((r['error'] for r in responses if r and 'error' in r), None)
+            await self.send({
+                'jsonrpc': '2.0', 'id': message['id'],
+                'error': error or {'code': -32603, 'message': f"No MCP server answered {method}"}
+            })
+            return
+
+        if method == 'initialize':
+            merged = merge_initialize([result for _, result in results])
+            self.initialize_result = merged
+        else:
+            key = LIST_KEYS[method]
+            items = []
+            for child, result in results:
+                for item in result.get(key, []):
+                    if method == 'tools/list':
+                        owner = self.tool_owners.setdefault(item['name'], child)
+                        if owner is not child:
+                            logger.warning(f"Tool {item['name']} from {child.script} shadowed by {owner.script}")
+                            continue
+                    items.append(item)
+            merged = {key: items}
+        await self.send({'jsonrpc': '2.0', 'id': message['id'], 'result': merged})
+
+    async def route_unknown_tool(self, message, data, futures):
+        """Refresh the tool map from a `tools/list` sent to every child before giving up on a `tools/call`"""
+        name = (message.get('params') or {}).get('name')
+        for child, response in zip(self.children, await self.collect(futures)):
+            for tool in ((response or {}).get('result') or {}).get('tools', []):
+                self.tool_owners.setdefault(tool['name'], child)
+        owner = self.tool_owners.get(name)
+        if owner:
+            await self.forward_call(owner, message, data)
+        else:
+            await self.send_error(message['id'], -32602, f"Unknown tool: {name}")
+
+def merge_initialize(results):
+    """Merge the `initialize` results of several servers into one"""
+    merged = dict(results[0])
+    capabilities = {}
+    for result in results:
+        for name, value in (result.get('capabilities') or {}).items():
+            if isinstance(value, dict):
+                capabilities.setdefault(name, {}).update(value)
+            else:
+                capabilities.setdefault(name, value)
+    merged['capabilities'] = capabilities
+    names = [(r.get('serverInfo') or {}).get('name') for r in results]
+    merged['serverInfo'] = {
+        **(results[0].get('serverInfo') or {}),
+        'name': ' + '.join(name for name in names if name)
+    }
+    instructions = [r['instructions'] for r in results if r.get('instructions')]
+    if instructions:
+        merged['instructions'] = '\n\n'.join(instructions)
+    return merged
+
+def dump_line(message):
+    """Serialize a JSON-RPC message (dict) to one line of bytes"""
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+async def pipe_websocket_to_process(websocket, gateway):
     """Read data from WebSocket and write to process stdin"""
     try:
         while True:
@@ -108,59 +1102,95 @@ async def pipe_websocket_to_process(websocket, process):
             message = await websocket.recv()
             logger.debug(f"<< {message[:120]}...")
             
-            # Write to process stdin (in text mode)
-            if isinstance(message, bytes):
-                message = message.decode('utf-8')
-            process.stdin.write(message + '\n')
-            process.stdin.flush()
+            if isinstance(message, str):
+                message = message.encode('utf-8')
+            trace = gateway.tracer.received(message) if gateway.tracer else None
+            await gateway.handle_endpoint_message(message)
+            if trace is not None:
+                gateway.tracer.written(trace)
     except Exception as e:
         logger.error(f"Error in WebSocket to process pipe: {e}")
         raise  # Re-throw exception to trigger reconnection
-    finally:
-        # Close process stdin
-        if not process.stdin.closed:
-            process.stdin.close()
 
-async def pipe_process_to_websocket(process, websocket):
-    """Read data from process stdout and send to WebSocket"""
+async def pipe_outbox_to_websocket(outbox, websocket, tracer=None):
+    """Send queued child output to the WebSocket, several small lines as one JSON-RPC batch if enabled"""
+    try:
+        while True:
+            batch = await outbox.get_batch(BATCH_MAX, BATCH_LINE_MAX, BATCH_DELAY)
+            texts = [text for text, _ in batch]
+            try:
+                await websocket.send(texts[0] if len(texts) == 1 else f"[{','.join(texts)}]")
+            except (Exception, asyncio.CancelledError):
+                for item in reversed(batch):
+                    outbox.unget(item)  # Keep it for the next connection
+                raise
+            if tracer:
+                for _, trace in batch:
+                    if trace is not None:
+                        tracer.sent(trace)
+    except Exception as e:
+        logger.error(f"Error in process to WebSocket pipe: {e}")
+        raise  # Re-throw exception to trigger reconnection
+
+async def pipe_process_to_websocket(child, process, gateway):
+    """Read data from process stdout and queue it for the WebSocket"""
     try:
         while True:
-            # Read data from process stdout
-            data = await asyncio.get_event_loop().run_in_executor(
-                None, process.stdout.readline
-            )
+            # Read one line from process stdout
+            data = await process.stdout.readline()
             
             if not data:  # If no data, the process may have ended
-                logger.info("Process has ended output")
+                logger.info(f"{child.script} process has ended output")
                 break
+            
+            data = data.rstrip(b'\r\n')
+            if not data:
+                continue
                 
-            # Send data to WebSocket
+            # Relay (or route) the line to the WebSocket
             logger.debug(f">> {data[:120]}...")
-            # In text mode, data is already a string, no need to decode
-            await websocket.send(data)
+            await gateway.handle_child_message(child, data)
     except Exception as e:
-        logger.error(f"Error in process to WebSocket pipe: {e}")
-        raise  # Re-throw exception to trigger reconnection
+        logger.error(f"Error reading {child.script} output: {e}")
+        raise
 
-async def pipe_process_stderr_to_terminal(process):
-    """Read data from process stderr and print to terminal"""
+async def pipe_process_stderr_to_terminal(child, process, startup):
+    """Read data from process stderr and print to terminal, collecting `-X importtime` lines"""
     try:
         while True:
             # Read data from process stderr
-            data = await asyncio.get_event_loop().run_in_executor(
-                None, process.stderr.readline
-            )
+            data = await process.stderr.readline()
             
             if not data:  # If no data, the process may have ended
-                logger.info("Process has ended stderr output")
+                logger.info(f"{child.script} process has ended stderr output")
                 break
+
+            if data.startswith(METRIC_PREFIX):
+                entry = metrics.parse(data)
+                if entry:
+                    kind, name, value, labels = entry
+                    if kind == "gauge":
+                        registry.set_gauge(name, value, child=os.path.basename(child.script), **labels)
+                    else:
+                        registry.observe(name, value, child=os.path.basename(child.script), **labels)
+                continue
+
+            if data.startswith(IMPORT_TIME_PREFIX.encode()):
+                entry = parse_import_time(data)
+                if entry and startup['done']:
+                    # Deferred imports show up on the first tool call that needs them
+                    if entry[0] >= IMPORT_REPORT_MIN_US:
+                        logger.info(f"{child.script} lazily imported {entry[1]} in {entry[0] / 1000:.0f}ms")
+                elif entry:
+                    startup['import_times'].append(entry)
+                continue
                 
-            # Print stderr data to terminal (in text mode, data is already a string)
-            sys.stderr.write(data)
+            # Print stderr data to terminal (raw bytes, the child picks the encoding)
+            sys.stderr.buffer.write(data)
             sys.stderr.flush()
     except Exception as e:
         logger.error(f"Error in process stderr pipe: {e}")
-        raise  # Re-throw exception to trigger reconnection
+        raise
 
 def signal_handler(sig, frame):
     """Handle interrupt signals"""
@@ -171,12 +1201,12 @@ if __name__ == "__main__":
     # Register signal handler
     signal.signal(signal.SIGINT, signal_handler)
     
-    # mcp_script
+    # mcp_scripts
     if len(sys.argv) < 2:
-        logger.error("Usage: mcp_pipe.py <mcp_script>")
+        logger.error("Usage: mcp_pipe.py <mcp_script> [<mcp_script> ...]")
         sys.exit(1)
     
-    mcp_script = sys.argv[1]
+    mcp_scripts = sys.argv[1:]
     
     # Get token from environment variable or command line arguments
     endpoint_url = os.environ.get('MCP_ENDPOINT')
@@ -186,7 +1216,7 @@ if __name__ == "__main__":
     
     # Start main loop
     try:
-        asyncio.run(connect_with_retry(endpoint_url))
+        asyncio.run(run_pipe(endpoint_url))
     except KeyboardInterrupt:
         logger.info("Program interrupted by user")
     except Exception as e:
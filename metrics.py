@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Latency histograms shared by mcp_pipe.py and the MCP tool modules
+
+`Histogram` keeps log-linear buckets like HdrHistogram: 32 sub-buckets
+per power of two of microseconds, so any quantile is within about 3% of
+the true value at a fixed, small memory cost. `Registry` holds one per
+metric name and label set and renders them in the Prometheus text format
+(as summaries with quantiles), along with gauges that `collectors` refresh
+just before each rendering.
+
+Tool modules run as children of mcp_pipe.py and report through stderr:
+`emit()` (a timing) and `emit_gauge()` write one `MCP_METRIC {json}` line,
+which the pipe records in its own registry instead of printing. They do
+nothing unless the pipe started the child with MCP_METRICS=1.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('metrics')
+
+ENABLED = os.getenv("MCP_METRICS") == "1"  # Set by mcp_pipe.py for its children when it collects metrics
+PREFIX = "MCP_METRIC "
+SUB_BUCKET_BITS = 5  # 2**5 sub-buckets per power of two
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = {}  # bucket key -> count, see bucket()
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def bucket(us):
+        """Sortable key of the bucket holding `us` microseconds"""
+        shift = max(0, us.bit_length() - SUB_BUCKET_BITS - 1)
+        return (shift << (SUB_BUCKET_BITS + 1)) | (us >> shift)
+
+    @staticmethod
+    def value(key):
+        """Midpoint of bucket `key`, in seconds"""
+        shift, mantissa = key >> (SUB_BUCKET_BITS + 1), key & ((1 << (SUB_BUCKET_BITS + 1)) - 1)
+        return ((mantissa << shift) + ((1 << shift) - 1) / 2) / 1e6
+
+    def record(self, seconds):
+        key = self.bucket(max(0, int(seconds * 1e6)))
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                return min(self.value(key), self.max)
+        return self.max
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}  # (name, sorted label items) -> Histogram
+        self.gauges = {}  # (name, sorted label items) -> value
+        self.collectors = []  # Functions called with the registry before rendering, to set gauges
+
+    def set_gauge(self, name, value, **labels):
+        self.gauges[(name, tuple(sorted((k, str(v)) for k, v in labels.items())))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.record(seconds)
+
+    def summary(self):
+        """One dict per histogram: name, labels, count and quantiles in milliseconds"""
+        rows = []
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            rows.append({
+                "name": name, **dict(labels), "count": histogram.count,
+                **{f"p{q * 100:g}_ms": round(histogram.quantile(q) * 1000, 2) for q in QUANTILES},
+                "max_ms": round(histogram.max * 1000, 2),
+            })
+        return rows
+
+    def prometheus(self):
+        """The histograms and gauges in the Prometheus text exposition format"""
+        for collect in self.collectors:
+            collect(self)
+        lines = []
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f"# TYPE {name} summary")
+            for (metric, labels), histogram in sorted(self.histograms.items()):
+                if metric != name:
+                    continue
+                for q in QUANTILES:
+                    lines.append(f"{name}{format_labels(labels + (('quantile', f'{q:g}'),))} {histogram.quantile(q):.6f}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+            lines.append(f"# TYPE {name}_max gauge")
+            for (metric, labels), histogram in sorted(self.histograms.items()):
+                if metric == name:
+                    lines.append(f"{name}_max{format_labels(labels)} {histogram.max:.6f}")
+        for name in sorted({name for name, _ in self.gauges}):
+            lines.append(f"# TYPE {name} gauge")
+            for (metric, labels), value in sorted(self.gauges.items()):
+                if metric == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def emit(name, seconds, **labels):
+    """Report one timing to the parent mcp_pipe.py (no-op outside the pipe)"""
+    if not ENABLED:
+        return
+    sys.stderr.write(PREFIX + json.dumps({"name": name, "seconds": seconds, "labels": labels},
+                                         ensure_ascii=False, separators=(",", ":")) + "\n")
+    sys.stderr.flush()
+
+
+def emit_gauge(name, value, **labels):
+    """Report the current value of a gauge to the parent mcp_pipe.py (no-op outside the pipe)"""
+    if not ENABLED:
+        return
+    sys.stderr.write(PREFIX + json.dumps({"name": name, "value": value, "labels": labels, "type": "gauge"},
+                                         ensure_ascii=False, separators=(",", ":")) + "\n")
+    sys.stderr.flush()
+
+
+@contextmanager
+def timed(name, **labels):
+    """emit() the duration of the block, with status="ok", or "error" if it raised"""
+    start = time.monotonic()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        emit(name, time.monotonic() - start, status=status, **labels)
+
+
+def parse(line):
+    """(kind, name, value, labels) of an emitted line (bytes), kind "timing" or "gauge", or None"""
+    try:
+        entry = json.loads(line[len(PREFIX):])
+        if entry.get("type") == "gauge":
+            return "gauge", entry["name"], float(entry["value"]), entry.get("labels") or {}
+        return "timing", entry["name"], float(entry["seconds"]), entry.get("labels") or {}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+async def serve(registry, port, host="127.0.0.1"):
+    """Serve registry.prometheus() over HTTP on `host`:`port` (any path)"""
+    async def handle(reader, writer):
+        try:
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # Skip the request line and headers
+            body = registry.prometheus().encode("utf-8")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    async with server:
+        await server.serve_forever()
+
+
+async def dump_every(registry, interval):
+    """Log a line per histogram every `interval` seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        for row in registry.summary():
+            logger.info(json.dumps(row, ensure_ascii=False))
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""Near-duplicate lookup for short texts with MinHash + LSH
+
+Texts are split into character n-grams (which works for Chinese without a
+tokenizer), signed with `num_perm` MinHash values and bucketed in `bands`
+LSH bands. A lookup only compares against texts sharing a bucket, and a
+candidate matches when its n-gram Jaccard similarity reaches `threshold`
+and it contains the same numbers: "第1条" and "第11条" differ by one
+character but ask different things.
+"""
+
+import random
+import re
+import zlib
+from collections import OrderedDict
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text, n=2):
+    """Character n-grams of `text` with whitespace removed"""
+    text = "".join(text.split()).casefold()
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def numbers(text):
+    return sorted(re.findall(r'\d+(?:\.\d+)?', text))
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHashIndex:
+    def __init__(self, maxsize=1024, threshold=0.8, num_perm=64, bands=16, ngram=2, seed=1):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ngram = ngram
+        rng = random.Random(seed)
+        self.perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self.entries = OrderedDict()  # key -> (shingles, band keys, numbers), oldest first
+        self.buckets = {}  # band key -> set of keys
+
+    def signature(self, grams):
+        hashes = [zlib.crc32(gram.encode('utf-8')) for gram in grams]
+        return [min(((a * h + b) % _PRIME) & _MAX_HASH for h in hashes) for a, b in self.perms]
+
+    def band_keys(self, grams):
+        signature = self.signature(grams)
+        return [(band, tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+
+    def add(self, key, text):
+        """Index `text` under `key`, evicting the oldest texts beyond maxsize"""
+        self.remove(key)
+        grams = shingles(text, self.ngram)
+        bands = self.band_keys(grams)
+        self.entries[key] = (grams, bands, numbers(text))
+        for band in bands:
+            self.buckets.setdefault(band, set()).add(key)
+        while len(self.entries) > self.maxsize:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for band in entry[1]:
+            bucket = self.buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band]
+
+    def query(self, text):
+        """Return (key, similarity) of the most similar indexed text at or above threshold, or None"""
+        matches = self.matches(text)
+        return matches[0] if matches else None
+
+    def matches(self, text):
+        """[(key, similarity)] of the indexed texts at or above threshold, most similar first"""
+        grams = shingles(text, self.ngram)
+        text_numbers = numbers(text)
+        candidates = set()
+        for band in self.band_keys(grams):
+            candidates |= self.buckets.get(band, set())
+        matches = []
+        for key in candidates:
+            if self.entries[key][2] != text_numbers:
+                continue
+            similarity = jaccard(grams, self.entries[key][0])
+            if similarity >= self.threshold:
+                matches.append((key, similarity))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+    def clear(self):
+        self.entries.clear()
+        self.buckets.clear()
@@ -2,24 +2,282 @@ from mcp.server.fastmcp import FastMCP
 
 # 创建 MCP 实例
 mcp = FastMCP("MusicPlayer")
-import requests
-from playsound import playsound
-import tempfile
+import http_client
+import aiohttp
+import asyncio
+import contextlib
+import hashlib
 import os
 import logging
-import threading
+import shutil
+import struct
+import time
+from urllib.parse import parse_qs, quote, urlsplit
+import websockets
+from cache import MISSING, TTLCache
+from singleflight import SingleFlight
 
 # 初始化MCP和日志
 logger = logging.getLogger(__name__)
-_LOCK = threading.Lock()  # 保留原线程锁
+_TIMEOUT = 10  # 每次请求的超时时间（秒），下载歌曲时为两次收到数据之间的最长间隔
 
-_API_URL = 'https://api.yaohud.cn/api/music/wy'  # 进网站去注册拿到API_KEY
+_API_URL = os.getenv('MUSIC_API_URL', 'https://api.yaohud.cn/api/music/wy')  # 进网站去注册拿到API_KEY
 _API_KEY = os.getenv('MUSIC_API_KEY', 'emSQtAcJlyzR9nhrFVY')  # 从环境变量获取API密钥，有默认值备用
 
+# 本地音频流服务：歌曲边下载边转码为16kHz单声道Opus（60ms一帧），通过WebSocket逐帧推送
+STREAM_HOST = os.getenv('MUSIC_STREAM_HOST', 'localhost')
+STREAM_PORT = int(os.getenv('MUSIC_STREAM_PORT', 8765))
+SAMPLE_RATE = 16000
+CHANNELS = 1
+FRAME_DURATION = 60  # 毫秒
+PREBUFFER_FRAMES = 10  # 开头不限速直接发送的帧数，之后按播放速度推送
+FFMPEG = os.getenv('FFMPEG_PATH', 'ffmpeg')
+FFMPEG_ARGS = [
+    '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', '-vn',
+    '-ac', str(CHANNELS), '-ar', str(SAMPLE_RATE),
+    '-c:a', 'libopus', '-b:a', '32k', '-application', 'audio', '-frame_duration', str(FRAME_DURATION),
+    '-page_duration', str(FRAME_DURATION * 1000), '-flush_packets', '1',  # 每帧一个Ogg页，转出来立刻能发
+    '-f', 'ogg', 'pipe:1',
+]
+DOWNLOAD_CHUNK = 64 * 1024
+
+# 磁盘歌曲缓存：保存转码好的Opus帧，总大小超出上限时淘汰最久没播放的歌曲
+CACHE_DIR = os.getenv('MUSIC_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'music_cache'))
+CACHE_MAX_BYTES = int(os.getenv('MUSIC_CACHE_MAX_MB', 200)) * 1024 * 1024
+URL_TTL = 600  # 歌曲下载地址的缓存时间（秒），第三方返回的地址会过期
+
+url_cache = TTLCache('music', maxsize=256)
+url_calls = SingleFlight('music')  # 同一首歌的并发请求只查询一次下载地址
+_server = None
+_server_starting = None
+
+
+class FFmpegNotFound(Exception):
+    """ffmpeg不在FFMPEG_PATH或PATH中"""
+
+
+class TranscodeError(Exception):
+    """ffmpeg转码中途失败（退出码非0），已转出的部分不完整"""
+
+
+def song_key(song_name):
+    return " ".join(song_name.split()).casefold()
+
+
+def cache_path(key):
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.opus')
+
+
+async def resolve_music_url(song_name):
+    """调用第三方API获取歌曲的下载地址"""
+    key = song_key(song_name)
+    url = url_cache.get(key)
+    if url is MISSING:
+        url = await url_calls.do(key, fetch_music_url, song_name.strip())
+        url_cache.set(key, url, URL_TTL)
+    return url
+
+
+async def fetch_music_url(song_name):
+    logger.info(f"搜索歌曲: {song_name}")
+    params = {'key': _API_KEY, 'msg': song_name, 'n': '1'}
+    async with http_client.get_session().post(_API_URL, params=params, timeout=http_client.make_timeout(_TIMEOUT)) as resp:
+        resp.raise_for_status()
+        return (await resp.json(content_type=None))['data']['musicurl']
+
+
+async def ensure_stream_server():
+    """在当前事件循环中启动本地流服务（只启动一次）"""
+    global _server, _server_starting
+    if _server is not None:
+        return
+    if _server_starting is None:
+        _server_starting = asyncio.ensure_future(websockets.serve(handle_stream, STREAM_HOST, STREAM_PORT))
+    try:
+        _server = await asyncio.shield(_server_starting)
+        logger.info(f"音频流服务已启动: ws://{STREAM_HOST}:{STREAM_PORT}")
+    except OSError as e:
+        _server_starting = None
+        logger.warning(f"音频流服务启动失败（端口可能已被占用）: {e}")
+
+
+async def handle_stream(websocket):
+    """一个播放连接：ws://host:port?song=歌曲名，按60ms一帧推送Opus数据包"""
+    request = getattr(websocket, 'request', None)  # websockets>=13 的新接口
+    request_path = request.path if request is not None else websocket.path
+    song_name = (parse_qs(urlsplit(request_path).query).get('song') or [''])[0]
+    if not song_name.strip():
+        await websocket.close(1008, 'missing song')
+        return
+
+    key = song_key(song_name)
+    path = cache_path(key)
+    try:
+        cached = load_cached(path)
+        if cached is not None:
+            logger.info(f"从缓存播放: {song_name}")
+            frames = await send_paced(websocket, read_cached_packets(cached))
+        else:
+            music_url = await resolve_music_url(song_name)
+            frames = await stream_and_cache(websocket, music_url, path)
+        logger.info(f"播放完成: {song_name}, {frames} 帧")
+        await websocket.close()
+    except websockets.ConnectionClosed:
+        logger.info(f"播放连接已断开: {song_name}")
+    except FFmpegNotFound:
+        logger.error(f"未找到ffmpeg（{FFMPEG}），无法转码")
+        await websocket.close(1011, 'ffmpeg not found')
+    except Exception as e:
+        logger.error(f"播放失败: {str(e)}")
+        await websocket.close(1011, 'stream failed')
+
+
+async def send_paced(websocket, packets):
+    """先直接发送PREBUFFER_FRAMES帧，之后按播放速度逐帧发送，返回发送的帧数"""
+    start = time.monotonic()
+    count = 0
+    async with contextlib.aclosing(packets):  # 连接断开时立刻停止下载和转码
+        async for packet in packets:
+            delay = start + max(0, count - PREBUFFER_FRAMES) * FRAME_DURATION / 1000 - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await websocket.send(packet)
+            count += 1
+    return count
+
+
+async def stream_and_cache(websocket, music_url, path):
+    """边下载边转码边推送，完整播放后把转码结果写入磁盘缓存"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{id(websocket)}.tmp"
+
+    async def packets():
+        async with contextlib.aclosing(transcode(music_url)) as source:
+            with open(temp_path, 'wb') as f:
+                async for packet in source:
+                    f.write(struct.pack('>H', len(packet)) + packet)
+                    yield packet
+
+    try:
+        frames = await send_paced(websocket, packets())
+        if frames:
+            os.replace(temp_path, path)
+            enforce_cache_limit()
+        return frames
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+async def transcode(music_url):
+    """下载歌曲并用ffmpeg转码，逐个产出Opus数据包"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            FFMPEG, *FFMPEG_ARGS,
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+    except FileNotFoundError as e:
+        raise FFmpegNotFound(FFMPEG) from e
+    feeder = asyncio.ensure_future(download_to(process.stdin, music_url))
+    try:
+        async for packet in read_ogg_packets(process.stdout):
+            yield packet
+        await feeder  # 下载出错时抛出异常，不当作播放完成
+        returncode = await process.wait()
+        if returncode != 0:
+            # 已转出的帧只是歌曲的一部分，不能当作完整歌曲缓存
+            raise TranscodeError(f"ffmpeg exited with status {returncode}")
+    finally:
+        feeder.cancel()
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+
+
+async def download_to(stdin, music_url):
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=http_client.CONNECT_TIMEOUT, sock_read=_TIMEOUT)
+    try:
+        async with http_client.get_session().get(music_url, timeout=timeout) as song:
+            song.raise_for_status()
+            async for chunk in song.content.iter_chunked(DOWNLOAD_CHUNK):
+                stdin.write(chunk)
+                await stdin.drain()
+    finally:
+        stdin.close()
+
+
+async def read_ogg_packets(reader):
+    """从Ogg流中拆出Opus数据包，跳过开头的OpusHead和OpusTags"""
+    partial = b''
+    index = 0
+    while True:
+        try:
+            header = await reader.readexactly(27)
+        except asyncio.IncompleteReadError:
+            return
+        if header[:4] != b'OggS':
+            raise ValueError('invalid Ogg page')
+        lacing = await reader.readexactly(header[26])
+        data = await reader.readexactly(sum(lacing))
+        offset = 0
+        for size in lacing:
+            partial += data[offset:offset + size]
+            offset += size
+            if size < 255:  # 小于255的段结束一个数据包，否则数据包延续到下一段
+                if index >= 2:
+                    yield partial
+                index += 1
+                partial = b''
+
+
+def load_cached(path):
+    """读取缓存的转码结果，不在缓存中（包括刚被淘汰）时返回None，当作未缓存重新下载"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)  # 修改时间作为LRU的最近使用时间
+    except FileNotFoundError:
+        pass  # 读完后刚被淘汰，这次照样播放
+    return data
+
+
+async def read_cached_packets(data):
+    offset = 0
+    while offset < len(data):
+        size, = struct.unpack_from('>H', data, offset)
+        yield data[offset + 2:offset + 2 + size]
+        offset += 2 + size
+
+
+def enforce_cache_limit():
+    """缓存目录超出上限时，按最近使用时间从旧到新删除歌曲"""
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.opus'):
+            try:
+                stat = os.stat(os.path.join(CACHE_DIR, name))
+            except FileNotFoundError:
+                continue  # 另一个连接刚淘汰了它
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+        logger.info(f"歌曲缓存超出上限，删除 {name}")
+
+
 @mcp.tool()
-def play_music(song_name: str) -> str:
+async def play_music(song_name: str) -> str:
     """
-    通过MCP接口播放音乐（线程安全）
+    通过MCP接口播放音乐（多个请求可并发处理）
     Args:
         song_name: 歌曲名，默认为"好运来"
     Returns:
@@ -28,38 +286,33 @@ def play_music(song_name: str) -> str:
     if not song_name.strip():
         return "错误：歌曲名不能为空"
 
-    with _LOCK:
-        try:
-            # 1. 调用API获取音乐URL
-            logger.info(f"搜索歌曲: {song_name}")
-            params = {'key': _API_KEY, 'msg': song_name.strip(), 'n': '1'}
-            resp = requests.post(_API_URL, params=params, timeout=10)
-            resp.raise_for_status()
-            music_url = resp.json()['data']['musicurl']
-
-            # 2. 下载并保存临时文件
-            with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as f:
-                f.write(requests.get(music_url, timeout=10).content)
-                temp_path = f.name
-
-            # 3. 构造JSON响应，适配前端播放控制
-            # 返回指向本地流服务的播放指令
-            return {
-                "type": "audio",
-                "format": "opus",
-                "source": f"ws://localhost:8765?song={song_name}",
-                "protocol_version": 3,
-                "audio_params": {
-                    "sample_rate": 16000,
-                    "channels": 1,
-                    "frame_duration": 60
-                },
-                "transport": "websocket"
-            }
-
-        except Exception as e:
-            logger.error(f"播放失败: {str(e)}")
-            return f"播放失败: {str(e)}"
+    try:
+        if shutil.which(FFMPEG) is None:
+            return "播放失败: 未安装ffmpeg，无法转码音频"
+        await ensure_stream_server()
+
+        # 1. 没有缓存时先查询歌曲地址，找不到歌曲时直接返回错误
+        if not os.path.exists(cache_path(song_key(song_name))):
+            await resolve_music_url(song_name)
+
+        # 2. 构造JSON响应，适配前端播放控制
+        # 返回指向本地流服务的播放指令，连接后边下载边转码推送
+        return {
+            "type": "audio",
+            "format": "opus",
+            "source": f"ws://{STREAM_HOST}:{STREAM_PORT}?song={quote(song_name.strip())}",
+            "protocol_version": 3,
+            "audio_params": {
+                "sample_rate": SAMPLE_RATE,
+                "channels": CHANNELS,
+                "frame_duration": FRAME_DURATION
+            },
+            "transport": "websocket"
+        }
+
+    except Exception as e:
+        logger.error(f"播放失败: {str(e)}")
+        return f"播放失败: {str(e)}"
 
 if __name__ == "__main__":
     mcp.run(transport="stdio")  # MCP标准输入输出模式
@@ -0,0 +1,614 @@
+# -*- coding: utf-8 -*-
+"""Local POI/address index for answering Amap geocode and input_tips offline
+
+Places are learned from Amap answers (and can be imported from a CSV or
+JSONL file, e.g. home, office and other frequent places). They are found
+by name prefix (input tips), by the exact address that was geocoded, and
+by geohash cell, which ranks tips near the caller's `location` first.
+
+With a `path` the index lives in a snapshot file that is memory-mapped on
+start instead of loaded, so startup cost does not grow with its size:
+records and three sorted key tables (names, addresses, and "geohash|name"
+for nearby places by name) that are binary searched in place. Places learned since the snapshot are kept
+in memory (a prefix trie plus dicts) and appended to `path`.journal by a
+background thread; when the journal reaches `journal_limit` places the
+snapshot is rewritten. Without a `path` the learned places are only kept
+in memory, at most `max_learned` of them (least recently used evicted).
+
+Import a dataset with:
+
+python poi_index.py import places.csv --index pois.idx
+
+CSV columns: name, address, location ("lng,lat"), and optionally aliases
+("家|home"), city, district, adcode.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('poi_index')
+
+MAGIC = b"POI1"
+HEADER = struct.Struct("<4sIIII")  # magic, records, names table, addresses table, cells table
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+GEOHASH_PRECISION = 6  # Cells of about 1.2 x 0.6 km
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS = 6371000.0  # Meters
+
+
+def normalize(text):
+    return "".join((text or "").split()).casefold()
+
+
+def parse_location(location):
+    """Amap "lng,lat" -> (lng, lat), or None"""
+    try:
+        lng, lat = location.split(",")
+        return float(lng), float(lat)
+    except (AttributeError, ValueError):
+        return None
+
+
+def distance(a, b):
+    """Haversine distance in meters between two (lng, lat)"""
+    lng1, lat1, lng2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(h))
+
+
+def geohash(lng, lat, precision=GEOHASH_PRECISION):
+    lng_range, lat_range = [-180.0, 180.0], [-90.0, 90.0]
+    cell, bits, bit, even = [], 0, 0, True
+    while len(cell) < precision:
+        value, span = (lng, lng_range) if even else (lat, lat_range)
+        middle = (span[0] + span[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bit += 1
+        if bit == 5:
+            cell.append(BASE32[bits])
+            bits, bit = 0, 0
+    return "".join(cell)
+
+
+def neighborhood(lng, lat, precision=GEOHASH_PRECISION):
+    """The geohash cell of (lng, lat) and its eight neighbors"""
+    # Cell size in degrees at this precision
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    dlng, dlat = 360.0 / (1 << lng_bits), 180.0 / (1 << lat_bits)
+    return {geohash(lng + i * dlng, max(-90.0, min(90.0, lat + j * dlat)), precision)
+            for i in (-1, 0, 1) for j in (-1, 0, 1)}
+
+
+def record_id(record):
+    return record.get("id") or f"{record.get('name', '')}@{record.get('location', '')}"
+
+
+def in_city(record, city):
+    """Whether `record` lies in `city`, given as a name ("北京", "朝阳区") or an adcode"""
+    city = normalize(city)
+    if city.isdigit():
+        adcode = record.get("adcode", "")
+        return adcode.startswith(city.rstrip("0")) if len(city) == 6 else False
+    return city in normalize(f"{record.get('province', '')}{record.get('city', '')}{record.get('district', '')}")
+
+
+def address_key(address, city=""):
+    return f"{normalize(address)}|{normalize(city)}"
+
+
+class Snapshot:
+    """Read-only view of a snapshot file, searched in place through mmap"""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, *tables = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a POI index")
+        self.tables = dict(zip(("names", "addresses", "cells"), tables))
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def record(self, offset):
+        (length,) = U32.unpack_from(self.map, offset)
+        return json.loads(self.map[offset + 4:offset + 4 + length])
+
+    def records(self):
+        offset = HEADER.size
+        for _ in range(self.count):
+            (length,) = U32.unpack_from(self.map, offset)
+            yield json.loads(self.map[offset + 4:offset + 4 + length])
+            offset += 4 + length
+
+    def entry(self, table, i):
+        """(key bytes, record offset) of entry `i` of `table`"""
+        (offset,) = U32.unpack_from(self.map, table + 4 + 4 * i)
+        (length,) = U16.unpack_from(self.map, offset)
+        key = self.map[offset + 2:offset + 2 + length]
+        (record,) = U32.unpack_from(self.map, offset + 2 + length)
+        return key, record
+
+    def lower_bound(self, table, key):
+        """Index of the first entry of `table` whose key is not below `key`, and the entry count"""
+        (count,) = U32.unpack_from(self.map, table)
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(table, middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low, count
+
+    def find(self, name, key):
+        """Record offset of exactly `key` in table `name`, or None"""
+        table = self.tables[name]
+        key = key.encode("utf-8")
+        i, count = self.lower_bound(table, key)
+        if i < count:
+            found, record = self.entry(table, i)
+            if found == key:
+                return record
+        return None
+
+    def prefix(self, name, prefix, limit):
+        """Record offsets of up to `limit` keys of table `name` starting with `prefix`"""
+        table = self.tables[name]
+        prefix = prefix.encode("utf-8")
+        low, count = self.lower_bound(table, prefix)
+        found = []
+        while low < count and len(found) < limit:
+            key, record = self.entry(table, low)
+            if not key.startswith(prefix):
+                break
+            found.append(record)
+            low += 1
+        return found
+
+
+def write_snapshot(path, records):
+    """Write `records` ({id: (record, [address keys])}) as a snapshot file at `path`"""
+    body = bytearray()
+    tables = {"names": [], "addresses": [], "cells": []}
+    for record, addresses in records.values():
+        offset = HEADER.size + len(body)
+        data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        body += U32.pack(len(data)) + data
+        location = parse_location(record.get("location"))
+        for name in [record.get("name", "")] + record.get("aliases", []):
+            if normalize(name):
+                tables["names"].append((normalize(name), offset))
+                if location:
+                    tables["cells"].append((f"{geohash(*location)}|{normalize(name)}", offset))
+        for key in addresses:
+            tables["addresses"].append((key, offset))
+
+    offsets = []
+    for name in ("names", "addresses", "cells"):
+        entries = sorted((key.encode("utf-8"), offset) for key, offset in tables[name])
+        offsets.append(HEADER.size + len(body))
+        body += U32.pack(len(entries))
+        index_at = len(body)
+        body += bytes(4 * len(entries))
+        for i, (key, offset) in enumerate(entries):
+            U32.pack_into(body, index_at + 4 * i, HEADER.size + len(body))
+            body += U16.pack(len(key)) + key + U32.pack(offset)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(records), *offsets))
+        f.write(body)
+
+
+def merge_records(snapshot, records):
+    """The records of `snapshot` updated with `records` ({id: (record, [address keys])}), for write_snapshot"""
+    merged = {}
+    if snapshot is not None:
+        addresses = {}
+        table = snapshot.tables["addresses"]
+        (count,) = U32.unpack_from(snapshot.map, table)
+        for i in range(count):
+            key, offset = snapshot.entry(table, i)
+            addresses.setdefault(offset, []).append(key.decode("utf-8"))
+        offset = HEADER.size
+        for record in snapshot.records():
+            merged[record_id(record)] = (record, addresses.get(offset, []))
+            (length,) = U32.unpack_from(snapshot.map, offset)
+            offset += 4 + length
+    for uid, (record, keys) in records.items():
+        if uid in merged:
+            keys = list(dict.fromkeys(merged[uid][1] + keys))
+        merged[uid] = (record, keys)
+    return merged
+
+
+def append_file(source, target):
+    with open(source, "rb") as src, open(target, "ab") as dst:
+        dst.write(src.read())
+
+
+class POIIndex:
+    def __init__(self, path=None, journal_limit=1000, geocode_ttl=None, max_learned=10000):
+        self.path = path
+        self.journal_limit = journal_limit
+        self.geocode_ttl = geocode_ttl  # Seconds a learned place answers geocode, None for ever; imported places never expire
+        self.max_learned = max_learned  # Places kept without a path, 0 for no limit; with one they move to the snapshot
+        self.snapshot = None
+        self.lock = threading.Lock()
+        self.journal_lock = threading.Lock()  # Held while writing the journal file, taken before `lock`
+        self.pending = []  # Journal lines not written yet
+        self.writing = False  # A thread is writing `pending` to the journal
+        self.journaled = 0  # Places in the journal, compacted into the snapshot at journal_limit
+        self.compacting = False
+        self.evicted = 0
+        self.reset_overlay()
+        if path:
+            if os.path.exists(path):
+                try:
+                    self.snapshot = Snapshot(path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"POI index {path} unusable, starting empty: {e}")
+            self.replay()
+
+    def reset_overlay(self):
+        self.records = OrderedDict()  # id -> (record, [address keys]) learned since the snapshot, oldest use first
+        self.trie = {}  # Name prefix trie: char -> node, "" -> set of ids
+        self.addresses = {}  # address key -> id
+        self.cells = {}  # geohash -> set of ids
+
+    def replay(self):
+        # The journal being compacted when the process stopped holds the older places
+        for journal in (f"{self.path}.journal.compacting", f"{self.path}.journal"):
+            if not os.path.exists(journal):
+                continue
+            with open(journal, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line after a crash
+                    self.insert(entry["record"], entry.get("addresses", []))
+                    self.journaled += 1
+        logger.info(f"POI index: {self.stats()}")
+
+    def insert(self, record, addresses):
+        uid = record_id(record)
+        if uid in self.records:
+            addresses = list(dict.fromkeys(self.records[uid][1] + addresses))
+            self.remove(uid)  # Its old name or location may differ
+        self.records[uid] = (record, addresses)
+        for name in [record.get("name", "")] + record.get("aliases", []):
+            node = self.trie
+            for char in normalize(name):
+                node = node.setdefault(char, {})
+            node.setdefault("", set()).add(uid)
+        for key in addresses:
+            self.addresses[key] = uid
+        location = parse_location(record.get("location"))
+        if location:
+            self.cells.setdefault(geohash(*location), set()).add(uid)
+
+    def remove(self, uid):
+        """Drop a learned place from the overlay, the lock must be held"""
+        record, addresses = self.records.pop(uid)
+        for name in [record.get("name", "")] + record.get("aliases", []):
+            node = self.trie
+            for char in normalize(name):
+                node = node.get(char)
+                if node is None:
+                    break
+            else:
+                node.get("", set()).discard(uid)
+        for key in addresses:
+            if self.addresses.get(key) == uid:
+                del self.addresses[key]
+        location = parse_location(record.get("location"))
+        if location:
+            cell = self.cells.get(geohash(*location))
+            if cell is not None:
+                cell.discard(uid)
+                if not cell:
+                    del self.cells[geohash(*location)]
+
+    def add(self, record, address=None, city=""):
+        """Learn a place; `address` is the query it answers for geocode"""
+        if not record.get("name") or not parse_location(record.get("location")):
+            return
+        addresses = [address_key(address, city)] if address else []
+        record = {**record, "learned_at": int(time.time())}
+        with self.lock:
+            self.insert(record, addresses)
+            if not self.path:
+                # Nothing moves the places to a snapshot, keep the most recently used ones
+                while self.max_learned and len(self.records) > self.max_learned:
+                    self.remove(next(iter(self.records)))
+                    self.evicted += 1
+                return
+            self.pending.append(json.dumps({"record": record, "addresses": addresses}, ensure_ascii=False) + "\n")
+            self.journaled += 1
+            if not self.writing:
+                # Appending to the file waits on the disk, keep it off the caller's (event loop) thread;
+                # places learned meanwhile are written together in the next append
+                self.writing = True
+                threading.Thread(target=self.write_journal, name="poi-journal", daemon=True).start()
+            if self.journaled < self.journal_limit or self.compacting:
+                return
+            self.compacting = True
+        # Rewriting the snapshot takes a while on a large index, keep it off the caller's (event loop) thread
+        threading.Thread(target=self.compact, name="poi-compact", daemon=True).start()
+
+    def write_journal(self):
+        """Append the pending journal lines until there are none left"""
+        while True:
+            with self.journal_lock:
+                with self.lock:
+                    if not self.pending:
+                        self.writing = False
+                        return
+                try:
+                    self.flush_locked()
+                except OSError as e:
+                    logger.error(f"Failed to write the POI index journal: {e}")
+                    with self.lock:
+                        self.writing = False
+                    return
+
+    def flush(self):
+        """Write the pending journal lines now, e.g. before the process exits"""
+        if self.path:
+            with self.journal_lock:
+                self.flush_locked()
+
+    def flush_locked(self):
+        """Append the pending journal lines, the journal lock must be held"""
+        with self.lock:
+            lines, self.pending = self.pending, []
+        if lines:
+            try:
+                with open(f"{self.path}.journal", "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+            except OSError:
+                with self.lock:
+                    self.pending = lines + self.pending  # Retried with the next place learned
+                raise
+
+    def compact(self):
+        """Rewrite the snapshot with the learned places and empty the journal
+
+        The new snapshot is written to a temporary file without holding the
+        lock and then swapped in; lookups use the old mapping until the swap
+        succeeds, and if writing fails the old snapshot and journal are kept.
+        """
+        journal = f"{self.path}.journal"
+        rotated = f"{journal}.compacting"
+        temp = f"{self.path}.tmp"
+        with self.journal_lock:
+            self.flush_locked()
+            with self.lock:
+                self.compacting = True
+                records = dict(self.records)
+                snapshot = self.snapshot
+                # Places learned from now on go to a fresh journal
+                if os.path.exists(journal):
+                    if os.path.exists(rotated):  # Left over by a compaction that did not finish
+                        append_file(journal, rotated)
+                        os.remove(journal)
+                    else:
+                        os.replace(journal, rotated)
+                journaled, self.journaled = self.journaled, 0
+        try:
+            write_snapshot(temp, merge_records(snapshot, records))
+            with self.lock:
+                self.swap(temp)
+                # Keep the places learned (or learned again) while the snapshot was written
+                current = self.records
+                self.reset_overlay()
+                for uid, entry in current.items():
+                    if records.get(uid) is not entry:
+                        self.insert(*entry)
+                if os.path.exists(rotated):
+                    os.remove(rotated)
+            logger.info(f"POI index compacted: {self.stats()}")
+        except Exception as e:
+            logger.error(f"POI index compaction failed, keeping the old snapshot: {e}")
+            with self.journal_lock, self.lock:
+                if os.path.exists(rotated):
+                    if os.path.exists(journal):
+                        append_file(journal, rotated)
+                    os.replace(rotated, journal)
+                self.journaled += journaled
+            if os.path.exists(temp):
+                os.remove(temp)
+        finally:
+            self.compacting = False
+
+    def swap(self, temp):
+        """Replace the snapshot file with `temp` and map it, the lock must be held"""
+        old = self.snapshot
+        try:
+            os.replace(temp, self.path)
+        except PermissionError:
+            if old is None:
+                raise
+            # Windows cannot replace a mapped file: unmap it first, and map whatever is there afterwards
+            old.close()
+            self.snapshot = old = None
+            try:
+                os.replace(temp, self.path)
+            finally:
+                self.snapshot = Snapshot(self.path)
+            return
+        self.snapshot = Snapshot(self.path)
+        if old is not None:
+            old.close()
+
+    def geocode(self, address, city=""):
+        """The place last geocoded (or imported) for exactly this address in `city`, or None
+
+        A place found for the address without a city is only returned if it
+        lies in `city`, and a learned place only until `geocode_ttl` expires.
+        """
+        keys = [address_key(address, city)]
+        if normalize(city):
+            keys.append(address_key(address))
+        with self.lock:
+            for key in keys:
+                record = self.find_address(key)
+                if record is None:
+                    continue
+                if self.expired(record):
+                    if not self.path:
+                        self.remove(record_id(record))  # Would only be evicted once least recently used
+                    continue
+                if key != keys[0] and not in_city(record, city):
+                    continue
+                return record
+        return None
+
+    def find_address(self, key):
+        """The record geocoded for address key `key`, learned places first, the lock must be held"""
+        uid = self.addresses.get(key)
+        if uid is not None:
+            self.records.move_to_end(uid)
+            return self.records[uid][0]
+        if self.snapshot is not None:
+            offset = self.snapshot.find("addresses", key)
+            if offset is not None:
+                return self.snapshot.record(offset)
+        return None
+
+    def expired(self, record):
+        return bool(self.geocode_ttl and "learned_at" in record
+                    and time.time() - record["learned_at"] > self.geocode_ttl)
+
+    def tips(self, keywords, location=None, city="", limit=10, scan=200):
+        """Places whose name starts with `keywords` (in `city`), nearest to `location` first
+
+        Returns (places, nearby): `nearby` counts the matching places in the
+        geohash cells around `location`, or all matches in `city` when there
+        is no location; without either it is 0, matches across the country
+        say nothing about the place the user means.
+        """
+        prefix = normalize(keywords)
+        if not prefix:
+            return [], 0
+        point = parse_location(location) if location else None
+        with self.lock:
+            places = {}
+            near = {}
+            if point is not None:
+                # Places around `location` first, so a popular name with more than `scan`
+                # matches elsewhere still finds the nearby ones
+                for cell in neighborhood(*point):
+                    for uid in self.cells.get(cell, ()):
+                        if self.matches(self.records[uid][0], prefix):
+                            near[uid] = self.records[uid][0]
+                    if self.snapshot is not None:
+                        for offset in self.snapshot.prefix("cells", f"{cell}|{prefix}", scan):
+                            record = self.snapshot.record(offset)
+                            near.setdefault(record_id(record), record)
+            if len(near) < limit:  # Otherwise there are enough places nearby to skip the ones elsewhere
+                for uid in self.trie_prefix(prefix, scan):
+                    places[uid] = self.records[uid][0]
+                if self.snapshot is not None:
+                    for offset in self.snapshot.prefix("names", prefix, scan):
+                        record = self.snapshot.record(offset)
+                        places.setdefault(record_id(record), record)
+        places = [record for record in {**places, **near}.values() if not city or in_city(record, city)]
+        if point is None:
+            places.sort(key=lambda record: (normalize(record.get("name", "")) != prefix, len(record.get("name", ""))))
+            return places[:limit], len(places) if city else 0
+        places.sort(key=lambda record: distance(point, parse_location(record["location"])))
+        return places[:limit], sum(1 for record in near.values() if not city or in_city(record, city))
+
+    def trie_prefix(self, prefix, limit):
+        """Ids of up to about `limit` learned places with a name starting with `prefix`"""
+        node = self.trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return set()
+        found = set()
+        stack = [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            for key, child in node.items():
+                if key == "":
+                    found.update(child)
+                else:
+                    stack.append(child)
+        return found
+
+    @staticmethod
+    def matches(record, prefix):
+        return any(normalize(name).startswith(prefix) for name in [record.get("name", "")] + record.get("aliases", []))
+
+    def stats(self):
+        return {
+            "snapshot": self.snapshot.count if self.snapshot is not None else 0,
+            "learned": len(self.records),
+            "evicted": self.evicted,
+        }
+
+
+def load_dataset(path):
+    """Places from a CSV (with a header row) or JSONL file"""
+    with open(path, encoding="utf-8-sig") as f:
+        rows = [json.loads(line) for line in f if line.strip()] if path.endswith(".jsonl") else list(csv.DictReader(f))
+    for row in rows:
+        aliases = row.get("aliases") or []
+        if isinstance(aliases, str):
+            aliases = [alias for alias in aliases.split("|") if alias]
+        record = {key: row[key] for key in ("id", "name", "address", "location", "city", "district", "adcode")
+                  if row.get(key)}
+        if aliases:
+            record["aliases"] = aliases
+        yield record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local POI index used by Amap_MCP.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="Add places from a CSV or JSONL file")
+    importer.add_argument("dataset")
+    importer.add_argument("--index", default=os.getenv("AMAP_POI_INDEX", "amap_pois.idx"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    index = POIIndex(args.index)
+    count = 0
+    with index.lock:
+        for record in load_dataset(args.dataset):
+            if not record.get("name") or not parse_location(record.get("location")):
+                logger.warning(f"Skipping place without name or location: {record}")
+                continue
+            # Imported places answer geocode for their name, aliases and address
+            keys = [address_key(text) for text in [record["name"], record.get("address", "")] + record.get("aliases", [])
+                    if normalize(text)]
+            record["source"] = "import"
+            index.insert(record, keys)
+            count += 1
+    index.compact()
+    print(f"Imported {count} places into {args.index}: {index.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Trim upstream API answers down to what a voice device needs
+
+`pick()` keeps selected fields (and drops the empty `[]` Amap uses for
+missing values), `simplify()` thins a polyline with Douglas-Peucker, and
+`compact_json()` serializes without the indentation FastMCP would add.
+"""
+
+import json
+import math
+
+EARTH_RADIUS = 6371000.0  # Meters
+
+
+def is_empty(value):
+    return value in ("", None) or value == [] or value == {}
+
+
+def pick(item, fields):
+    """The `fields` of dict `item` that have a value, in `fields` order"""
+    return {field: item[field] for field in fields if field in item and not is_empty(item[field])}
+
+
+def parse_polyline(polyline):
+    """Amap "lng,lat;lng,lat" string -> [(lng, lat)]"""
+    points = []
+    for pair in polyline.split(";"):
+        if pair:
+            lng, lat = pair.split(",")
+            points.append((float(lng), float(lat)))
+    return points
+
+
+def format_polyline(points):
+    return ";".join(f"{lng:.6f},{lat:.6f}" for lng, lat in points)
+
+
+def simplify(points, tolerance):
+    """Douglas-Peucker: drop points closer than `tolerance` meters to the simplified line"""
+    if len(points) < 3 or tolerance <= 0:
+        return list(points)
+    # Local equirectangular projection to meters, accurate enough at route scale
+    scale = math.radians(1) * EARTH_RADIUS
+    cos_lat = math.cos(math.radians(points[0][1]))
+    xy = [(lng * scale * cos_lat, lat * scale) for lng, lat in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = xy[first], xy[last]
+        dx, dy = x2 - x1, y2 - y1
+        length = math.hypot(dx, dy)
+        farthest, distance = None, tolerance
+        for i in range(first + 1, last):
+            x, y = xy[i]
+            if length:
+                d = abs(dy * (x - x1) - dx * (y - y1)) / length
+            else:
+                d = math.hypot(x - x1, y - y1)
+            if d > distance:
+                farthest, distance = i, d
+        if farthest is not None:
+            keep[farthest] = True
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def compact_json(data):
+    """JSON text without indentation or ASCII escapes"""
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Token-bucket rate limiter shared by the MCP tool modules
+
+Callers over the limit are queued (first come, first served) until a
+token is available instead of failing, so bursts are smoothed out to the
+upstream API's quota. A caller that cannot wait long passes `max_wait`
+and gets RateLimited right away when its token would come later.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger('ratelimit')
+
+
+class RateLimited(Exception):
+    """The next token comes later than the caller can wait"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds until a token would be free
+
+
+class TokenBucket:
+    def __init__(self, name, rate, capacity=1):
+        if rate <= 0 or capacity < 1:
+            raise ValueError(f"{name} rate limit needs a positive rate and a capacity of at least 1, "
+                             f"got rate={rate}, capacity={capacity}")
+        self.name = name
+        self.rate = rate  # Tokens added per second
+        self.capacity = capacity  # Burst size
+        self.tokens = capacity  # Below 0 while callers wait: tokens already promised to them
+        self.updated = time.monotonic()
+        self.waited = 0  # Calls that had to wait for a token
+        self.rejected = 0  # Calls refused because of max_wait
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, max_wait=None):
+        """Take one token, waiting for the bucket to refill if it is empty
+
+        Raises RateLimited instead if the wait (behind the callers already
+        waiting) would be longer than `max_wait` seconds.
+        """
+        self.refill()
+        delay = max(0.0, (1 - self.tokens) / self.rate)
+        if max_wait is not None and delay > max_wait:
+            self.rejected += 1
+            raise RateLimited(f"{self.name} rate limit reached, next request possible in {delay:.0f}s", delay)
+        self.tokens -= 1  # Reserved now, so later callers queue behind this one
+        if delay > 0:
+            self.waited += 1
+            logger.info(f"[{self.name}] Rate limited, waiting {delay:.1f}s")
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.tokens += 1  # Give the reserved token back
+                raise
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""Adaptive timeouts, circuit breakers and hedged requests per upstream
+
+Tool modules keep one `Upstream` per remote API (and operation, where
+latencies differ) and send their requests through `Upstream.call()`:
+
+- Timeout: `multiplier` times the p99 of the recent successful latencies,
+  between `min_timeout` and `max_timeout` (`max_timeout` until there are
+  MIN_SAMPLES of them). A call that times out is recorded at its timeout,
+  so when the upstream slows down for good the timeout grows back towards
+  `max_timeout` instead of failing every call.
+- Circuit breaker: after `failures` failures in a row (timeouts,
+  connection errors, HTTP 5xx) calls fail at once with
+  `UpstreamUnavailable` for `reset_after` seconds; then one probe call is
+  let through (half-open), and its outcome closes or reopens the breaker.
+  Several `Upstream`s of one service can share a `CircuitBreaker`.
+- Hedging (`hedge=True`, only for idempotent requests): when the first
+  attempt has not answered after the `hedge_quantile` latency, an
+  identical second one is sent, the first success wins and the other is
+  canceled. At the default p95 this adds about 5% requests.
+
+Breaker state, the current timeout and hedge counts are reported to the
+pipe's metrics as gauges.
+"""
+
+import asyncio
+import collections
+import logging
+import time
+
+import metrics
+
+logger = logging.getLogger('resilience')
+
+MIN_SAMPLES = 20  # Successful calls needed before timeouts and hedges follow the latency
+WINDOW = 200  # Recent latencies the percentiles are taken from
+TIMEOUT_QUANTILE = 0.99
+TIMEOUT_MULTIPLIER = 3
+MIN_TIMEOUT = 2.0  # Below this a stall of the network or the upstream fails calls that would have succeeded
+BREAKER_FAILURES = 5
+BREAKER_RESET = 15  # Seconds an open breaker fails calls before letting a probe through
+STATES = {"closed": 0, "half_open": 1, "open": 2}  # Values of the upstream_breaker_state gauge
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream's circuit breaker is open"""
+
+
+class UpstreamTimeout(asyncio.TimeoutError):
+    """The upstream did not answer within the adaptive timeout"""
+
+
+def is_failure(error):
+    """Whether `error` says the upstream is unhealthy: anything but an answer with a status below 500"""
+    status = getattr(error, "status", None)
+    return not (isinstance(status, int) and status < 500)
+
+
+class CircuitBreaker:
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.name = name
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.consecutive = 0  # Failures in a row
+        self.opened_at = 0.0
+        self.probing = False  # A half-open probe call is in flight
+        self.rejected = 0
+        self.opened = 0
+        metrics.emit_gauge("upstream_breaker_state", STATES[self.state], upstream=self.name)
+
+    def acquire(self):
+        """Let a call through, True if it is the half-open probe; raise UpstreamUnavailable while open"""
+        if self.state == "closed":
+            return False
+        self.check()
+        self.set_state("half_open")
+        self.probing = True
+        return True
+
+    def check(self):
+        """Raise UpstreamUnavailable if a call would be rejected now, without taking the probe
+
+        For callers that spend something scarce (a rate limit token) before the call.
+        """
+        if self.state == "closed":
+            return
+        retry_in = self.opened_at + self.reset_after - time.monotonic()
+        if retry_in <= 0 and not self.probing:
+            return
+        self.rejected += 1
+        raise UpstreamUnavailable(f"{self.name} is unavailable after {self.consecutive} failed calls, "
+                                  f"retrying in {max(retry_in, 0):.0f}s")
+
+    def success(self):
+        self.consecutive = 0
+        if self.state != "closed":
+            logger.info(f"[{self.name}] Upstream recovered, circuit closed")
+            self.set_state("closed")
+
+    def failure(self):
+        self.consecutive += 1
+        if self.state == "half_open" or (self.state == "closed" and self.consecutive >= self.failures):
+            if self.state == "closed":
+                logger.warning(f"[{self.name}] {self.consecutive} failed calls in a row, "
+                               f"circuit open for {self.reset_after}s")
+            self.opened_at = time.monotonic()
+            self.opened += 1
+            self.set_state("open")
+
+    def set_state(self, state):
+        self.state = state
+        metrics.emit_gauge("upstream_breaker_state", STATES[state], upstream=self.name)
+
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self.consecutive, "opened": self.opened,
+                "rejected": self.rejected}
+
+
+class Upstream:
+    def __init__(self, name, breaker=None, min_timeout=MIN_TIMEOUT, max_timeout=10, multiplier=TIMEOUT_MULTIPLIER,
+                 hedge_quantile=0.95):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker(name)
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.multiplier = multiplier
+        self.hedge_quantile = hedge_quantile  # 0 disables hedging
+        self.latencies = collections.deque(maxlen=WINDOW)  # Seconds of recent successful (or timed out) calls
+        self.reported_timeout = None
+        self.calls = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0  # Hedges that answered before the first attempt
+
+    def quantile(self, q):
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def timeout(self):
+        """Seconds the next call may take"""
+        if len(self.latencies) < MIN_SAMPLES:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, self.quantile(TIMEOUT_QUANTILE) * self.multiplier))
+
+    async def call(self, fn, *args, hedge=False, **kwargs):
+        """Return `await fn(*args, **kwargs)` within the adaptive timeout, through the circuit breaker
+
+        With `hedge=True` `fn` may be called twice at once, see hedged().
+        """
+        probe = self.breaker.acquire()
+        timeout = self.timeout()
+        self.calls += 1
+        start = time.monotonic()
+        try:
+            if hedge and self.hedge_quantile and len(self.latencies) >= MIN_SAMPLES:
+                result = await asyncio.wait_for(self.hedged(fn, args, kwargs), timeout)
+            else:
+                result = await asyncio.wait_for(fn(*args, **kwargs), timeout)
+        except asyncio.TimeoutError as e:
+            self.timeouts += 1
+            self.record(time.monotonic() - start)
+            self.breaker.failure()
+            raise UpstreamTimeout(f"{self.name} did not answer within {timeout:.1f}s") from e
+        except Exception as e:
+            if is_failure(e):
+                self.breaker.failure()
+            else:
+                self.breaker.success()
+            raise
+        finally:
+            if probe:
+                self.breaker.probing = False
+        self.record(time.monotonic() - start)
+        self.breaker.success()
+        return result
+
+    async def hedged(self, fn, args, kwargs):
+        """First successful answer of `fn`, sending a second attempt if the first is slower than usual"""
+        tasks = [asyncio.ensure_future(fn(*args, **kwargs))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.quantile(self.hedge_quantile))
+            if not done:
+                tasks.append(asyncio.ensure_future(fn(*args, **kwargs)))
+                self.hedges += 1
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if len(tasks) > 1:
+                metrics.emit_gauge("upstream_hedges", self.hedges, upstream=self.name)
+                metrics.emit_gauge("upstream_hedge_win_rate", round(self.hedge_wins / self.hedges, 3),
+                                   upstream=self.name)
+
+    def record(self, latency):
+        self.latencies.append(latency)
+        timeout = self.timeout()
+        # Report the timeout when it moved by more than 10%, not on every call
+        if self.reported_timeout is None or abs(timeout - self.reported_timeout) > self.reported_timeout * 0.1:
+            self.reported_timeout = timeout
+            metrics.emit_gauge("upstream_timeout_seconds", round(timeout, 3), upstream=self.name)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "timeout_s": round(self.timeout(), 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 1) if self.latencies else None,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "breaker": self.breaker.stats(),
+        }
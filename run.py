@@ -1,95 +1,126 @@
 # -*- coding: utf-8 -*-
+"""
+启动器：以网关方式运行 mcp_pipe.py（一个WebSocket连接承载所有工具），并守护它。
+
+mcp_pipe.py 负责各工具进程：定期 ping 健康检查，崩溃或无响应时按退避重启，
+并记录每个工具进程的内存、CPU和重启次数。本脚本负责：
+- 加载 .env 并检查配置
+- 启动 mcp_pipe.py，它异常退出时按退避重启
+- 收到 SIGTERM / Ctrl+C 时转发 SIGTERM 给 mcp_pipe.py，等进行中的工具调用完成后再退出
+
+Usage:
+
+python run.py [<mcp_script> ...]
+
+不指定脚本时启动环境变量 MCP_TOOLS（逗号分隔）中的工具，默认全部工具。
+适合作为 systemd 等服务管理器的入口（Linux），也可在 Windows 下直接运行。
+"""
+
+import logging
 import os
-from dotenv import load_dotenv
-# 新增subprocess导入
+import signal
 import subprocess
-# 新增sys导入
 import sys
+import time
 
-# 加载.env文件
+from dotenv import load_dotenv
+
+# 加载.env文件，之后所有模块都可以通过 os.getenv() 获取环境变量
 load_dotenv()
 
-# 现在所有模块都可以通过 os.getenv() 获取环境变量
-# 获取MCP_ENDPOINT
-MCP_ENDPOINT = os.getenv("MCP_ENDPOINT")
-if not MCP_ENDPOINT:
-    print("错误：未找到MCP接入点配置！")
-    print("请在.env文件中正确配置MCP_ENDPOINT")
-    sys.exit(1)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('run')
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TOOLS = ["Amap_MCP.py", "music.py", "ragflow_mcp.py", "web_news.py", "stock_query.py"]
+RESTART_BACKOFF = 1  # mcp_pipe.py 异常退出后首次重启前的等待（秒）
+MAX_BACKOFF = 60  # 重启等待上限（秒）
+STABLE_TIME = 60  # 运行超过这么久后退出，重启等待从头计算
+# 停止时等待 mcp_pipe.py 排空的时间，比它自己的排空超时多留出终止工具进程的时间
+STOP_TIMEOUT = float(os.getenv("MCP_PIPE_DRAIN_TIMEOUT", 30)) + 15
+
+stopping = False
+
+
+def mask(endpoint):
+    """隐藏接入点中间部分字符（含token）"""
+    return f"{endpoint[:20]}...{endpoint[-20:]}"
 
-# 显示正在使用的MCP_ENDPOINT（隐藏中间部分字符）
-print(f"正在使用MCP接入点: {MCP_ENDPOINT[:20]}...{MCP_ENDPOINT[-20:]}")
 
-# 新增环境变量验证函数
-def validate_env_vars():
-    required_vars = ['MUSIC_API_KEY']
+def validate_env_vars(tools):
+    required_vars = ['MCP_ENDPOINT']
+    if "music.py" in tools:
+        required_vars.append('MUSIC_API_KEY')
     missing = [var for var in required_vars if not os.getenv(var)]
     if missing:
-        raise EnvironmentError(f"缺少必要环境变量: {', '.join(missing)}。请检查 .env 文件。")
+        logger.error(f"缺少必要环境变量: {', '.join(missing)}。请检查 .env 文件。")
+        sys.exit(1)
 
-# 调用验证函数
-validate_env_vars()
 
-# 启动单个工具的函数
-def start_tool(script_name):
-    try:
-        # 设置环境变量
-        env = os.environ.copy()
-        env["MCP_ENDPOINT"] = MCP_ENDPOINT
-        
-        # 启动子进程
-        process = subprocess.Popen(
-            [sys.executable, "mcp_pipe.py", script_name],
-            env=env,
-            creationflags=subprocess.CREATE_NEW_CONSOLE
-        )
-        return process
-    except Exception as e:
-        print(f"启动工具 {script_name} 时出错: {e}")
-        return None
-
-# 启动所有工具
-processes = []
-
-# 启动指定工具
-tools_to_start = ["Amap_MCP.py", "music.py", "ragflow_mcp.py", "web_news.py", "stock_query.py"]
-for tool in tools_to_start:
-    print(f"启动工具 {tool}...")
-    process = start_tool(tool)
-    if process:
-        processes.append(process)
-
-print("所有指定工具已启动！")
-print(f"当前使用的MCP接入点: {MCP_ENDPOINT[:20]}...{MCP_ENDPOINT[-20:]}")
-print("按Enter键终止所有进程...")
-input()  # 等待用户输入
-
-# 终止所有进程
-print("正在终止所有进程...")
-for process in processes:
+def start_pipe(tools):
+    """启动 mcp_pipe.py，放在单独的进程组里，终端的 Ctrl+C 由本脚本转成 SIGTERM 排空"""
+    options = {'start_new_session': True} if os.name == 'posix' else {
+        'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, "mcp_pipe.py"), *tools], cwd=ROOT, **options)
+
+
+def stop_pipe(process):
+    """请 mcp_pipe.py 排空后退出，超时则强制结束"""
+    if process.poll() is not None:
+        return
+    logger.info(f"正在停止 mcp_pipe.py（等待进行中的工具调用完成，最多 {STOP_TIMEOUT:.0f} 秒）...")
+    process.terminate()  # POSIX 上是 SIGTERM；Windows 上没有排空，直接结束
     try:
-        process.terminate()
-        process.wait(timeout=5)
-    except:
-        pass
+        process.wait(timeout=STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        logger.warning("mcp_pipe.py 未在规定时间内退出，强制结束")
+        process.kill()
+        process.wait()
 
-print("所有进程已终止")
 
-# 示例：检查当前分支并进行相应操作（假设需要）
-import subprocess
+def handle_stop(sig, frame):
+    global stopping
+    stopping = True
 
-def get_current_branch():
-    try:
-        result = subprocess.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], capture_output=True, text=True)
-        return result.stdout.strip()
-    except Exception as e:
-        print(f"获取当前分支时出错: {e}")
-        return None
-
-current_branch = get_current_branch()
-if current_branch:
-    print(f"当前分支: {current_branch}")
-    if current_branch == "主要":
-        print("警告：当前分支为'主要'，请切换到其他分支再进行操作。")
-else:
-    print("无法获取当前分支信息。")
+
+def supervise(tools):
+    """运行 mcp_pipe.py 直到收到停止信号，异常退出时按退避重启"""
+    delay = RESTART_BACKOFF
+    restarts = 0
+    while not stopping:
+        started_at = time.monotonic()
+        process = start_pipe(tools)
+        logger.info(f"mcp_pipe.py 已启动 (pid {process.pid})，工具: {', '.join(tools)}")
+        while process.poll() is None and not stopping:
+            time.sleep(0.5)
+        if stopping:
+            stop_pipe(process)
+            break
+
+        if time.monotonic() - started_at > STABLE_TIME:
+            delay = RESTART_BACKOFF
+        restarts += 1
+        logger.warning(f"mcp_pipe.py 退出，返回码 {process.returncode}，{delay:.0f} 秒后第 {restarts} 次重启")
+        deadline = time.monotonic() + delay
+        while time.monotonic() < deadline and not stopping:
+            time.sleep(0.2)
+        delay = min(delay * 2, MAX_BACKOFF)
+    logger.info(f"所有进程已终止（mcp_pipe.py 共重启 {restarts} 次）")
+
+
+def main():
+    tools = sys.argv[1:] or [t.strip() for t in os.getenv("MCP_TOOLS", "").split(",") if t.strip()] or DEFAULT_TOOLS
+    validate_env_vars(tools)
+    logger.info(f"正在使用MCP接入点: {mask(os.getenv('MCP_ENDPOINT'))}")
+
+    signal.signal(signal.SIGINT, handle_stop)
+    if hasattr(signal, 'SIGTERM'):
+        signal.signal(signal.SIGTERM, handle_stop)
+    supervise(tools)
+
+
+if __name__ == "__main__":
+    main()
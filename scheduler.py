@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Priority job scheduler with an adaptive concurrency limit
+
+Jobs wait in a priority queue (lower number first, then submission order)
+and are started as asyncio tasks while fewer than `limit` are running.
+Canceling a queued job drops it before it starts; canceling a running job
+cancels its task, which aborts the upstream request it is waiting on.
+
+The limit adapts to the upstream's latency (additive increase,
+multiplicative decrease): while jobs finish within `tolerance` times the
+best recent latency the limit grows by about one per round trip, and when
+latency climbs past that, or jobs fail, it is cut by `backoff`. An
+overloaded upstream queues requests internally, so rising latency is the
+signal that more concurrency no longer helps.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger('scheduler')
+
+
+class AdaptiveLimit:
+    def __init__(self, name, initial=5, minimum=1, maximum=32, tolerance=2.0, backoff=0.75):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.baseline = None  # Best recent latency, drifts up slowly so one lucky sample doesn't stick
+
+    def update(self, latency, ok=True, in_flight=None):
+        """Adjust the limit after a job took `latency` seconds with `in_flight` jobs running (itself included)"""
+        if ok:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline += (latency - self.baseline) * 0.01
+        previous = int(self.limit)
+        if ok and latency <= self.baseline * self.tolerance:
+            if in_flight is None or in_flight >= int(self.limit):  # Only grow a limit that is actually reached
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        else:
+            self.limit = max(self.minimum, self.limit * self.backoff)
+        if int(self.limit) != previous:
+            logger.debug(f"[{self.name}] Concurrency limit {previous} -> {int(self.limit)} "
+                        f"(latency {latency:.2f}s, baseline {self.baseline or 0:.2f}s)")
+
+    def __int__(self):
+        return int(self.limit)
+
+
+class Scheduler:
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit  # AdaptiveLimit
+        self.queue = []  # heap of (priority, seq, job_id)
+        self.queued = {}  # job_id -> (fn, args), removed when canceled or started
+        self.running = {}  # job_id -> asyncio.Task
+        self.seq = itertools.count()
+        self.completed = 0
+        self.canceled = 0
+
+    def submit(self, job_id, priority, fn, *args):
+        """Queue `fn(*args)` (a coroutine function) to run as `job_id`
+
+        A job that raises or returns False counts as failed for the limit,
+        one that returns None (e.g. it had nothing to do) is not counted.
+        """
+        self.queued[job_id] = (fn, args)
+        heapq.heappush(self.queue, (priority, next(self.seq), job_id))
+        self.dispatch()
+
+    def cancel(self, job_id):
+        """Drop a queued job or abort a running one, False if it is neither"""
+        if self.queued.pop(job_id, None) is not None:
+            self.canceled += 1  # Its heap entry is skipped when it comes up
+            return True
+        task = self.running.get(job_id)
+        if task is not None and not task.done():
+            task.cancel()
+            return True
+        return False
+
+    def dispatch(self):
+        """Start queued jobs, highest priority first, up to the current limit"""
+        while self.queue and len(self.running) < int(self.limit):
+            _, _, job_id = heapq.heappop(self.queue)
+            job = self.queued.pop(job_id, None)
+            if job is None:
+                continue  # Canceled while queued
+            fn, args = job
+            task = asyncio.ensure_future(fn(*args))
+            self.running[job_id] = task
+            task.add_done_callback(lambda task, job_id=job_id, start=time.monotonic(): self.finished(job_id, start, task))
+
+    def finished(self, job_id, start, task):
+        in_flight = len(self.running)
+        self.running.pop(job_id, None)
+        if task.cancelled():
+            self.canceled += 1
+        elif task.exception() is not None or task.result() is not None:
+            self.completed += 1
+            self.limit.update(time.monotonic() - start, ok=task.exception() is None and task.result() is not False,
+                              in_flight=in_flight)
+        self.dispatch()
+
+    def stats(self):
+        return {
+            "limit": int(self.limit),
+            "running": len(self.running),
+            "queued": len(self.queued),
+            "completed": self.completed,
+            "canceled": self.canceled,
+            "baseline_latency": round(self.limit.baseline or 0.0, 3),
+        }
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Request coalescing (single-flight) shared by the MCP tool modules
+
+Concurrent calls with the same key share one execution: the first caller
+starts it, later callers wait for the same result (or exception) instead
+of sending their own upstream request. Once it finishes the key is free
+again, so results are never served stale; combine with cache.py for that.
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger('singleflight')
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self.calls = {}  # key -> asyncio.Task of the execution in flight
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Return the result of `await fn(*args, **kwargs)`, shared with concurrent calls of `key`"""
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self.calls[key] = task
+            self.executions += 1
+            task.add_done_callback(lambda t: self.finished(key, t))
+        else:
+            self.coalesced += 1
+            logger.debug(f"[{self.name}] Coalesced call for {key}")
+        # Shielded so one caller giving up does not cancel the execution the others wait on
+        return await asyncio.shield(task)
+
+    def finished(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved, every caller may have been cancelled already
+
+    def stats(self):
+        """Coalescing counters"""
+        total = self.executions + self.coalesced
+        return {
+            'calls': total,
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'coalesced_rate': round(self.coalesced / total, 3) if total else 0.0,
+            'in_flight': len(self.calls),
+        }
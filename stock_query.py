@@ -3,10 +3,13 @@ from mcp.server.fastmcp import FastMCP
 import sys
 import logging
 import os
-import requests  # 用于发起HTTP请求
-
-# 导入yfinance库
-import yfinance as yf
+import asyncio
+from typing import List
+import http_client  # 共享的HTTP连接池
+from cache import MISSING, TTLCache
+from ratelimit import RateLimited, TokenBucket
+from resilience import Upstream
+from singleflight import SingleFlight
 
 # Fix UTF-8 encoding for Windows console
 if sys.platform == 'win32':
@@ -18,44 +21,181 @@ logger = logging.getLogger('stock_query_tool')
 # 创建 MCP 服务器
 mcp = FastMCP("股票查询")  # 保持已修改的服务器名称
 
+ALPHAVANTAGE_API_URL = os.getenv("ALPHAVANTAGE_API_URL", "https://www.alphavantage.co/query")
+ALPHAVANTAGE_TIMEOUT = 10  # 每次请求的超时时间上限（秒），实际超时按最近的p99延迟自适应
+# 熔断：Alpha Vantage连续失败时直接返回错误；不做对冲，免费额度很少
+alphavantage = Upstream("alphavantage", max_timeout=ALPHAVANTAGE_TIMEOUT, hedge_quantile=0)
+quote_calls = SingleFlight("stock")  # 同一股票的并发查询只请求一次
+
+# 行情缓存：同一股票在有效期（秒）内直接返回缓存的报价
+QUOTE_MAX_AGE = int(os.getenv("STOCK_QUOTE_MAX_AGE", 60))
+quote_cache = TTLCache("stock", maxsize=int(os.getenv("STOCK_QUOTE_CACHE_SIZE", 512)))
+
+# 令牌桶限流：免费版Alpha Vantage每分钟只允许少量请求，超出的请求排队等待而不是失败
+ALPHAVANTAGE_RATE_PER_MIN = float(os.getenv("ALPHAVANTAGE_RATE_PER_MIN", 5))
+ALPHAVANTAGE_BURST = int(os.getenv("ALPHAVANTAGE_BURST", 5))
+if ALPHAVANTAGE_RATE_PER_MIN <= 0 or ALPHAVANTAGE_BURST < 1:
+    logger.warning(f"ALPHAVANTAGE_RATE_PER_MIN must be > 0 and ALPHAVANTAGE_BURST >= 1, "
+                   f"got {ALPHAVANTAGE_RATE_PER_MIN} / {ALPHAVANTAGE_BURST}; using 5 / 5")
+    ALPHAVANTAGE_RATE_PER_MIN, ALPHAVANTAGE_BURST = 5, 5
+rate_limiter = TokenBucket("alphavantage", rate=ALPHAVANTAGE_RATE_PER_MIN / 60, capacity=ALPHAVANTAGE_BURST)
+# 排队超过这么多秒才能拿到令牌时直接返回错误，免得设备超时；默认60秒（即一分钟的额度），至少一个令牌间隔，
+# 否则突发额度用完后每个请求都会直接失败而不是排队
+ALPHAVANTAGE_MAX_WAIT = float(os.getenv("ALPHAVANTAGE_MAX_WAIT") or max(60.0, 60 / ALPHAVANTAGE_RATE_PER_MIN))
+
+# 可选：用本地yfinance批量下载行情（pip install yfinance），不占用Alpha Vantage额度
+STOCK_USE_YFINANCE = os.getenv("STOCK_USE_YFINANCE") == "1"
+MAX_BATCH_SYMBOLS = 50  # 批量查询一次最多的股票数
+
+
+class QuoteError(Exception):
+    """无法获取报价（股票代码无效、API额度用尽等）"""
+
+
+def normalize_symbol(symbol):
+    return symbol.strip().upper()
+
+
+async def fetch_quote(symbol):
+    """通过Alpha Vantage GLOBAL_QUOTE获取一只股票的报价"""
+    api_key = os.getenv("ALPHAVANTAGE_API_KEY")
+    if not api_key or api_key == "your_api_key_here":
+        raise QuoteError("未配置有效的Alpha Vantage API密钥")
+
+    alphavantage.breaker.check()  # 熔断时直接失败，不浪费限流令牌
+    try:
+        await rate_limiter.acquire(max_wait=ALPHAVANTAGE_MAX_WAIT)
+    except RateLimited as e:
+        raise QuoteError(f"Alpha Vantage请求过多，请约{e.retry_after:.0f}秒后再试") from e
+    params = {"function": "GLOBAL_QUOTE", "symbol": symbol, "apikey": api_key}
+    data = await alphavantage.call(http_client.get_json, ALPHAVANTAGE_API_URL, params=params,
+                                   timeout=ALPHAVANTAGE_TIMEOUT)
+
+    quote = data.get("Global Quote")
+    if not quote:
+        # 超出额度时Alpha Vantage返回200，并在Note/Information中说明
+        raise QuoteError(data.get("Note") or data.get("Information") or "无法获取股票数据或股票代码无效")
+    return {
+        "symbol": symbol,
+        "price": quote["05. price"],
+        "highest": quote["03. high"],
+        "lowest": quote["04. low"],
+        "volume": quote["06. volume"],
+        "time": quote["07. latest trading day"]  # 使用最新的交易日作为时间
+    }
+
+
+def download_quotes(symbols):
+    """用yfinance一次批量下载多只股票最近的日线，返回 {symbol: result}（同步，放在线程中运行）"""
+    import yfinance  # 可选依赖，导入很慢，只在启用时导入
+
+    frame = yfinance.download(symbols, period="5d", interval="1d", group_by="ticker",
+                              auto_adjust=False, threads=True, progress=False)
+    results = {}
+    for symbol in symbols:
+        # 多只股票时列是 (symbol, field) 两级，旧版yfinance单只股票时只有一级
+        rows = frame[symbol] if symbol in frame.columns.get_level_values(0) else frame
+        rows = rows.dropna(subset=["Close"])
+        if rows.empty:
+            continue
+        last = rows.iloc[-1]
+        results[symbol] = {
+            "symbol": symbol,
+            "price": f"{last['Close']:.4f}",
+            "highest": f"{last['High']:.4f}",
+            "lowest": f"{last['Low']:.4f}",
+            "volume": str(int(last["Volume"])),
+            "time": rows.index[-1].strftime("%Y-%m-%d")
+        }
+    return results
+
+
+async def fetch_and_cache(symbol):
+    result = None
+    if STOCK_USE_YFINANCE:
+        try:
+            result = (await asyncio.to_thread(download_quotes, [symbol])).get(symbol)
+        except Exception as e:
+            logger.warning(f"yfinance下载 {symbol} 失败，改用Alpha Vantage: {e}")
+    if result is None:
+        result = await fetch_quote(symbol)
+    quote_cache.set(symbol, result, QUOTE_MAX_AGE)
+    return result
+
+
+async def get_quote(symbol):
+    """缓存 -> 合并并发查询 -> 上游，返回一只股票的报价"""
+    result = quote_cache.get(symbol)
+    if result is MISSING:
+        result = await quote_calls.do(symbol, fetch_and_cache, symbol)
+    return result
+
+
 @mcp.tool()
-def get_stock_price(input_query: str) -> dict:
+async def get_stock_price(input_query: str) -> dict:
     """
     获取股票实时价格。当您需要查询股票的当前价格时，可以使用这个工具。
     input_query为股票代码（例如：AAPL代表苹果公司）。
     """
     try:
         logger.info(f"收到股票查询请求: {input_query}")
-        
-        # 使用Alpha Vantage API获取股票数据
-        api_key = os.getenv("ALPHAVANTAGE_API_KEY")
-        if not api_key or api_key == "your_api_key_here":
-            return {"success": False, "error": "未配置有效的Alpha Vantage API密钥"}
-        
-        url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={input_query}&apikey={api_key}"
-        response = requests.get(url)
-        data = response.json()
-        
-        if "Global Quote" in data:
-            quote = data["Global Quote"]
-            return {
-                "success": True,
-                "result": {
-                    "symbol": input_query,
-                    "price": quote["05. price"],
-                    "highest": quote["06. high"],
-                    "lowest": quote["07. low"],
-                    "volume": quote["08. volume"],
-                    "time": quote["07. latest trading day"]  # 使用最新的交易日作为时间
-                }
-            }
-        else:
-            return {"success": False, "error": "无法获取股票数据或股票代码无效"}
-            
+        return {"success": True, "result": await get_quote(normalize_symbol(input_query))}
+    except QuoteError as e:
+        return {"success": False, "error": str(e)}
     except Exception as e:
         logger.error(f"处理股票查询请求时出错: {str(e)}")
         return {"success": False, "error": str(e)}
 
+@mcp.tool()
+async def get_stock_prices(symbols: List[str]) -> dict:
+    """
+    批量获取多只股票的实时价格。需要同时查询多只股票时使用这个工具，比逐个调用get_stock_price更快。
+    symbols为股票代码列表（例如：["AAPL", "MSFT", "TSLA"]）。
+    """
+    wanted = list(dict.fromkeys(normalize_symbol(s) for s in symbols if s.strip()))
+    if not wanted:
+        return {"success": False, "error": "股票代码列表不能为空"}
+    if len(wanted) > MAX_BATCH_SYMBOLS:
+        return {"success": False, "error": f"一次最多查询{MAX_BATCH_SYMBOLS}只股票"}
+    logger.info(f"收到批量股票查询请求: {wanted}")
+
+    results, errors = {}, {}
+    missing = []
+    for symbol in wanted:
+        cached = quote_cache.get(symbol)
+        if cached is MISSING:
+            missing.append(symbol)
+        else:
+            results[symbol] = cached
+
+    # 启用yfinance时，未缓存的股票一次批量下载
+    if missing and STOCK_USE_YFINANCE:
+        try:
+            downloaded = await asyncio.to_thread(download_quotes, missing)
+        except Exception as e:
+            logger.warning(f"yfinance批量下载失败，改用Alpha Vantage: {e}")
+            downloaded = {}
+        for symbol, result in downloaded.items():
+            quote_cache.set(symbol, result, QUOTE_MAX_AGE)
+            results[symbol] = result
+        missing = [symbol for symbol in missing if symbol not in downloaded]
+
+    # 其余的逐只向Alpha Vantage查询，超出限流的请求排队等待
+    outcomes = await asyncio.gather(*[quote_calls.do(symbol, fetch_and_cache, symbol) for symbol in missing],
+                                    return_exceptions=True)
+    for symbol, outcome in zip(missing, outcomes):
+        if isinstance(outcome, Exception):
+            logger.error(f"查询股票 {symbol} 出错: {outcome}")
+            errors[symbol] = str(outcome)
+        else:
+            results[symbol] = outcome
+
+    return {
+        "success": bool(results),
+        "results": [results[symbol] for symbol in wanted if symbol in results],
+        "errors": errors
+    }
+
 # Start the server
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
\ No newline at end of file
+    mcp.run(transport="stdio")
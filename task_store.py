@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Bounded in-memory task store for background searches
+
+Tasks are compact `__slots__` records held in three indexes: all tasks by
+id, the active (queued/processing) tasks, and the finished tasks in finish
+order. Finished tasks expire from the front of that order in O(1) each, so
+there is no periodic full scan, and the store refuses new tasks instead of
+growing past `capacity` when every slot is active.
+
+The store lock only guards those indexes for O(1) updates; a task's fields
+are guarded by one of `stripes` locks picked by task id, so status reads
+for one task never wait on workers updating another.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+ACTIVE_STATUSES = ("queued", "processing")
+
+
+class TaskStoreFull(Exception):
+    """Every slot of the store holds an active task"""
+
+
+class Task:
+    __slots__ = ("task_id", "question", "priority", "status", "start_time", "finish_time",
+                 "result", "error", "message", "duration", "done")
+
+    def __init__(self, task_id, question, priority="interactive", done=None):
+        self.task_id = task_id
+        self.question = question
+        self.priority = priority
+        self.status = "queued"
+        self.start_time = time.time()
+        self.finish_time = None
+        self.result = None
+        self.error = None
+        self.message = ""
+        self.duration = None
+        self.done = done  # concurrent.futures.Future resolved when the task finishes
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != "done"}
+
+
+class TaskStore:
+    def __init__(self, capacity=10000, ttl=86400, stripes=16):
+        self.capacity = capacity
+        self.ttl = ttl  # Seconds a finished task is kept for get_search_results
+        self.tasks = {}  # task_id -> Task
+        self.active = {}  # task_id -> Task, queued or processing, in start order
+        self.finished = OrderedDict()  # task_id -> finish time, oldest first
+        self.lock = threading.Lock()
+        self.stripes = [threading.Lock() for _ in range(stripes)]
+        self.expired = 0
+        self.rejected = 0
+
+    def task_lock(self, task_id):
+        return self.stripes[hash(task_id) % len(self.stripes)]
+
+    def add(self, task):
+        """Store a new queued task, dropping expired and (when full) the oldest finished tasks"""
+        with self.lock:
+            self.expire(time.time())
+            while len(self.tasks) >= self.capacity and self.finished:
+                self.drop(next(iter(self.finished)))
+            if len(self.tasks) >= self.capacity:
+                self.rejected += 1
+                raise TaskStoreFull(f"{len(self.active)} search tasks in progress")
+            self.tasks[task.task_id] = task
+            self.active[task.task_id] = task
+
+    def get(self, task_id):
+        return self.tasks.get(task_id)
+
+    def snapshot(self, task_id):
+        """A consistent dict copy of the task's fields, or None"""
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        with self.task_lock(task_id):
+            return task.to_dict()
+
+    def start(self, task):
+        """Mark a queued task as processing, False if it was canceled meanwhile"""
+        with self.task_lock(task.task_id):
+            if task.status != "queued":
+                return False
+            task.status = "processing"
+            return True
+
+    def finish(self, task, status, **fields):
+        """Move an active task to `status` with `fields`, False if it had already finished"""
+        now = time.time()
+        with self.task_lock(task.task_id):
+            if task.status not in ACTIVE_STATUSES:
+                return False
+            for name, value in fields.items():
+                setattr(task, name, value)
+            task.status = status
+            task.finish_time = now
+        with self.lock:
+            self.active.pop(task.task_id, None)
+            if task.task_id in self.tasks:
+                self.finished[task.task_id] = time.time()  # Taken under the lock so the order stays sorted
+        return True
+
+    def active_tasks(self):
+        """Snapshots of the queued and processing tasks"""
+        with self.lock:
+            tasks = list(self.active.values())
+        snapshots = []
+        for task in tasks:
+            with self.task_lock(task.task_id):
+                snapshots.append(task.to_dict())
+        return snapshots
+
+    def expire(self, now):
+        """Drop finished tasks older than ttl, the store lock must be held"""
+        cutoff = now - self.ttl
+        while self.finished:
+            task_id, finished_at = next(iter(self.finished.items()))
+            if finished_at >= cutoff:
+                break
+            self.drop(task_id)
+            self.expired += 1
+
+    def drop(self, task_id):
+        self.finished.pop(task_id, None)
+        self.tasks.pop(task_id, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "tasks": len(self.tasks),
+                "active": len(self.active),
+                "capacity": self.capacity,
+                "expired": self.expired,
+                "rejected": self.rejected,
+            }
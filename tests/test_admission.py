@@ -0,0 +1,106 @@
+import asyncio
+
+import mcp_pipe
+from mcp_pipe import Admission
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_calls_over_the_cap_wait_and_are_admitted_in_order():
+    async def scenario():
+        admission = Admission(1, 0, {}, 4, 0)
+        assert admission.admit('1', 'geocode')
+        assert not admission.admit('2', 'geocode')
+        second = admission.enqueue('2', 'geocode')
+        third = admission.enqueue('3', 'geocode')
+        admission.release('1')
+        assert second.result() is True
+        assert not third.done()
+        assert list(admission.in_flight) == ['2']
+        assert admission.queued['geocode'] == 1
+    run(scenario())
+
+
+def test_per_tool_limits_only_hold_back_that_tool():
+    async def scenario():
+        admission = Admission(0, 1, {'search_knowledge': 2}, 4, 0)
+        assert admission.admit('1', 'geocode')
+        assert not admission.admit('2', 'geocode')
+        assert admission.admit('3', 'search_knowledge')
+        assert admission.admit('4', 'search_knowledge')
+        assert not admission.admit('5', 'search_knowledge')
+    run(scenario())
+
+
+def test_full_queue_sheds():
+    async def scenario():
+        admission = Admission(1, 0, {}, 1, 0)
+        admission.admit('1', 'geocode')
+        assert admission.enqueue('2', 'geocode') is not None
+        assert admission.enqueue('3', 'geocode') is None
+    run(scenario())
+
+
+def test_queued_call_gives_up_after_the_queue_timeout():
+    async def scenario():
+        admission = Admission(1, 0, {}, 4, 0.01)
+        admission.admit('1', 'geocode')
+        admitted = admission.enqueue('2', 'geocode')
+        assert await admitted is False
+        assert not admission.waiting
+        assert admission.queued['geocode'] == 0
+    run(scenario())
+
+
+def test_cancelled_queued_call_leaves_the_queue():
+    async def scenario():
+        admission = Admission(1, 0, {}, 4, 0)
+        admission.admit('1', 'geocode')
+        cancelled = admission.enqueue('2', 'geocode')
+        waiting = admission.enqueue('3', 'geocode')
+        admission.cancel('2')
+        assert cancelled.result() is None
+        assert [entry[0] for entry in admission.waiting] == ['3']
+        assert admission.queued['geocode'] == 1
+        admission.release('1')
+        assert waiting.result() is True
+        assert '2' not in admission.in_flight
+    run(scenario())
+
+
+def test_cancelled_call_in_flight_keeps_its_slot_until_answered():
+    async def scenario():
+        admission = Admission(1, 0, {}, 4, 0)
+        admission.admit('1', 'geocode')
+        waiting = admission.enqueue('2', 'geocode')
+        admission.cancel('1')
+        assert '1' in admission.in_flight
+        assert not waiting.done()
+        admission.release('1')  # The child's answer to the cancelled call
+        assert waiting.result() is True
+    run(scenario())
+
+
+def test_expired_lease_frees_the_slot():
+    async def scenario():
+        admission = Admission(1, 0, {}, 4, 0)
+        admission.admit('1', 'geocode')
+        admission.in_flight['1'][2] -= mcp_pipe.ADMISSION_LEASE + 1
+        assert admission.admit('2', 'geocode')
+        assert list(admission.in_flight) == ['2']
+    run(scenario())
+
+
+def test_release_process_frees_the_calls_written_to_it():
+    async def scenario():
+        admission = Admission(0, 0, {}, 4, 0)
+        crashed, alive = object(), object()
+        for key, process in (('1', crashed), ('2', alive), ('3', crashed)):
+            admission.admit(key, 'geocode')
+            admission.bind(key, process)
+        assert admission.release_process(crashed) == ['1', '3']
+        assert list(admission.in_flight) == ['2']
+        assert admission.running['geocode'] == 1
+    run(scenario())
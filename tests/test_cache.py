@@ -0,0 +1,87 @@
+import sqlite3
+import threading
+import time
+
+from cache import MISSING, TTLCache, make_key
+
+
+class RecordingDB:
+    """sqlite3 connection stand-in that records the calling threads and can fail like a locked file"""
+
+    def __init__(self, db, fail=False):
+        self.db = db
+        self.fail = fail
+        self.threads = set()
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.threads.add(threading.current_thread())
+        self.statements.append(sql)
+        if self.fail and sql not in ('BEGIN', 'ROLLBACK'):
+            raise sqlite3.OperationalError("database is locked")
+        return self.db.execute(sql, params)
+
+
+def test_entries_expire_and_the_least_recently_used_are_evicted():
+    cache = TTLCache("test", maxsize=2)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)
+    cache.get("a")
+    cache.set("c", 3, 60)
+    assert cache.get("b") is MISSING
+    cache.set("d", 4, -1)
+    assert cache.get("d") is MISSING
+    assert cache.stats()["evictions"] == 2
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = TTLCache("test", maxsize=2, path=path)
+    for key in ("a", "b", "c"):
+        cache.set(key, {"value": key}, 60)
+    cache.flush()
+    reloaded = TTLCache("test", maxsize=2, path=path)
+    assert reloaded.get("a") is MISSING
+    assert reloaded.get("c") == {"value": "c"}
+    cache.clear()
+    cache.flush()
+    assert TTLCache("test", path=path).stats()["size"] == 0
+
+
+def test_cache_file_is_written_off_the_calling_thread(tmp_path):
+    cache = TTLCache("test", maxsize=1, path=str(tmp_path / "cache.db"))
+    cache.db = RecordingDB(cache.db)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)  # Evicts "a"
+    deadline = time.monotonic() + 5
+    while cache.writing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.db.threads and threading.current_thread() not in cache.db.threads
+    assert 'DELETE FROM cache WHERE key = ?' in cache.db.statements
+
+
+def test_set_does_not_block_on_the_cache_file(tmp_path):
+    cache = TTLCache("test", maxsize=1, path=str(tmp_path / "cache.db"))
+    cache.db = RecordingDB(cache.db)
+    with cache.db_lock:  # A slow write in progress
+        cache.set("a", 1, 60)
+        cache.set("b", 2, 60)
+        assert cache.db.statements == []
+        assert cache.get("b") == 2
+    cache.flush()
+    assert cache.db.statements
+
+
+def test_locked_cache_file_does_not_fail_set_or_eviction(tmp_path):
+    cache = TTLCache("test", maxsize=1, path=str(tmp_path / "cache.db"))
+    cache.db = RecordingDB(cache.db, fail=True)
+    cache.set("a", 1, 60)
+    cache.set("b", 2, 60)  # The eviction's DELETE fails too
+    cache.clear()
+    cache.flush()
+    assert cache.get("b") is MISSING
+    assert not cache.pending
+
+
+def test_equivalent_params_share_a_key():
+    assert make_key("geocode", {"address": "  北京 天安门 ", "city": ""}) == make_key("geocode", {"address": "北京 天安门"})
@@ -0,0 +1,154 @@
+import asyncio
+import os
+import struct
+import types
+
+import pytest
+
+music = pytest.importorskip("music")
+
+
+class FakeWebSocket:
+    def __init__(self, song):
+        self.request = types.SimpleNamespace(path=f"/?song={song}")
+        self.sent = []
+        self.closed = None
+
+    async def send(self, packet):
+        self.sent.append(packet)
+
+    async def close(self, code=1000, reason=''):
+        self.closed = (code, reason)
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(music, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(music, "PREBUFFER_FRAMES", 1000)  # Send without pacing
+    return tmp_path
+
+
+def play(song):
+    websocket = FakeWebSocket(song)
+    asyncio.run(music.handle_stream(websocket))
+    return websocket
+
+
+def test_cached_song_is_played_from_disk(cache_dir, monkeypatch):
+    path = music.cache_path(music.song_key("好运来"))
+    with open(path, 'wb') as f:
+        for packet in (b'one', b'two'):
+            f.write(struct.pack('>H', len(packet)) + packet)
+    monkeypatch.setattr(music, "resolve_music_url", None)  # Must not be called
+    websocket = play("好运来")
+    assert websocket.sent == [b'one', b'two']
+    assert websocket.closed == (1000, '')
+
+
+def test_evicted_cache_file_is_downloaded_again(cache_dir, monkeypatch):
+    downloaded = []
+    load_cached = music.load_cached
+
+    def evicted_first(path):
+        os.remove(path)  # Evicted by another connection just before this one reads it
+        return load_cached(path)
+
+    path = music.cache_path(music.song_key("好运来"))
+    with open(path, 'wb') as f:
+        f.write(struct.pack('>H', 3) + b'old')
+    monkeypatch.setattr(music, "load_cached", evicted_first)
+
+    async def resolve(song_name):
+        return "http://music.example/song.mp3"
+
+    async def stream_and_cache(websocket, music_url, path):
+        downloaded.append(music_url)
+        await websocket.send(b'fresh')
+        return 1
+
+    monkeypatch.setattr(music, "resolve_music_url", resolve)
+    monkeypatch.setattr(music, "stream_and_cache", stream_and_cache)
+    websocket = play("好运来")
+    assert downloaded == ["http://music.example/song.mp3"]
+    assert websocket.closed == (1000, '')
+
+
+def test_missing_ffmpeg_is_reported(cache_dir, monkeypatch):
+    async def resolve(song_name):
+        return "http://music.example/song.mp3"
+
+    monkeypatch.setattr(music, "resolve_music_url", resolve)
+    monkeypatch.setattr(music, "FFMPEG", os.path.join(str(cache_dir), "no-such-ffmpeg"))
+    assert play("好运来").closed == (1011, 'ffmpeg not found')
+
+
+def test_other_missing_files_are_not_blamed_on_ffmpeg(cache_dir, monkeypatch):
+    async def resolve(song_name):
+        raise FileNotFoundError("somewhere else")
+
+    monkeypatch.setattr(music, "resolve_music_url", resolve)
+    assert play("好运来").closed == (1011, 'stream failed')
+
+
+def test_cache_limit_skips_files_removed_meanwhile(cache_dir, monkeypatch):
+    for name in ("a.opus", "b.opus"):
+        (cache_dir / name).write_bytes(b'x' * 10)
+    monkeypatch.setattr(music, "CACHE_MAX_BYTES", 0)
+    remove = os.remove
+
+    def remove_twice(path):
+        remove(path)
+        remove(path)  # As if another connection evicted it first
+
+    monkeypatch.setattr(music.os, "remove", remove_twice)
+    music.enforce_cache_limit()
+    assert os.listdir(cache_dir) == []
+
+
+class FakeProcess:
+    def __init__(self, returncode):
+        self.final = returncode
+        self.returncode = None
+        self.stdin = None
+        self.stdout = None
+
+    async def wait(self):
+        self.returncode = self.final
+        return self.final
+
+    def kill(self):
+        pass
+
+
+def fake_ffmpeg(monkeypatch, returncode, packets):
+    async def create_subprocess_exec(*args, **kwargs):
+        return FakeProcess(returncode)
+
+    async def download_to(stdin, music_url):
+        pass
+
+    async def read_ogg_packets(stdout):
+        for packet in packets:
+            yield packet
+
+    monkeypatch.setattr(music.asyncio, "create_subprocess_exec", create_subprocess_exec)
+    monkeypatch.setattr(music, "download_to", download_to)
+    monkeypatch.setattr(music, "read_ogg_packets", read_ogg_packets)
+
+
+def test_complete_transcode_is_cached(cache_dir, monkeypatch):
+    fake_ffmpeg(monkeypatch, 0, [b'one', b'two'])
+    path = music.cache_path("song")
+    frames = asyncio.run(music.stream_and_cache(FakeWebSocket("song"), "http://music.example/song.mp3", path))
+    assert frames == 2
+    assert music.load_cached(path) == struct.pack('>H', 3) + b'one' + struct.pack('>H', 3) + b'two'
+
+
+def test_failed_transcode_is_not_cached(cache_dir, monkeypatch):
+    fake_ffmpeg(monkeypatch, 1, [b'one'])  # ffmpeg died after the first frame
+    path = music.cache_path("song")
+    websocket = FakeWebSocket("song")
+    with pytest.raises(music.TranscodeError):
+        asyncio.run(music.stream_and_cache(websocket, "http://music.example/song.mp3", path))
+    assert websocket.sent == [b'one']
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+
+import pytest
+
+import poi_index
+from poi_index import POIIndex, address_key
+
+
+def place(n, city="北京市", adcode="110101"):
+    return {"id": f"B{n:04d}", "name": f"咖啡馆{n}", "location": f"116.{400 + n:03d},39.900",
+            "province": city, "city": city, "adcode": adcode}
+
+
+def counts(index):
+    stats = index.stats()
+    return stats["snapshot"], stats["learned"]
+
+
+def wait_compacted(index):
+    deadline = time.monotonic() + 5
+    while index.compacting and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not index.compacting
+
+
+def test_geocode_with_city_ignores_places_elsewhere():
+    index = POIIndex()
+    index.add(place(1), "中山路1号")
+    assert index.geocode("中山路1号", "北京")["id"] == "B0001"
+    assert index.geocode("中山路1号", "上海") is None
+    assert index.geocode("中山路1号", "310000") is None
+    assert index.geocode("中山路1号")["id"] == "B0001"
+
+
+def test_geocode_for_a_city_prefers_the_exact_key():
+    index = POIIndex()
+    index.add(place(1), "中山路1号")
+    index.add(place(2, "上海市", "310101"), "中山路1号", "上海")
+    assert index.geocode("中山路1号", "上海")["id"] == "B0002"
+    assert index.geocode("中山路1号", "北京")["id"] == "B0001"
+
+
+def test_learned_geocodes_expire_but_imported_places_do_not(monkeypatch):
+    index = POIIndex(geocode_ttl=60)
+    index.add(place(1), "中山路1号")
+    index.insert({**place(2), "source": "import"}, [address_key("家")])
+    later = time.time() + 61
+    monkeypatch.setattr(poi_index.time, "time", lambda: later)
+    assert index.geocode("中山路1号") is None
+    assert index.geocode("家")["id"] == "B0002"
+
+
+def test_tips_without_location_or_city_report_nothing_nearby():
+    index = POIIndex()
+    for n in range(6):
+        index.add(place(n))
+    places, nearby = index.tips("咖啡馆")
+    assert len(places) == 6 and nearby == 0
+    assert index.tips("咖啡馆", city="北京")[1] == 6
+    assert index.tips("咖啡馆", location="116.402,39.900")[1] == 6
+
+
+def test_compaction_moves_learned_places_into_the_snapshot(tmp_path):
+    path = str(tmp_path / "pois.idx")
+    index = POIIndex(path, journal_limit=3)
+    for n in range(3):
+        index.add(place(n), f"路{n}号", "北京")
+    wait_compacted(index)
+    assert counts(index) == (3, 0)
+    assert not os.path.exists(f"{path}.journal.compacting")
+    assert not os.path.exists(f"{path}.tmp")
+    index.add(place(3), "路3号", "北京")
+    index.flush()
+
+    reopened = POIIndex(path)
+    assert counts(reopened) == (3, 1)
+    assert [reopened.geocode(f"路{n}号", "北京")["id"] for n in range(4)] == ["B0000", "B0001", "B0002", "B0003"]
+
+
+def test_failed_compaction_keeps_the_old_snapshot_and_journal(tmp_path, monkeypatch):
+    path = str(tmp_path / "pois.idx")
+    index = POIIndex(path, journal_limit=2)
+    for n in range(2):
+        index.add(place(n), f"路{n}号", "北京")
+    wait_compacted(index)
+
+    def disk_full(path, records):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(poi_index, "write_snapshot", disk_full)
+    for n in range(2, 4):
+        index.add(place(n), f"路{n}号", "北京")
+    wait_compacted(index)
+    assert counts(index) == (2, 2)
+    assert index.journaled == 2
+    assert not os.path.exists(f"{path}.journal.compacting")
+    assert [index.geocode(f"路{n}号", "北京")["id"] for n in range(4)] == ["B0000", "B0001", "B0002", "B0003"]
+    assert counts(POIIndex(path)) == (2, 2)
+
+
+def test_places_learned_during_compaction_stay_in_the_overlay(tmp_path, monkeypatch):
+    path = str(tmp_path / "pois.idx")
+    index = POIIndex(path, journal_limit=100)
+    index.add(place(0), "路0号", "北京")
+    write_snapshot = poi_index.write_snapshot
+
+    def slow_write(path, records):
+        index.add(place(1), "路1号", "北京")  # Learned while the snapshot is being written
+        write_snapshot(path, records)
+
+    monkeypatch.setattr(poi_index, "write_snapshot", slow_write)
+    index.compact()
+    assert counts(index) == (1, 1)
+    assert index.geocode("路1号", "北京")["id"] == "B0001"
+    index.flush()
+    assert counts(POIIndex(path)) == (1, 1)
+
+
+def test_replay_reads_an_unfinished_compaction_journal(tmp_path):
+    path = str(tmp_path / "pois.idx")
+    index = POIIndex(path, journal_limit=100)
+    index.add(place(0), "路0号", "北京")
+    index.flush()
+    os.replace(f"{path}.journal", f"{path}.journal.compacting")
+    index.add(place(1), "路1号", "北京")
+    index.flush()
+    reopened = POIIndex(path)
+    assert counts(reopened) == (0, 2)
+    assert reopened.geocode("路0号", "北京")["id"] == "B0000"
+
+
+def test_in_memory_index_evicts_the_least_recently_used_places():
+    index = POIIndex(max_learned=3)
+    for n in range(3):
+        index.add(place(n), f"路{n}号", "北京")
+    assert index.geocode("路0号", "北京") is not None  # Used again, so B0001 is now the oldest
+    index.add(place(3), "路3号", "北京")
+    assert counts(index) == (0, 3)
+    assert index.stats()["evicted"] == 1
+    assert index.geocode("路1号", "北京") is None
+    assert {record["id"] for record in index.tips("咖啡馆", city="北京")[0]} == {"B0000", "B0002", "B0003"}
+    assert index.trie_prefix("咖啡馆1", 10) == set()
+    assert all(uid in index.records for cell in index.cells.values() for uid in cell)
+
+
+def test_expired_places_leave_the_in_memory_index(monkeypatch):
+    index = POIIndex(geocode_ttl=60)
+    index.add(place(1), "中山路1号")
+    later = time.time() + 61
+    monkeypatch.setattr(poi_index.time, "time", lambda: later)
+    assert index.geocode("中山路1号") is None
+    assert counts(index) == (0, 0)
+
+
+def test_relearned_place_is_indexed_under_its_new_name_only():
+    index = POIIndex()
+    index.add(place(1))
+    index.add({**place(1), "name": "书店"})
+    assert index.tips("咖啡馆", city="北京") == ([], 0)
+    assert [record["name"] for record in index.tips("书店", city="北京")[0]] == ["书店"]
+
+
+def test_journal_is_written_off_the_calling_thread(tmp_path, monkeypatch):
+    path = str(tmp_path / "pois.idx")
+    index = POIIndex(path, journal_limit=100)
+    callers = []
+    write_journal = index.write_journal
+
+    def record_thread():
+        callers.append(threading.current_thread())
+        write_journal()
+
+    monkeypatch.setattr(index, "write_journal", record_thread)
+    for n in range(5):
+        index.add(place(n), f"路{n}号", "北京")
+    index.flush()
+    assert callers and threading.current_thread() not in callers
+    with open(f"{path}.journal", encoding="utf-8") as f:
+        assert len(f.readlines()) == 5
+
+
+@pytest.mark.parametrize("keywords", ["", "  "])
+def test_tips_need_keywords(keywords):
+    assert POIIndex().tips(keywords, city="北京") == ([], 0)
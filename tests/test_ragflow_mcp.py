@@ -0,0 +1,143 @@
+import asyncio
+import importlib.util
+import os
+
+import pytest
+
+ragflow_mcp = pytest.importorskip("ragflow_mcp")
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    ragflow_mcp.invalidate_cache("test")
+    yield
+    ragflow_mcp.invalidate_cache("test")
+
+
+def complete_with(monkeypatch, before_finish):
+    """Make the scheduler finish every search at once, calling `before_finish()` while it runs"""
+    def submit(task_id, priority, fn, task):
+        async def run():
+            before_finish()
+            ragflow_mcp.search_tasks.finish(task, "completed", result=[{"content": "answer"}], message="",
+                                            duration=0.1)
+            ragflow_mcp.notify_done(task)
+        asyncio.get_running_loop().create_task(run())
+    monkeypatch.setattr(ragflow_mcp.search_scheduler, "submit", submit)
+
+
+def test_results_are_cached(monkeypatch):
+    complete_with(monkeypatch, lambda: None)
+    result = asyncio.run(ragflow_mcp.run_search("what is xiaozhi"))
+    assert result["success"]
+    assert ragflow_mcp.lookup_cache("What is XiaoZhi?")["cached"] == "exact"
+
+
+def test_result_retrieved_across_an_invalidation_is_not_cached(monkeypatch):
+    complete_with(monkeypatch, lambda: ragflow_mcp.invalidate_cache("dataset changed"))
+    result = asyncio.run(ragflow_mcp.run_search("what is xiaozhi"))
+    assert result["success"]  # The caller still gets its answer
+    assert ragflow_mcp.lookup_cache("what is xiaozhi") is None
+
+
+def load_batching_module(monkeypatch, url):
+    """A fresh ragflow_mcp with the experimental batch retrieval switched on against `url`"""
+    monkeypatch.setenv("RAGFLOW_API_URL", f"{url}/api/v1/retrieval")
+    monkeypatch.setenv("RAGFLOW_BATCH_URL", f"{url}/api/v1/retrieval/batch")
+    monkeypatch.setenv("RAGFLOW_BATCH_WINDOW_MS", "50")
+    spec = importlib.util.spec_from_file_location("ragflow_mcp_batching", ragflow_mcp.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_experimental_batch_retrieval_against_the_stub(monkeypatch):
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+    from stubs import RAGFLOW_ROUTES, StubServer, ragflow_batch_retrieval
+
+    batches = []
+
+    def batch(request):
+        batches.append(request["questions"])
+        return ragflow_batch_retrieval(request)
+
+    with StubServer({**RAGFLOW_ROUTES, "/api/v1/retrieval/batch": batch}) as stub:
+        module = load_batching_module(monkeypatch, stub.url)
+        assert module.search_batcher is not None
+        questions = [f"question {i}" for i in range(3)]
+
+        async def scenario():
+            try:
+                return await asyncio.gather(*[module.run_search(question) for question in questions])
+            finally:
+                await module.http_client.close_sessions()
+
+        results = asyncio.run(scenario())
+    assert batches == [questions]  # One request for the three concurrent searches
+    for question, result in zip(questions, results):
+        assert result["success"]
+        assert all(question in chunk["content_ltks"] for chunk in result["results"])  # In order
+
+
+def test_same_question_is_coalesced_per_priority(monkeypatch):
+    submitted = []
+
+    def submit(task_id, priority, fn, task):
+        submitted.append(priority)
+
+        async def run():
+            await asyncio.sleep(0.01)
+            ragflow_mcp.search_tasks.finish(task, "completed", result=[], message="", duration=0.01)
+            ragflow_mcp.notify_done(task)
+        asyncio.get_running_loop().create_task(run())
+
+    monkeypatch.setattr(ragflow_mcp.search_scheduler, "submit", submit)
+    monkeypatch.setattr(ragflow_mcp, "schedule_dataset_check", lambda: None)
+
+    async def scenario():
+        return await asyncio.gather(ragflow_mcp.start_search.fn("same question", "bulk"),
+                                    ragflow_mcp.start_search.fn("same question", "bulk"),
+                                    ragflow_mcp.start_search.fn("same question", "interactive"))
+
+    results = asyncio.run(scenario())
+    assert all(result["success"] for result in results)
+    assert sorted(submitted) == sorted([ragflow_mcp.PRIORITIES["bulk"], ragflow_mcp.PRIORITIES["interactive"]])
+
+
+def test_active_tasks_report_their_priority(monkeypatch):
+    monkeypatch.setattr(ragflow_mcp.search_scheduler, "submit", lambda *args: None)
+
+    async def scenario():
+        search = asyncio.ensure_future(ragflow_mcp.run_search("pending question", "bulk"))
+        await asyncio.sleep(0)
+        tasks = ragflow_mcp.get_active_tasks.fn()["active_tasks"]
+        for task in tasks:
+            await ragflow_mcp.cancel_search.fn(task["task_id"])
+        await search
+        return tasks
+
+    tasks = asyncio.run(scenario())
+    assert [task["priority"] for task in tasks] == ["bulk"]
+
+
+def cache_answer(question, answer, ttl):
+    key = ragflow_mcp.cache_key(question)
+    ragflow_mcp.result_cache.set(key, {"results": [{"content": answer}], "message": "", "duration": 1.0}, ttl)
+    ragflow_mcp.question_index.add(key, ragflow_mcp.normalize_question(question))
+
+
+def test_near_duplicate_falls_back_past_an_expired_candidate(monkeypatch):
+    monkeypatch.setattr(ragflow_mcp, "question_index", ragflow_mcp.MinHashIndex(threshold=0.5))
+    cache_answer("how do i reset the xiaozhi speaker to factory settings now", "stale", -1)
+    cache_answer("how do i reset the xiaozhi speaker to factory settings", "fresh", 60)
+    question = "how do i reset the xiaozhi speaker to factory settings now please"
+    matches = ragflow_mcp.question_index.matches(ragflow_mcp.normalize_question(question))
+    assert len(matches) == 2 and matches[0][1] > matches[1][1]  # The expired answer is the closer one
+
+    before = ragflow_mcp.result_cache.stats()
+    result = ragflow_mcp.lookup_cache(question)
+    after = ragflow_mcp.result_cache.stats()
+    assert result["cached"] == "near"
+    assert result["results"] == [{"content": "fresh"}]
+    assert (after["hits"] - before["hits"], after["misses"] - before["misses"]) == (0, 1)  # One lookup, counted once
+    assert len(ragflow_mcp.question_index.matches(ragflow_mcp.normalize_question(question))) == 1
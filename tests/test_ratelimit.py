@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from ratelimit import RateLimited, TokenBucket
+
+
+@pytest.mark.parametrize("rate, capacity", [(0, 5), (-1, 5), (1, 0)])
+def test_invalid_settings_are_refused(rate, capacity):
+    with pytest.raises(ValueError):
+        TokenBucket("test", rate=rate, capacity=capacity)
+
+
+def test_callers_queue_behind_each_other():
+    async def scenario():
+        bucket = TokenBucket("test", rate=50, capacity=1)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        done = []
+
+        async def call(n):
+            await bucket.acquire()
+            done.append((n, loop.time() - start))
+
+        await asyncio.gather(*[call(n) for n in range(3)])
+        assert [n for n, _ in done] == [0, 1, 2]
+        assert done[2][1] >= 0.035  # Two refills of 20ms each
+        assert bucket.waited == 2
+    asyncio.run(scenario())
+
+
+def test_max_wait_refuses_callers_whose_token_comes_too_late():
+    async def scenario():
+        bucket = TokenBucket("test", rate=1, capacity=1)
+        await bucket.acquire(max_wait=0)
+        with pytest.raises(RateLimited) as raised:
+            await bucket.acquire(max_wait=0.5)
+        assert 0.5 < raised.value.retry_after <= 1
+        assert bucket.rejected == 1
+        assert bucket.tokens < 1 and bucket.tokens > -0.1  # The refused call reserved nothing
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_gives_its_token_back():
+    async def scenario():
+        bucket = TokenBucket("test", rate=1, capacity=1)
+        await bucket.acquire()
+        waiter = asyncio.ensure_future(bucket.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert bucket.tokens > -0.1
+    asyncio.run(scenario())
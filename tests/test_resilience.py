@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, Upstream, UpstreamTimeout, UpstreamUnavailable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("amap", failures=3, reset_after=10)
+    for _ in range(2):
+        assert breaker.acquire() is False
+        breaker.failure()
+    assert breaker.state == "closed"
+    breaker.success()  # A success resets the count
+    for _ in range(3):
+        breaker.acquire()
+        breaker.failure()
+    assert breaker.state == "open"
+    with pytest.raises(UpstreamUnavailable):
+        breaker.acquire()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_breaker_lets_one_probe_through_after_reset(clock):
+    breaker = CircuitBreaker("amap", failures=1, reset_after=10)
+    breaker.failure()
+    clock.now += 10
+    assert breaker.acquire() is True
+    assert breaker.state == "half_open"
+    with pytest.raises(UpstreamUnavailable):
+        breaker.acquire()  # Only one probe at a time
+    breaker.success()
+    assert breaker.state == "closed"
+    assert breaker.acquire() is False
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker("amap", failures=1, reset_after=10)
+    breaker.failure()
+    clock.now += 10
+    breaker.acquire()
+    breaker.probing = False
+    breaker.failure()
+    assert breaker.state == "open"
+    assert breaker.stats()["opened"] == 2
+    clock.now += 5
+    with pytest.raises(UpstreamUnavailable):
+        breaker.acquire()
+
+
+class Answer(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def test_upstream_counts_only_unhealthy_errors_as_failures():
+    async def scenario():
+        upstream = Upstream("amap", CircuitBreaker("amap", failures=2), max_timeout=0.05)
+
+        async def fail(error):
+            raise error
+
+        async def hang():
+            await asyncio.sleep(1)
+
+        with pytest.raises(Answer):
+            await upstream.call(fail, Answer(404))
+        assert upstream.breaker.consecutive == 0
+        with pytest.raises(Answer):
+            await upstream.call(fail, Answer(503))
+        with pytest.raises(UpstreamTimeout):
+            await upstream.call(hang)
+        assert upstream.breaker.state == "open"
+        with pytest.raises(UpstreamUnavailable):
+            await upstream.call(fail, Answer(404))
+    asyncio.run(scenario())
+
+
+def test_check_does_not_take_the_probe(clock):
+    breaker = CircuitBreaker("alphavantage", failures=1, reset_after=10)
+    breaker.check()
+    breaker.failure()
+    with pytest.raises(UpstreamUnavailable):
+        breaker.check()
+    clock.now += 10
+    breaker.check()
+    assert breaker.state == "open" and not breaker.probing
+    assert breaker.acquire() is True
@@ -0,0 +1,75 @@
+import asyncio
+import types
+
+import pytest
+
+import ratelimit
+
+stock_query = pytest.importorskip("stock_query")
+
+
+class Clock:
+    """Fake monotonic clock that asyncio.sleep() in ratelimit advances instantly"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.advance = True
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.slept.append(seconds)
+        if self.advance:
+            self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ratelimit, "asyncio", types.SimpleNamespace(sleep=clock.sleep,
+                                                                    CancelledError=asyncio.CancelledError))
+    return clock
+
+
+def test_default_max_wait_covers_at_least_one_token_interval():
+    assert stock_query.ALPHAVANTAGE_MAX_WAIT >= 60 / stock_query.ALPHAVANTAGE_RATE_PER_MIN
+
+
+def default_bucket():
+    return ratelimit.TokenBucket("alphavantage", rate=stock_query.ALPHAVANTAGE_RATE_PER_MIN / 60,
+                                 capacity=stock_query.ALPHAVANTAGE_BURST)
+
+
+def test_calls_beyond_the_burst_queue_with_the_default_settings(clock):
+    bucket = default_bucket()
+    interval = 60 / stock_query.ALPHAVANTAGE_RATE_PER_MIN
+    calls = stock_query.ALPHAVANTAGE_BURST + 3
+    started = clock.now
+
+    async def scenario():
+        # Sequential, like a caller whose next request follows the previous answer
+        for _ in range(calls):
+            await bucket.acquire(max_wait=stock_query.ALPHAVANTAGE_MAX_WAIT)
+
+    asyncio.run(scenario())
+    assert bucket.rejected == 0
+    assert bucket.waited == 3
+    assert clock.now - started == pytest.approx(3 * interval)
+
+
+def test_concurrent_calls_beyond_the_burst_queue_with_the_default_settings(clock):
+    """Like get_stock_prices with a few more uncached symbols than the burst"""
+    clock.advance = False  # All of them arrive before any token is refilled
+    bucket = default_bucket()
+    interval = 60 / stock_query.ALPHAVANTAGE_RATE_PER_MIN
+
+    async def scenario():
+        await asyncio.gather(*[bucket.acquire(max_wait=stock_query.ALPHAVANTAGE_MAX_WAIT)
+                               for _ in range(stock_query.ALPHAVANTAGE_BURST + 3)])
+
+    asyncio.run(scenario())
+    assert bucket.rejected == 0
+    assert clock.slept == pytest.approx([interval, 2 * interval, 3 * interval])
@@ -0,0 +1,58 @@
+import pytest
+
+import task_store
+from task_store import Task, TaskStore, TaskStoreFull
+
+
+def add(store, task_id):
+    task = Task(task_id, f"question {task_id}")
+    store.add(task)
+    return task
+
+
+def test_full_store_drops_the_oldest_finished_task():
+    store = TaskStore(capacity=2)
+    first = add(store, "a")
+    add(store, "b")
+    store.finish(first, "completed", result=[])
+    add(store, "c")
+    assert store.get("a") is None
+    assert store.get("b") is not None and store.get("c") is not None
+
+
+def test_full_store_of_active_tasks_rejects_new_ones():
+    store = TaskStore(capacity=2)
+    add(store, "a")
+    add(store, "b")
+    with pytest.raises(TaskStoreFull):
+        add(store, "c")
+    assert store.stats()["rejected"] == 1
+    assert store.get("c") is None
+
+
+def test_finished_tasks_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(task_store.time, "time", lambda: now[0])
+    store = TaskStore(capacity=10, ttl=60)
+    old = add(store, "old")
+    store.finish(old, "completed", result=[])
+    now[0] += 30
+    recent = add(store, "recent")
+    store.finish(recent, "completed", result=[])
+    active = add(store, "active")
+    now[0] += 31
+    add(store, "new")
+    assert store.get("old") is None
+    assert store.get("recent") is not None
+    assert store.get("active") is active  # Active tasks never expire
+    assert store.stats()["expired"] == 1
+
+
+def test_finish_and_start_only_apply_once():
+    store = TaskStore()
+    task = add(store, "a")
+    assert store.finish(task, "canceled")
+    assert not store.start(task)
+    assert not store.finish(task, "completed")
+    assert store.snapshot("a")["status"] == "canceled"
+    assert store.active_tasks() == []
@@ -1,13 +1,15 @@
 # web_news_tool.py
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 import sys
 import logging
 import os
+import re
+import inspect
 import json  # 用于安全地解析JSON数据
+import metrics
+from resilience import Upstream
 
-# 导入所需的库
-from cozepy import Coze, TokenAuth, Message, ChatStatus, MessageContentType, ChatEventType  # noqa
-from cozepy import COZE_CN_BASE_URL, Stream, WorkflowEvent, WorkflowEventType  # noqa
+# cozepy 导入较慢，在首次调用工具时才导入（见 get_coze）
 
 # Fix UTF-8 encoding for Windows console
 if sys.platform == 'win32':
@@ -24,52 +26,128 @@ coze_api_token = os.getenv("COZE_API_TOKEN", "default_token")  # 从环境变量
 workflow_id = os.getenv("COZE_WORKFLOW_ID", "default_workflow_id")  # 从环境变量获取工作流ID
 user_id = os.getenv("COZE_USER_ID", "default_user_id")  # 从环境变量获取用户ID
 
-# 创建Coze客户端
-coze = Coze(auth=TokenAuth(token=coze_api_token), base_url=COZE_CN_BASE_URL)
+# Coze API地址，默认国内站（可指向本地测试桩）
+coze_api_base = os.getenv("COZE_API_BASE", "")
+
+# Coze客户端，首次调用时创建
+_coze = None
+
+# 工作流超时按最近的p99耗时自适应（COZE_TIMEOUT为上限，秒）；Coze连续失败时熔断，直接返回错误
+COZE_TIMEOUT = float(os.getenv("COZE_TIMEOUT", 60))
+coze_upstream = Upstream("coze", min_timeout=15, max_timeout=COZE_TIMEOUT, hedge_quantile=0)
+
+def get_coze():
+    """首次使用时导入cozepy并创建异步Coze客户端，避免拖慢进程启动"""
+    global _coze
+    if _coze is None:
+        from cozepy import AsyncCoze, AsyncTokenAuth, COZE_CN_BASE_URL
+        _coze = AsyncCoze(auth=AsyncTokenAuth(token=coze_api_token), base_url=coze_api_base or COZE_CN_BASE_URL)
+    return _coze
+
+
+class OutputItems:
+    """从工作流输出的JSON文本里逐个取出 output 数组中已完整到达的条目
+
+    结束节点流式输出时，JSON会分成多条消息到达，每收到一段就取出新完成的条目。
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.pos = None  # output 数组中下一个条目的扫描起点
+        self.count = 0
+        self.decoder = json.JSONDecoder()
+
+    def feed(self, chunk):
+        """追加一段输出文本，返回新解析出的条目"""
+        self.text += chunk
+        items = []
+        if self.pos is None:
+            match = re.search(r'"output"\s*:\s*\[', self.text)
+            if match is None:
+                return items
+            self.pos = match.end()
+        while True:
+            i = self.pos
+            while i < len(self.text) and self.text[i] in ' \t\r\n,':
+                i += 1
+            self.pos = i
+            if i >= len(self.text) or self.text[i] == ']':
+                return items
+            try:
+                item, self.pos = self.decoder.raw_decode(self.text, i)
+            except ValueError:
+                return items  # 条目还没有完整到达
+            items.append(item)
+            self.count += 1
 
-# 直接工作流查询
-def handle_workflow_iterator(stream: Stream[WorkflowEvent]):
-    for event in stream:
-        if event.event == WorkflowEventType.MESSAGE:
-            res_messages = ''
-            # 把event.message.content从字符串转为json对象
-            event.message.content = json.loads(event.message.content)  # 使用json.loads替代eval
 
-            # 遍历res_messages里的output数组
-            for output in event.message.content['output']:
-                a = f"{output['title']}：{output['summary']}\n"
-                res_messages += a
+def format_item(item):
+    return f"{item['title']}：{item['summary']}\n"
 
-            return res_messages
+
+# 直接工作流查询
+async def handle_workflow_iterator(stream, on_item, parser=None):
+    """消费工作流事件流，每解析出一条资讯就调用 on_item，返回全部资讯拼成的文本"""
+    from cozepy import WorkflowEventType
+
+    parser = parser or OutputItems()
+    if inspect.isawaitable(stream):
+        stream = await stream  # 旧版cozepy的stream()需要先await
+    async for event in stream:
+        if event.event == WorkflowEventType.MESSAGE:
+            for item in parser.feed(event.message.content):
+                await on_item(item)
+            if event.message.node_is_finish:
+                break
         elif event.event == WorkflowEventType.ERROR:
-            logger.error(f"获取实时咨询时出错: {str(event.error)}")
-            return str(event.error)
+            raise RuntimeError(str(event.error))
         elif event.event == WorkflowEventType.INTERRUPT:
-            handle_workflow_iterator(
-                coze.workflows.runs.resume(
+            return await handle_workflow_iterator(
+                get_coze().workflows.runs.resume(
                     workflow_id=workflow_id,
                     event_id=event.interrupt.interrupt_data.event_id,
                     resume_data="hey",
                     interrupt_type=event.interrupt.interrupt_data.type,
-                )
+                ),
+                on_item,
+                parser,
             )
+    if parser.count == 0 and parser.text:
+        # 没有 output 数组时按原样解析整段输出
+        content = json.loads(parser.text)
+        return "".join(format_item(output) for output in content['output'])
+    return None
 
 @mcp.tool()
-def get_web_news(input_query: str) -> dict:
-    logger.info("调用了get_web_news工具")
+async def get_web_news(input_query: str, ctx: Context) -> dict:
     """获取实时资讯。当你需要获取实时的信息，比如汇率、时事、新闻、比赛信息等等，这个工具非常有用。input_query为搜索关键词。"""
+    logger.info("调用了get_web_news工具")
     try:
         logger.info(f"搜索信息: {input_query}")
-        res_messages = handle_workflow_iterator(
-            coze.workflows.runs.stream(
-                workflow_id=workflow_id,
-                parameters={
-                    "input": input_query
-                }
+        lines = []
+
+        async def on_item(item):
+            # 客户端带了progressToken时，每条资讯一解析出来就作为进度通知发出，TTS可以先播第一条
+            line = format_item(item)
+            lines.append(line)
+            await ctx.report_progress(len(lines), message=line.strip())
+
+        async def run_workflow():
+            return await handle_workflow_iterator(
+                get_coze().workflows.runs.stream(
+                    workflow_id=workflow_id,
+                    parameters={
+                        "input": input_query
+                    }
+                ),
+                on_item,
             )
-        )
+
+        # cozepy不走http_client，这里单独上报整个工作流的耗时
+        with metrics.timed("upstream_seconds", host="coze"):
+            res_messages = await coze_upstream.call(run_workflow)
         # logger.info(f"搜索结果: {res_messages}")
-        return {"success": True, "result": res_messages}
+        return {"success": True, "result": res_messages if res_messages is not None else "".join(lines)}
 
     except Exception as e:
         logger.error(f"获取实时咨询时出错: {str(e)}")
@@ -77,4 +155,4 @@ def get_web_news(input_query: str) -> dict:
 
 # Start the server
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
\ No newline at end of file
+    mcp.run(transport="stdio")